@@ -1,88 +1,349 @@
-import os
 import logging
-from typing import List, Dict
+import threading
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
-from dotenv import load_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from langchain_openai import AzureOpenAIEmbeddings
+from bm25_index import BM25Index, Filters
+from chunk_store import ChunkStore
+from settings import get_settings, load_environment
+from tracing import current_span, span
+from embeddings import EmbeddingCache, EmbeddingService, HashingFakeEmbeddings
+from vector_index import LocalVectorIndex, reciprocal_rank_fusion
+
+# the Azure SDKs and langchain_openai are imported on first use, so importing this module stays cheap
+if TYPE_CHECKING:
+    import requests
+    from azure.search.documents import SearchClient
+    from langchain_openai import AzureOpenAIEmbeddings
 
-# --------------------------
-# Logging Setup
-# --------------------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
+# Only these fields are fetched from the index, never mergedContent, keyPhrases or the vectors
+SEARCH_SELECT_FIELDS = ["id", "content", "metadata_storage_name"]
+
 # --------------------------
-# Load Environment Variables
+# Client Registry
 # --------------------------
-load_dotenv(override=True)
+# Clients are built once per process and reused, so a query only pays for the
+# search round-trip instead of client construction and a fresh TLS handshake.
+_registry_lock = threading.Lock()
+_search_clients: Dict[Tuple[str, str], "SearchClient"] = {}
+_http_session: Optional["requests.Session"] = None
+_embeddings_client: Optional[EmbeddingService] = None
+_vector_index: Optional[LocalVectorIndex] = None
+_chunk_store: Optional[ChunkStore] = None
+_local_search_index: Optional[BM25Index] = None
+_missing_vectors_warned = False
 
-SEARCH_SERVICE_NAME = os.getenv("SEARCH_SERVICE_NAME")
-SEARCH_SERVICE_ENDPOINT = os.getenv("SEARCH_SERVICE_ENDPOINT")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-SEARCH_SERVICE_INDEX_NAME = os.getenv("SEARCH_SERVICE_INDEX_NAME")
-SEARCH_SERVICE_KEY = os.getenv("SEARCH_SERVICE_KEY")
-AZURE_DEPLOYMENT = os.getenv("AZURE_DEPLOYMENT")
+def get_http_session() -> "requests.Session":
+    """Return the process-wide pooled HTTP session used by the search clients."""
+    global _http_session
+    with _registry_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
 
-if not all([SEARCH_SERVICE_ENDPOINT, SEARCH_SERVICE_INDEX_NAME, SEARCH_SERVICE_KEY]):
-    logger.error("Missing one or more required Azure Search environment variables.")
-    raise ValueError("Environment configuration incomplete.")
+            settings = get_settings()
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.search_pool_connections,
+                pool_maxsize=settings.search_pool_maxsize,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
 
-# --------------------------
-# Azure Credentials
-# --------------------------
-credential = AzureKeyCredential(SEARCH_SERVICE_KEY)
+def get_search_client(index_name: str = None) -> "SearchClient":
+    """
+    Return the pooled SearchClient for an index, building it on first use.
+    :param index_name: The index to query, defaults to SEARCH_SERVICE_INDEX_NAME
+    """
+    settings = get_settings()
+    index_name = index_name or settings.search_service_index_name
+    key = (settings.search_service_endpoint, index_name)
+    client = _search_clients.get(key)
+    if client is not None:
+        return client
+
+    settings.require_search_service()
+    from azure.core.credentials import AzureKeyCredential
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.search.documents import SearchClient
+
+    session = get_http_session()
+    with _registry_lock:
+        client = _search_clients.get(key)
+        if client is None:
+            client = SearchClient(
+                endpoint=settings.search_service_endpoint,
+                index_name=index_name,
+                credential=AzureKeyCredential(settings.search_service_key),
+                transport=RequestsTransport(session=session, session_owner=False),
+            )
+            _search_clients[key] = client
+            logger.info(f"Created pooled SearchClient for index '{index_name}'")
+        return client
+
+def close_clients() -> None:
+    """Close every pooled client and the shared HTTP session."""
+    global _http_session, _embeddings_client
+    with _registry_lock:
+        for client in _search_clients.values():
+            client.close()
+        _search_clients.clear()
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+        _embeddings_client = None
 
 # --------------------------
 # Embedding Utilities
 # --------------------------
-def create_embeddings() -> AzureOpenAIEmbeddings:
+def create_embeddings() -> "AzureOpenAIEmbeddings":
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    settings = get_settings()
     return AzureOpenAIEmbeddings(
-        openai_api_key=AZURE_OPENAI_API_KEY,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        openai_api_key=settings.azure_openai_api_key,
+        azure_endpoint=settings.azure_openai_endpoint,
         openai_api_type="azure",
-        azure_deployment=AZURE_DEPLOYMENT,
-        model=AZURE_DEPLOYMENT,
-        chunk_size=1,
+        azure_deployment=settings.azure_deployment,
+        model=settings.azure_deployment,
+        chunk_size=settings.embedding_batch_size,
     )
 
+def get_embeddings_client() -> EmbeddingService:
+    """
+    Return the process-wide embedding service, building it on first use.
+    EMBEDDING_BACKEND selects the Azure deployment ("azure") or the deterministic offline backend ("fake"),
+    and EMBEDDING_CACHE enables the on-disk vector cache.
+    """
+    global _embeddings_client
+    if _embeddings_client is None:
+        settings = get_settings()
+        with _registry_lock:
+            if _embeddings_client is None:
+                if settings.embedding_backend == "fake":
+                    backend, model = HashingFakeEmbeddings(), "fake"
+                else:
+                    backend, model = create_embeddings(), settings.azure_deployment
+                cache = EmbeddingCache() if settings.embedding_cache else None
+                _embeddings_client = EmbeddingService(backend.embed_documents, model, cache=cache)
+    return _embeddings_client
+
 def get_embedding(text: str) -> List[float]:
-    embeddings = create_embeddings()
-    return embeddings.embed_query(text)
+    return get_embeddings_client().embed_query(text)
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed many texts at once, in batches and from the cache where possible."""
+    return get_embeddings_client().embed_documents(texts)
 
 # --------------------------
-# Search Function
+# Search Functions
 # --------------------------
-def search_documents(search_query: str, use_vector: bool = False) -> List[Dict[str, str]]:
+def _keyword_search(search_query: str, top: int, filters: Optional[Filters] = None) -> List[Dict]:
+    if get_settings().search_backend == "local":
+        return get_local_search_index().search(search_query, top=top, filters=filters)
+
+    results = get_search_client().search(
+        search_text=search_query,
+        filter=_odata_filter(filters),
+        top=top,
+        select=SEARCH_SELECT_FIELDS,
+    )
+    return _hits(results)
+
+def _vector_search(query_vector: List[float], top: int, filters: Optional[Filters] = None) -> List[Dict]:
+    # the local vector index holds the chunk ids of the local pipeline, so it only serves the local backend:
+    # its hits fused with the service's keyword hits would never match them
+    if get_settings().search_backend == "local":
+        index = get_vector_index()
+        if index is None:
+            _warn_missing_vectors("VECTOR_INDEX_PATH is not set, build the local vector index with vector_index.py.")
+            return []
+        if not filters:
+            return index.search(query_vector, top=top)
+        # the vector index holds no metadata, so a filtered search ranks everything and checks the BM25 index
+        keyword_index = get_local_search_index()
+        hits = index.search(query_vector, top=len(index))
+        return [hit for hit in hits if keyword_index.matches(hit["id"], filters)][:top]
+
+    from azure.search.documents.models import VectorizedQuery
+
+    settings = get_settings()
+    results = get_search_client().search(
+        search_text=None,
+        filter=_odata_filter(filters),
+        vector_queries=[VectorizedQuery(
+            vector=query_vector,
+            k_nearest_neighbors=top,
+            fields=settings.search_vector_field,
+        )],
+        top=top,
+        select=SEARCH_SELECT_FIELDS,
+    )
+    hits = _hits(results)
+    if not hits and not filters:
+        # the blob indexer stores whole documents and never fills the vector field: only the chunks pushed
+        # by bulk_upload.py or `creating_indexer.py --incremental` carry embeddings
+        _warn_missing_vectors(
+            f"'{settings.search_service_index_name}' holds no '{settings.search_vector_field}' vectors, push the chunks "
+            f"with context/bulk_upload.py and point SEARCH_SERVICE_INDEX_NAME at '{settings.chunk_index()}'."
+        )
+    return hits
+
+def _warn_missing_vectors(reason: str) -> None:
+    """Warn once per process that vector search has nothing to search, so hybrid mode is keyword-only."""
+    global _missing_vectors_warned
+    if not _missing_vectors_warned:
+        _missing_vectors_warned = True
+        logger.warning(f"Vector search returns no hits and hybrid search falls back to the keyword ranking: {reason}")
+
+def _hits(results) -> List[Dict]:
+    return [
+        {
+            "id": doc.get("id"),
+            "score": doc.get("@search.score", 0),
+            "content": doc.get("content", ""),
+            "metadata_storage_name": doc.get("metadata_storage_name"),
+        }
+        for doc in results
+    ]
+
+def get_vector_index() -> Optional[LocalVectorIndex]:
+    """Return the local vector index loaded from VECTOR_INDEX_PATH, or None when it is not configured. Only the local backend uses it."""
+    global _vector_index
+    path = get_settings().vector_index_path
+    if _vector_index is None and path:
+        with _registry_lock:
+            if _vector_index is None:
+                _vector_index = LocalVectorIndex.load(path)
+                logger.info(f"Loaded local vector index with {len(_vector_index)} chunks")
+    return _vector_index
+
+def _odata_filter(filters: Optional[Filters]) -> Optional[str]:
+    """Translate field -> value (or list of values) filters into the OData expression the service expects."""
+    if not filters:
+        return None
+    clauses = []
+    for field, accepted in filters.items():
+        if isinstance(accepted, str):
+            clauses.append(f"{field} eq '{_odata_quote(accepted)}'")
+        else:
+            values = ",".join(_odata_quote(value) for value in accepted)
+            clauses.append(f"search.in({field}, '{values}', ',')")
+    return " and ".join(clauses)
+
+def _odata_quote(value: str) -> str:
+    return value.replace("'", "''")
+
+def get_local_search_index() -> BM25Index:
+    """Return the BM25 index loaded from LOCAL_SEARCH_INDEX_PATH, used when SEARCH_BACKEND is "local"."""
+    global _local_search_index
+    if _local_search_index is None:
+        with _registry_lock:
+            if _local_search_index is None:
+                _local_search_index = BM25Index.load(get_settings().local_search_index_path)
+                logger.info(f"Loaded local BM25 index with {len(_local_search_index)} chunks")
+    return _local_search_index
+
+def get_chunk_store() -> Optional[ChunkStore]:
     """
-    Search documents in Azure AI Search.
-    :param search_query: The user query string
-    :param use_vector: Whether to use vector search or traditional full-text search
+    Return the chunk store opened read-only from CHUNK_STORE_DIR, or None when it is disabled.
+    Only ingestion writes the store (chunk_store.py); queries never do.
     """
-    search_client = SearchClient(
-        endpoint=SEARCH_SERVICE_ENDPOINT,
-        index_name=SEARCH_SERVICE_INDEX_NAME,
-        credential=credential
-    )
-    search_vector = get_embedding(search_query)
+    global _chunk_store
+    directory = get_settings().chunk_store_dir
+    if _chunk_store is None and directory:
+        with _registry_lock:
+            if _chunk_store is None:
+                _chunk_store = ChunkStore(directory, read_only=True)
+    return _chunk_store
 
+def read_chunk(chunk_id: str, neighbours: int = 0) -> List[Dict[str, str]]:
+    """
+    Read the full text of a chunk returned by `search_documents`, with its neighbouring chunks.
+    The chunk store answers locally; a chunk it does not hold is fetched alone from the index, and cut to
+    CHUNK_SIZE characters since the blob indexer's entries hold whole documents.
+    :param chunk_id: The "id" of a search hit
+    :param neighbours: Number of chunks to add before and after it in its source document
+    """
+    store = get_chunk_store()
+    stored = store is not None and chunk_id in store
+    # recorded on the span of the tool call reading the chunk
+    current_span().set("chunk_store.hit", stored)
     try:
-        results = search_client.search(
-                search_text=search_query,
-                top=5,
+        if not stored:
+            if get_settings().search_backend == "local":
+                content = get_local_search_index().get(chunk_id)
+                if content is None:
+                    return []
+                chunk = {"id": chunk_id, "content": content}
+            else:
+                doc = get_search_client().get_document(key=chunk_id, selected_fields=SEARCH_SELECT_FIELDS)
+                chunk = _capped_chunk(chunk_id, doc.get("content") or "")
+            return [chunk]
+        return store.neighbours(chunk_id, neighbours)
 
-            )
+    except Exception as e:
+        logger.exception(f"Error while reading chunk '{chunk_id}'")
+        return []
+
+def _capped_chunk(chunk_id: str, content: str) -> Dict[str, str]:
+    """A chunk of at most CHUNK_SIZE characters, with a note for the model when its content was cut."""
+    limit = get_settings().chunk_size
+    chunk = {"id": chunk_id, "content": content[:limit]}
+    if len(content) > limit:
+        chunk["note"] = (
+            f"Truncated to the first {limit} of {len(content)} characters of the document; "
+            f"search the course documents for the passage you need."
+        )
+    return chunk
+
+def search_documents(
+    search_query: str,
+    use_vector: bool = False,
+    top: int = 5,
+    filters: Optional[Filters] = None,
+) -> List[Dict[str, str]]:
+    """
+    Search documents in Azure AI Search, or in the local BM25 index when SEARCH_BACKEND is "local".
+    :param search_query: The user query string
+    :param use_vector: Whether to run hybrid (keyword + vector, fused with RRF) or traditional full-text search
+    :param top: Number of results to return
+    :param filters: Optional field -> value (or list of values) on topic, category or metadata_storage_name
+    :return: Hits with their chunk "id", score, a content preview and, when known, their source file
+             ("metadata_storage_name"); `read_chunk` returns the full text
+    """
+    with span("search_documents", **{"search.backend": get_settings().search_backend, "search.hybrid": use_vector, "search.top": top}) as current:
+        output = _search_documents(search_query, use_vector, top, filters)
+        current.set("search.results", len(output))
+        current.set("search.payload_chars", sum(len(hit["content"]) for hit in output))
+        return output
+
+def _search_documents(search_query: str, use_vector: bool, top: int, filters: Optional[Filters]) -> List[Dict[str, str]]:
+    settings = get_settings()
+    try:
+        if use_vector:
+            # the embedding round-trip is only paid when vector search is requested
+            keyword_hits = _keyword_search(search_query, settings.hybrid_candidates, filters)
+            vector_hits = _vector_search(get_embedding(search_query), settings.hybrid_candidates, filters)
+            hits = reciprocal_rank_fusion([keyword_hits, vector_hits], k=settings.hybrid_rrf_k, top=top)
+        else:
+            hits = _keyword_search(search_query, top, filters)
 
         output = []
-        for doc in results:
-            chunk = doc.get("content", "")[:200].replace("\n", " ")
-            score = round(doc.get("@search.score", 0), 5)
-            output.append({
+        for doc in hits:
+            chunk = doc.get("content", "")[:settings.chunk_preview_chars].replace("\n", " ")
+            score = round(doc.get("score", 0), 5)
+            hit = {
+                "id": doc.get("id"),
                 "score": score,
                 "content": chunk
-            })
+            }
+            if doc.get("metadata_storage_name"):
+                hit["metadata_storage_name"] = doc["metadata_storage_name"]
+            output.append(hit)
 
         return output
 
@@ -94,9 +355,11 @@ def search_documents(search_query: str, use_vector: bool = False) -> List[Dict[s
 # Main Entrypoint
 # --------------------------
 def main() -> None:
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
     query = "alcohol"
     logger.info(f" Searching for: '{query}'")
-    results = search_documents(query, use_vector=False)  # Set to True if using vector search
+    results = search_documents(query, use_vector=False)  # Set to True for hybrid keyword + vector search
     for res in results:
         logger.info(f"[Score: {res['score']}] {res['content']}")
 
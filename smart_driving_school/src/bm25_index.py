@@ -0,0 +1,287 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from settings import get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Configuration
+# --------------------------
+# the filterable string fields of the index defined in `create_index`
+FILTER_FIELDS = ("topic", "category", "metadata_storage_name")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could do does for from had has have how i if in into is
+it its may more must my no not of on or our should so such than that the their them then there these they this to was
+we were what when where which who will with would you your
+""".split())
+# strings are stored as one separator-joined UTF-8 blob each, which loads far faster than pickled arrays
+_SEPARATOR = "\x00"
+
+Filters = Dict[str, Union[str, Sequence[str]]]
+
+# --------------------------
+# Tokenisation
+# --------------------------
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords, with plural endings folded so "drivers" matches "driver"."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+# --------------------------
+# BM25 Inverted Index
+# --------------------------
+class BM25Index:
+    """
+    In-process BM25 index over chunk documents shaped like the fields of `create_index`.
+    Postings are kept in CSR form (one offsets array, one doc-id array and one term-frequency
+    array for the whole vocabulary), with a second posting list for the words of `keyPhrases`
+    that boosts chunks tagged with a query term. `topic`, `category` and `metadata_storage_name`
+    are stored as integer codes so filters are a single vectorised comparison.
+    It stands in for the Azure keyword search so the graph can run and be load-tested offline.
+    """
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None, keyphrase_boost: Optional[float] = None):
+        settings = get_settings()
+        self.k1 = settings.bm25_k1 if k1 is None else k1
+        self.b = settings.bm25_b if b is None else b
+        self.keyphrase_boost = settings.keyphrase_boost if keyphrase_boost is None else keyphrase_boost
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._content = b""
+        self._content_offsets = np.zeros(1, dtype=np.int64)
+        self._doc_lengths = np.zeros(0, dtype=np.int32)
+        self._terms: Dict[str, int] = {}
+        self._term_offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._frequencies = np.zeros(0, dtype=np.uint16)
+        self._phrase_terms: Dict[str, int] = {}
+        self._phrase_offsets = np.zeros(1, dtype=np.int64)
+        self._phrase_postings = np.zeros(0, dtype=np.int32)
+        self._field_values: Dict[str, List[str]] = {field: [] for field in FILTER_FIELDS}
+        self._field_codes: Dict[str, np.ndarray] = {field: np.zeros(0, dtype=np.int32) for field in FILTER_FIELDS}
+        self._length_norm = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict], **params) -> "BM25Index":
+        """
+        Build an index from index-ready documents (dicts with "id", "content", "keyPhrases" and the filter fields).
+        Documents sharing an id keep the last one, as a merge upload would.
+        """
+        documents = list({doc["id"]: doc for doc in documents}.values())
+        index = cls(**params)
+        index.ids = [doc["id"] for doc in documents]
+
+        term_ids: Dict[str, int] = {}
+        term_rows, doc_rows, frequencies, lengths = [], [], [], []
+        phrase_ids: Dict[str, int] = {}
+        phrase_term_rows, phrase_doc_rows = [], []
+        for row, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.get("content") or ""))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_rows.append(term_ids.setdefault(term, len(term_ids)))
+                doc_rows.append(row)
+                frequencies.append(min(count, np.iinfo(np.uint16).max))
+            for term in set(tokenize(" ".join(doc.get("keyPhrases") or []))):
+                phrase_term_rows.append(phrase_ids.setdefault(term, len(phrase_ids)))
+                phrase_doc_rows.append(row)
+
+        index._terms, index._term_offsets, order = _csr(term_ids, term_rows)
+        index._postings = np.asarray(doc_rows, dtype=np.int32)[order]
+        index._frequencies = np.asarray(frequencies, dtype=np.uint16)[order]
+        index._phrase_terms, index._phrase_offsets, order = _csr(phrase_ids, phrase_term_rows)
+        index._phrase_postings = np.asarray(phrase_doc_rows, dtype=np.int32)[order]
+        index._doc_lengths = np.asarray(lengths, dtype=np.int32)
+
+        contents = [(doc.get("content") or "").encode("utf-8") for doc in documents]
+        index._content = b"".join(contents)
+        index._content_offsets = np.concatenate([[0], np.cumsum([len(c) for c in contents], dtype=np.int64)]).astype(np.int64)
+
+        for field in FILTER_FIELDS:
+            values: Dict[str, int] = {}
+            codes = [values.setdefault(doc.get(field) or "", len(values)) for doc in documents]
+            index._field_values[field] = list(values)
+            index._field_codes[field] = np.asarray(codes, dtype=np.int32)
+
+        index._prepare()
+        return index
+
+    def search(self, query: str, top: int = 5, filters: Optional[Filters] = None) -> List[Dict]:
+        """
+        Return the top chunks by BM25 score plus the keyPhrases boost.
+        :param query: The user query string
+        :param top: Number of hits to return
+        :param filters: Optional field -> value (or list of accepted values) on the FILTER_FIELDS
+        """
+        if not self.ids:
+            return []
+        count = len(self.ids)
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            row = self._terms.get(term)
+            if row is not None:
+                start, end = self._term_offsets[row], self._term_offsets[row + 1]
+                docs = self._postings[start:end]
+                tf = self._frequencies[start:end].astype(np.float32)
+                idf = _idf(count, end - start)
+                # a term has at most one posting per chunk, so the fancy-indexed add never collides
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+            row = self._phrase_terms.get(term)
+            if row is not None and self.keyphrase_boost:
+                start, end = self._phrase_offsets[row], self._phrase_offsets[row + 1]
+                scores[self._phrase_postings[start:end]] += self.keyphrase_boost * _idf(count, end - start)
+
+        if filters:
+            scores[~self.filter_mask(filters)] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+        top = min(top, len(candidates))
+        # argpartition keeps this O(n) instead of a full sort over the matching chunks
+        candidates = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        names, codes = self._field_values["metadata_storage_name"], self._field_codes["metadata_storage_name"]
+        return [
+            {"id": self.ids[i], "score": float(scores[i]), "content": self._text(i), "metadata_storage_name": names[codes[i]] or None}
+            for i in ranked
+        ]
+
+    def filter_mask(self, filters: Filters) -> np.ndarray:
+        """Boolean mask of the chunks matching every filter."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, accepted in filters.items():
+            if field not in self._field_codes:
+                raise ValueError(f"'{field}' is not filterable, expected one of {FILTER_FIELDS}.")
+            accepted = [accepted] if isinstance(accepted, str) else list(accepted)
+            values = self._field_values[field]
+            codes = [values.index(value) for value in accepted if value in values]
+            mask &= np.isin(self._field_codes[field], codes)
+        return mask
+
+    def matches(self, chunk_id: str, filters: Filters) -> bool:
+        """Whether a stored chunk matches every filter."""
+        row = self._rows.get(chunk_id)
+        if row is None:
+            return False
+        for field, accepted in filters.items():
+            accepted = [accepted] if isinstance(accepted, str) else list(accepted)
+            if self._field_values[field][self._field_codes[field][row]] not in accepted:
+                return False
+        return True
+
+    def get(self, chunk_id: str) -> Optional[str]:
+        """Full text of a chunk, or None when it is not indexed."""
+        row = self._rows.get(chunk_id)
+        return self._text(row) if row is not None else None
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {
+            "params": np.asarray([self.k1, self.b, self.keyphrase_boost], dtype=np.float64),
+            "ids": _pack(self.ids),
+            "content": np.frombuffer(self._content, dtype=np.uint8),
+            "content_offsets": self._content_offsets,
+            "doc_lengths": self._doc_lengths,
+            "terms": _pack(self._terms),
+            "term_offsets": self._term_offsets,
+            "postings": self._postings,
+            "frequencies": self._frequencies,
+            "phrase_terms": _pack(self._phrase_terms),
+            "phrase_offsets": self._phrase_offsets,
+            "phrase_postings": self._phrase_postings,
+        }
+        for field in FILTER_FIELDS:
+            arrays[f"{field}_values"] = _pack(self._field_values[field])
+            arrays[f"{field}_codes"] = self._field_codes[field]
+        # uncompressed, so loading is a handful of reads instead of a decompression pass
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+        logger.info(f"Saved BM25 index with {len(self)} chunks and {len(self._terms)} terms to '{path}'")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            k1, b, keyphrase_boost = data["params"].tolist()
+            index = cls(k1=k1, b=b, keyphrase_boost=keyphrase_boost)
+            index.ids = _unpack(data["ids"])
+            index._content = data["content"].tobytes()
+            index._content_offsets = data["content_offsets"]
+            index._doc_lengths = data["doc_lengths"]
+            index._terms = {term: row for row, term in enumerate(_unpack(data["terms"]))}
+            index._term_offsets = data["term_offsets"]
+            index._postings = data["postings"]
+            index._frequencies = data["frequencies"]
+            index._phrase_terms = {term: row for row, term in enumerate(_unpack(data["phrase_terms"]))}
+            index._phrase_offsets = data["phrase_offsets"]
+            index._phrase_postings = data["phrase_postings"]
+            for field in FILTER_FIELDS:
+                index._field_values[field] = _unpack(data[f"{field}_values"])
+                index._field_codes[field] = data[f"{field}_codes"]
+        index._prepare()
+        return index
+
+    def _prepare(self) -> None:
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        average = float(self._doc_lengths.mean()) if len(self._doc_lengths) else 0.0
+        # the document-length part of the BM25 denominator only depends on the chunk, so it is computed once
+        ratio = self._doc_lengths / average if average else np.ones(len(self._doc_lengths))
+        self._length_norm = (self.k1 * (1 - self.b + self.b * ratio)).astype(np.float32)
+
+    def _text(self, row: int) -> str:
+        start, end = self._content_offsets[row], self._content_offsets[row + 1]
+        return self._content[start:end].decode("utf-8")
+
+
+def _idf(count: int, document_frequency: int) -> float:
+    return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+def _csr(vocabulary: Dict[str, int], term_rows: List[int]):
+    """Sort (term, doc) pairs by term and return the vocabulary, the row offsets and the sort order."""
+    rows = np.asarray(term_rows, dtype=np.int64)
+    order = np.argsort(rows, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(vocabulary)), out=offsets[1:])
+    return vocabulary, offsets, order
+
+def _pack(strings: Iterable[str]) -> np.ndarray:
+    # every string is terminated, so an empty string and an empty list stay distinct
+    return np.frombuffer("".join(s + _SEPARATOR for s in strings).encode("utf-8"), dtype=np.uint8)
+
+def _unpack(blob: np.ndarray) -> List[str]:
+    return blob.tobytes().decode("utf-8").split(_SEPARATOR)[:-1]
+
+# --------------------------
+# Entrypoint
+# --------------------------
+
+if __name__ == "__main__":
+    import json
+
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    settings = get_settings()
+    with open(settings.local_documents_path, encoding="utf-8") as f:
+        BM25Index.from_documents(json.loads(line) for line in f if line.strip()).save(settings.local_search_index_path)
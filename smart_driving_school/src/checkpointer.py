@@ -0,0 +1,145 @@
+import zlib
+import sqlite3
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional, Tuple
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from settings import get_settings
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Configuration
+# --------------------------
+_ZLIB_SUFFIX = "+zlib"
+
+# --------------------------
+# Compact Serialisation
+# --------------------------
+class CompressedSerializer(SerializerProtocol):
+    """
+    Wraps a serializer and zlib-compresses the payloads of at least `min_bytes`
+    (CHECKPOINT_COMPRESS_MIN_BYTES by default); smaller ones are stored uncompressed.
+    """
+
+    def __init__(self, serde: SerializerProtocol = None, min_bytes: Optional[int] = None):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_bytes = get_settings().checkpoint_compress_min_bytes if min_bytes is None else min_bytes
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) < self.min_bytes:
+            return type_, data
+        return type_ + _ZLIB_SUFFIX, zlib.compress(data)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(_ZLIB_SUFFIX):
+            type_, payload = type_[:-len(_ZLIB_SUFFIX)], zlib.decompress(payload)
+        return self.serde.loads_typed((type_, payload))
+
+# --------------------------
+# Checkpoint Retention
+# --------------------------
+# checkpoint ids are time-ordered (uuid6), so the newest checkpoints sort last
+_PRUNE_CHECKPOINTS = """
+    DELETE FROM checkpoints
+    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+        SELECT checkpoint_id FROM checkpoints
+        WHERE thread_id = ? AND checkpoint_ns = ?
+        ORDER BY checkpoint_id DESC LIMIT ?
+    )
+"""
+_PRUNE_WRITES = """
+    DELETE FROM writes
+    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+        SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+    )
+"""
+
+def _prune_params(config: RunnableConfig, keep_last: int) -> Tuple:
+    thread_id = config["configurable"]["thread_id"]
+    checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+    return (thread_id, checkpoint_ns, thread_id, checkpoint_ns, keep_last), (thread_id, checkpoint_ns, thread_id, checkpoint_ns)
+
+
+class PrunedSqliteSaver(SqliteSaver):
+    """SqliteSaver that keeps only the last `keep_last` checkpoints (and their writes) of each thread."""
+
+    def __init__(self, conn: sqlite3.Connection, *, serde: SerializerProtocol = None, keep_last: Optional[int] = None):
+        super().__init__(conn, serde=serde or CompressedSerializer())
+        self.keep_last = get_settings().checkpoint_keep_last if keep_last is None else keep_last
+
+    def put(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        with span("checkpoint put", **{"checkpoint.keep_last": self.keep_last}):
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            if self.keep_last > 0:
+                checkpoints_params, writes_params = _prune_params(next_config, self.keep_last)
+                with self.cursor() as cur:
+                    cur.execute(_PRUNE_CHECKPOINTS, checkpoints_params)
+                    cur.execute(_PRUNE_WRITES, writes_params)
+            return next_config
+
+
+class PrunedAsyncSqliteSaver(AsyncSqliteSaver):
+    """Async counterpart of `PrunedSqliteSaver`."""
+
+    def __init__(self, conn: aiosqlite.Connection, *, serde: SerializerProtocol = None, keep_last: Optional[int] = None):
+        super().__init__(conn, serde=serde or CompressedSerializer())
+        self.keep_last = get_settings().checkpoint_keep_last if keep_last is None else keep_last
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        with span("checkpoint put", **{"checkpoint.keep_last": self.keep_last}):
+            next_config = await super().aput(config, checkpoint, metadata, new_versions)
+            if self.keep_last > 0:
+                checkpoints_params, writes_params = _prune_params(next_config, self.keep_last)
+                async with self.lock:
+                    await self.conn.execute(_PRUNE_CHECKPOINTS, checkpoints_params)
+                    await self.conn.execute(_PRUNE_WRITES, writes_params)
+                    await self.conn.commit()
+            return next_config
+
+# --------------------------
+# Factories
+# --------------------------
+def open_checkpointer(path: Optional[str] = None, keep_last: Optional[int] = None) -> PrunedSqliteSaver:
+    """
+    Open the persistent checkpointer used by the console application.
+    :param path: SQLite database file (":memory:" for a throw-away store), CHECKPOINT_DB_PATH by default
+    :param keep_last: Checkpoints kept per thread, 0 keeps everything; CHECKPOINT_KEEP_LAST by default
+    """
+    path, keep_last = _resolve(path, keep_last)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    logger.info(f"Checkpoints stored in '{path}' (keeping the last {keep_last or 'all'} per thread)")
+    return PrunedSqliteSaver(conn, keep_last=keep_last)
+
+
+@asynccontextmanager
+async def open_async_checkpointer(path: Optional[str] = None, keep_last: Optional[int] = None) -> AsyncIterator[PrunedAsyncSqliteSaver]:
+    """
+    Open the persistent checkpointer used by the async serving front-end.
+    :param path: SQLite database file (":memory:" for a throw-away store), CHECKPOINT_DB_PATH by default
+    :param keep_last: Checkpoints kept per thread, 0 keeps everything; CHECKPOINT_KEEP_LAST by default
+    """
+    path, keep_last = _resolve(path, keep_last)
+    async with aiosqlite.connect(path) as conn:
+        logger.info(f"Checkpoints stored in '{path}' (keeping the last {keep_last or 'all'} per thread)")
+        yield PrunedAsyncSqliteSaver(conn, keep_last=keep_last)
+
+def _resolve(path: Optional[str], keep_last: Optional[int]) -> Tuple[str, int]:
+    settings = get_settings()
+    return path or settings.checkpoint_db_path, settings.checkpoint_keep_last if keep_last is None else keep_last
@@ -0,0 +1,203 @@
+import os
+import re
+import mmap
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from settings import get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# chunk ids of the local ingestion pipeline: "<document key>-<chunk number>"
+_CHUNK_NUMBER = re.compile(r"^(?P<prefix>.+)-(?P<number>\d{4,})$")
+
+# --------------------------
+# Memory-mapped Chunk Store
+# --------------------------
+class ChunkStore:
+    """
+    Append-only on-disk store of chunk texts. `chunks.bin` holds the UTF-8 texts back to back,
+    `chunks.idx` an int64 (offset, length) pair per row and `ids.txt` the chunk id of each row.
+    Reads slice a read-only mmap of `chunks.bin`, so the corpus stays in the page cache instead
+    of the Python heap. Re-appending a chunk id points it at the new row; the old bytes are kept.
+    Appends hold an exclusive lock on `chunks.lock`, so several processes can write one store;
+    a store opened `read_only` (the search path) never writes and picks up the rows appended since on a miss.
+    """
+
+    def __init__(self, directory: Optional[str] = None, read_only: bool = False):
+        directory = directory or get_settings().chunk_store_dir
+        self.directory = directory
+        self.read_only = read_only
+        self._data_path = os.path.join(directory, "chunks.bin")
+        self._index_path = os.path.join(directory, "chunks.idx")
+        self._ids_path = os.path.join(directory, "ids.txt")
+        self._lock_path = os.path.join(directory, "chunks.lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._spans = np.zeros((0, 2), dtype=np.int64)
+        # bytes of ids.txt holding complete rows, to notice the rows appended by another process
+        self._ids_size = 0
+        self._mmap: Optional[mmap.mmap] = None
+        with self._lock:
+            self._load()
+        logger.info(f"Opened chunk store with {len(self._rows)} chunks from '{self.directory}'")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    def append(self, documents: Iterable[Dict]) -> int:
+        """
+        Append chunks, skipping the ones already stored with the same text.
+        :param documents: Dicts with "id" and "content"
+        :return: Number of chunks written
+        """
+        if self.read_only:
+            raise ValueError(f"Chunk store '{self.directory}' is opened read-only.")
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, file_lock(self._lock_path):
+            # rows another process appended since this one last read the store
+            self._load()
+            new = []
+            for document in documents:
+                data = (document.get("content") or "").encode("utf-8")
+                row = self._rows.get(document["id"])
+                if row is not None and self._read(row) == data:
+                    continue
+                new.append((document["id"], data))
+            if not new:
+                return 0
+
+            # offsets and ids a crashed append left without their ids are cut, so the files stay row-aligned
+            self._truncate_partial_rows()
+            with open(self._data_path, "ab") as f:
+                # the real end of the file: bytes a crashed append left behind are skipped, never pointed at
+                offset = f.seek(0, os.SEEK_END)
+                spans = np.empty((len(new), 2), dtype=np.int64)
+                for i, (_, data) in enumerate(new):
+                    spans[i] = (offset, len(data))
+                    offset += len(data)
+                f.write(b"".join(data for _, data in new))
+            # data, then offsets, then ids: a crash never leaves an id pointing at missing bytes
+            with open(self._index_path, "ab") as f:
+                f.write(spans.tobytes())
+            with open(self._ids_path, "ab") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id, _ in new).encode("utf-8"))
+            self._load()
+            return len(new)
+
+    def get_bytes(self, chunk_id: str) -> Optional[memoryview]:
+        """Zero-copy view of a chunk's UTF-8 bytes, or None when the chunk is not stored."""
+        with self._lock:
+            row = self._rows.get(chunk_id)
+            if row is None and self._grown():
+                self._load()
+                row = self._rows.get(chunk_id)
+            return self._view(row) if row is not None else None
+
+    def get(self, chunk_id: str) -> Optional[str]:
+        """Full text of a chunk, or None when the chunk is not stored."""
+        view = self.get_bytes(chunk_id)
+        return str(view, "utf-8") if view is not None else None
+
+    def neighbours(self, chunk_id: str, count: int = 1) -> List[Dict[str, str]]:
+        """
+        The chunk and up to `count` stored chunks before and after it in its source document, in order.
+        Chunk ids that do not follow the "<document key>-<number>" scheme only return the chunk itself.
+        """
+        match = _CHUNK_NUMBER.match(chunk_id)
+        if match is None or count <= 0:
+            ids = [chunk_id]
+        else:
+            prefix, number = match["prefix"], int(match["number"])
+            width = len(match["number"])
+            ids = [f"{prefix}-{n:0{width}d}" for n in range(max(number - count, 0), number + count + 1)]
+        chunks = []
+        for neighbour_id in ids:
+            content = self.get(neighbour_id)
+            if content is not None:
+                chunks.append({"id": neighbour_id, "content": content})
+        return chunks
+
+    def _view(self, row: int) -> memoryview:
+        offset, length = self._spans[row]
+        if not length:
+            return memoryview(b"")
+        if self._mmap is None:
+            with open(self._data_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def _read(self, row: int) -> bytes:
+        return bytes(self._view(row))
+
+    def _grown(self) -> bool:
+        try:
+            return os.path.getsize(self._ids_path) > self._ids_size
+        except OSError:
+            return False
+
+    def _load(self) -> None:
+        """(Re)read every complete row; called with `_lock` held."""
+        if not os.path.exists(self._ids_path):
+            return
+        with open(self._ids_path, "rb") as f:
+            raw_ids = f.read()
+        # a last line without its newline was cut by a crash
+        lines = raw_ids.split(b"\n")[:-1]
+        raw = np.fromfile(self._index_path, dtype=np.int64)
+        spans = raw[:len(raw) // 2 * 2].reshape(-1, 2)[:len(lines)]
+        size = os.path.getsize(self._data_path)
+        # rows whose bytes did not fully reach the data file end the store
+        beyond = np.flatnonzero(spans.sum(axis=1) > size)
+        valid = int(beyond[0]) if len(beyond) else len(spans)
+        self._spans = spans[:valid]
+        self._rows = {line.decode("utf-8"): row for row, line in enumerate(lines[:valid])}
+        self._ids_size = sum(len(line) + 1 for line in lines[:valid])
+        # readers holding a view of the old map keep it alive; the next read maps the grown file
+        self._mmap = None
+
+    def _truncate_partial_rows(self) -> None:
+        """Cut `chunks.idx` and `ids.txt` back to the complete rows; called with both locks held."""
+        for path, size in ((self._index_path, len(self._spans) * 2 * 8), (self._ids_path, self._ids_size)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning(f"Dropping the partial rows of an interrupted append from '{path}'")
+                os.truncate(path, size)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict], directory: Optional[str] = None) -> "ChunkStore":
+        """Open the store in `directory` (CHUNK_STORE_DIR by default) and append index-ready documents (dicts with "id" and "content")."""
+        store = cls(directory)
+        written = store.append(documents)
+        logger.info(f"Appended {written} chunks to the chunk store in '{store.directory}'")
+        return store
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive advisory lock on `path` (created when missing), across processes."""
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# --------------------------
+# Entrypoint
+# --------------------------
+
+if __name__ == "__main__":
+    import json
+
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    with open(get_settings().local_documents_path, encoding="utf-8") as f:
+        ChunkStore.from_documents(json.loads(line) for line in f if line.strip())
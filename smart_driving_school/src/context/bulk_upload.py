@@ -0,0 +1,148 @@
+import sys
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+from azure.search.documents import SearchClient
+
+from local_ingestion import load_documents
+
+# the search and embedding modules live in the src directory above
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from settings import get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Configuration
+# ---------------------------
+# statuses the service returns when it is throttling or briefly unavailable
+_RETRYABLE_STATUS = {429, 503}
+
+# ---------------------------
+# Retry with Backoff
+# ---------------------------
+def call_with_retry(fn: Callable, *args, description: str = "request", **kwargs):
+    """
+    Call fn, retrying throttled (429/503) and transient connection failures with jittered
+    exponential backoff (UPLOAD_MAX_RETRIES, UPLOAD_BACKOFF_SECONDS). A Retry-After header sent by the service takes precedence.
+    """
+    settings = get_settings()
+    for attempt in range(settings.upload_max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except (HttpResponseError, ServiceRequestError) as e:
+            status = getattr(e, "status_code", None)
+            if attempt == settings.upload_max_retries or (isinstance(e, HttpResponseError) and status not in _RETRYABLE_STATUS):
+                raise
+            delay = _retry_after(e) or _backoff(attempt)
+            logger.warning(f"{description} throttled or failed (status {status}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _backoff(attempt: int) -> float:
+    return get_settings().upload_backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+# ---------------------------
+# Embeddings
+# ---------------------------
+def embed_documents(documents: List[Dict], embed: Callable[[List[str]], List[List[float]]]) -> None:
+    """
+    Add the embedding of each document's content in the SEARCH_VECTOR_FIELD field, in place.
+    :param embed: Batch embedding function, normally `get_embeddings_client().embed_documents`, which
+                  batches, parallelises and caches the calls (EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY)
+    """
+    field = get_settings().search_vector_field
+    vectors = embed([document.get("content", "") for document in documents])
+    for document, vector in zip(documents, vectors):
+        document[field] = vector
+
+# ---------------------------
+# Bulk Push
+# ---------------------------
+def bulk_upload(
+    documents: Sequence[Dict],
+    search_client: SearchClient,
+    action: str = "merge_or_upload",
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+) -> Dict[str, object]:
+    """
+    Push documents to the index in batches, several batches at a time.
+    :param documents: Index-ready documents (e.g. from the local ingestion pipeline)
+    :param search_client: Client of the target index
+    :param action: "upload", "merge_or_upload" or "delete"
+    :param batch_size: Documents per indexing request (the service accepts up to 1000), UPLOAD_BATCH_SIZE by default
+    :param concurrency: Indexing requests in flight, UPLOAD_CONCURRENCY by default
+    :param embed: Optional batch embedding function filling the vector field before upload
+    :return: Number of succeeded documents and the keys that failed
+    """
+    settings = get_settings()
+    batch_size = batch_size or settings.upload_batch_size
+    concurrency = concurrency or settings.upload_concurrency
+    documents = list(documents)
+    if embed is not None and action != "delete":
+        embed_documents(documents, embed)
+
+    send = getattr(search_client, f"{action}_documents")
+
+    def push(batch: List[Dict]) -> List[str]:
+        pending = batch
+        failed: List[str] = []
+        for attempt in range(settings.upload_max_retries + 1):
+            results = call_with_retry(send, documents=pending, description=f"{action} of {len(pending)} documents")
+            throttled = {r.key for r in results if not r.succeeded and r.status_code in _RETRYABLE_STATUS}
+            failed.extend(r.key for r in results if not r.succeeded and r.status_code not in _RETRYABLE_STATUS)
+            if not throttled or attempt == settings.upload_max_retries:
+                break
+            # only the documents the service throttled are sent again
+            pending = [document for document in pending if document["id"] in throttled]
+            time.sleep(_backoff(attempt))
+        if failed or throttled:
+            logger.error(f"{action} failed for documents: {failed + sorted(throttled)}")
+        return failed + sorted(throttled)
+
+    batches = [documents[start:start + batch_size] for start in range(0, len(documents), batch_size)]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        failed = [key for keys in executor.map(push, batches) for key in keys]
+    elapsed = time.perf_counter() - start_time
+
+    succeeded = len(documents) - len(failed)
+    logger.info(f"{action}: {succeeded}/{len(documents)} documents in {elapsed:.1f}s ({succeeded / elapsed if elapsed else 0:.0f} docs/s)")
+    return {"succeeded": succeeded, "failed": failed}
+
+def bulk_delete(ids: Sequence[str], search_client: SearchClient, **kwargs) -> Dict[str, object]:
+    return bulk_upload([{"id": document_id} for document_id in ids], search_client, action="delete", **kwargs)
+
+# ---------------------------
+# Entrypoint
+# ---------------------------
+
+if __name__ == "__main__":
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    from azure_ai_search import get_embeddings_client
+
+    settings = get_settings()
+    settings.require_search_service()
+    client = SearchClient(
+        settings.search_service_endpoint,
+        settings.chunk_index(),
+        AzureKeyCredential(settings.search_service_key),
+    )
+    bulk_upload(load_documents(settings.local_documents_path), client, embed=get_embeddings_client().embed_documents)
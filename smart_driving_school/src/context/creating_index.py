@@ -1,6 +1,8 @@
-import os
+import sys
 import logging
-from dotenv import load_dotenv
+from pathlib import Path
+from typing import Optional
+
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import HttpResponseError
 from azure.search.documents.indexes import SearchIndexerClient, SearchIndexClient
@@ -10,36 +12,42 @@ from azure.search.documents.indexes.models import (
     SearchFieldDataType,
     SimpleField,
     SearchableField,
+    SearchField,
     CorsOptions,
     SearchIndex,
+    VectorSearch,
+    VectorSearchProfile,
+    HnswAlgorithmConfiguration,
 )
 
+# the settings module lives in the src directory above
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from settings import get_settings
+
 # -------------------------
 # Logging Setup
 # -------------------------
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-
-# -------------------------
-# Environment Variables
-# -------------------------
-load_dotenv(override=True)
-
-service_endpoint = os.environ["SEARCH_SERVICE_ENDPOINT"]
-key = os.environ["SEARCH_SERVICE_KEY"]
-connection_string = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
-
-# These can be customized via env for CI/CD flexibility
-BLOB_CONTAINER_NAME = os.getenv("BLOB_CONTAINER_NAME", "drvschoolcontainer")
-DATASOURCE_NAME = os.getenv("DATASOURCE_NAME", "drvschool-datasource")
-INDEX_NAME = os.getenv("INDEX_NAME", "drvschoollessons-index")
 
 # -------------------------
 # Azure AI Search Functions
 # -------------------------
 
-def create_index() -> SearchIndex:
-    """Create (or reuse) an Azure Cognitive Search index for PDF documents with key phrases."""
+def search_credential() -> AzureKeyCredential:
+    """Credential of the search service, which must be configured (SEARCH_SERVICE_ENDPOINT and SEARCH_SERVICE_KEY)."""
+    settings = get_settings()
+    if not settings.search_service_endpoint or not settings.search_service_key:
+        raise ValueError("SEARCH_SERVICE_ENDPOINT and SEARCH_SERVICE_KEY must be set.")
+    return AzureKeyCredential(settings.search_service_key)
+
+def create_index(index_name: Optional[str] = None) -> SearchIndex:
+    """
+    Create (or reuse) an Azure Cognitive Search index for PDF documents with key phrases.
+    :param index_name: INDEX_NAME (the default) for the blob indexer, CHUNK_INDEX_NAME for the chunks pushed by the local pipeline
+    """
+    settings = get_settings()
+    index_name = index_name or settings.index_name
     fields = [
         SimpleField(name="id", type=SearchFieldDataType.String, retrievable=True, key=True),
         SimpleField(name="metadata_storage_name", type=SearchFieldDataType.String, retrievable=True, filterable=True, sortable=True, facetable=True),
@@ -50,45 +58,60 @@ def create_index() -> SearchIndex:
         SimpleField(name="metadata_storage_path", type=SearchFieldDataType.String),
         SimpleField(name="keyPhrases", type=SearchFieldDataType.Collection(SearchFieldDataType.String), searchable=True, retrievable=True, filterable=True, facetable=True),
         SimpleField(name="mergedContent", type=SearchFieldDataType.String, searchable=True, retrievable=True),
+        # chunk embeddings used by the hybrid (keyword + vector) retrieval mode
+        SearchField(
+            name=settings.search_vector_field,
+            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            searchable=True,
+            vector_search_dimensions=settings.embedding_dimensions,
+            vector_search_profile_name="drvschool-hnsw-profile",
+        ),
     ]
 
+    vector_search = VectorSearch(
+        algorithms=[HnswAlgorithmConfiguration(name="drvschool-hnsw")],
+        profiles=[VectorSearchProfile(name="drvschool-hnsw-profile", algorithm_configuration_name="drvschool-hnsw")],
+    )
     cors_options = CorsOptions(allowed_origins=["*"], max_age_in_seconds=60)
-    index = SearchIndex(name=INDEX_NAME, fields=fields, cors_options=cors_options)
+    index = SearchIndex(name=index_name, fields=fields, vector_search=vector_search, cors_options=cors_options)
 
-    index_client = SearchIndexClient(service_endpoint, AzureKeyCredential(key))
+    index_client = SearchIndexClient(settings.search_service_endpoint, search_credential())
 
     try:
         created_index = index_client.create_index(index)
-        logger.info(f"Index '{INDEX_NAME}' created successfully with key phrases field.")
+        logger.info(f"Index '{index_name}' created successfully with key phrases field.")
         return created_index
     except HttpResponseError as e:
         if e.status_code == 409:
-            logger.warning(f"⚠️ Index '{INDEX_NAME}' already exists. Fetching existing index.")
-            return index_client.get_index(INDEX_NAME)
+            logger.warning(f"⚠️ Index '{index_name}' already exists. Fetching existing index.")
+            return index_client.get_index(index_name)
         else:
             logger.exception("❌ Failed to create or retrieve index.")
             raise
 
 def create_datasource() -> SearchIndexerDataSourceConnection:
     """Create (or reuse) an Azure Cognitive Search data source for Blob Storage."""
-    indexer_client = SearchIndexerClient(service_endpoint, AzureKeyCredential(key))
-    container = SearchIndexerDataContainer(name=BLOB_CONTAINER_NAME)
+    settings = get_settings()
+    if not settings.azure_storage_connection_string:
+        raise ValueError("AZURE_STORAGE_CONNECTION_STRING must be set.")
+    indexer_client = SearchIndexerClient(settings.search_service_endpoint, search_credential())
+    container = SearchIndexerDataContainer(name=settings.blob_container_name)
 
     datasource = SearchIndexerDataSourceConnection(
-        name=DATASOURCE_NAME,
+        name=settings.datasource_name,
         type="azureblob",
-        connection_string=connection_string,
+        connection_string=settings.azure_storage_connection_string,
         container=container
     )
 
     try:
         created_ds = indexer_client.create_data_source_connection(datasource)
-        logger.info(f"Data source '{DATASOURCE_NAME}' created successfully.")
+        logger.info(f"Data source '{settings.datasource_name}' created successfully.")
         return created_ds
     except HttpResponseError as e:
         if e.status_code == 409:
-            logger.warning(f"Data source '{DATASOURCE_NAME}' already exists. Fetching existing connection.")
-            return indexer_client.get_data_source_connection(DATASOURCE_NAME)
+            logger.warning(f"Data source '{settings.datasource_name}' already exists. Fetching existing connection.")
+            return indexer_client.get_data_source_connection(settings.datasource_name)
         else:
             logger.exception("Failed to create or retrieve data source.")
             raise
@@ -1,6 +1,10 @@
+import sys
+import argparse
+import hashlib
+import json
 import logging
-import os
-from azure.core.credentials import AzureKeyCredential
+from pathlib import Path
+
 from azure.core.exceptions import HttpResponseError
 from azure.search.documents.indexes import SearchIndexerClient
 from azure.search.documents.indexes.models import (
@@ -15,34 +19,28 @@ from azure.search.documents.indexes.models import (
     OutputFieldMappingEntry,
     FieldMapping)
 
-from dotenv import load_dotenv
-from creating_index import create_datasource, create_index
+from azure.search.documents import SearchClient
 
-# ---------------------------
-# Configuration
-# ---------------------------
-load_dotenv(override=True)
+# the settings and search modules live in the src directory above
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-# Environment variables
-INDEXER_NAME = os.getenv("INDEXER_NAME", "drvschool-indexer")
-SKILLSET_NAME = os.getenv("SKILLSET_NAME", "drvschool-skillset")
-PARSING_MODE = os.getenv("PARSING_MODE", "default")
-SEARCH_SERVICE_ENDPOINT = os.environ["SEARCH_SERVICE_ENDPOINT"]
-SEARCH_SERVICE_KEY = os.environ["SEARCH_SERVICE_KEY"]
-COGNITIVE_SERVICES_KEY = os.environ.get("COGNITIVE_SERVICES_KEY")
+from settings import get_settings, load_environment
+from creating_index import create_datasource, create_index, search_credential
+from incremental_indexing import load_manifest, run_incremental_indexing, save_manifest
 
 # ---------------------------
 # Logger Setup
 # ---------------------------
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 def create_skillset():
     """
     Create a skillset for PDF processing with OCR and Key Phrase Extraction capabilities.
     """
-    client = SearchIndexerClient(SEARCH_SERVICE_ENDPOINT, AzureKeyCredential(SEARCH_SERVICE_KEY))
+    settings = get_settings()
+    skillset_name = settings.skillset_name
+    client = SearchIndexerClient(settings.search_service_endpoint, search_credential())
     
     # Document Extraction - Extract text and images from PDFs
     doc_extraction_input = InputFieldMappingEntry(name="file_data", source="/document/file_data")
@@ -86,38 +84,68 @@ def create_skillset():
     
     # Create skillset with all skills
     skillset = SearchIndexerSkillset(
-        name=SKILLSET_NAME, 
+        name=skillset_name,
         skills=[doc_extraction_skill, ocr_skill, merge_skill, keyphrases_skill], 
         description="Skillset for PDF content extraction, OCR, and key phrase extraction",
         cognitive_services_account={
             "@odata.type": "#Microsoft.Azure.Search.CognitiveServicesByKey",
-            "key": COGNITIVE_SERVICES_KEY
-        } if COGNITIVE_SERVICES_KEY else None
+            "key": settings.cognitive_services_key
+        } if settings.cognitive_services_key else None
     )
     
+    # updating a skillset invalidates the enrichment of every document, so it is skipped
+    # when the definition did not change since the last run recorded in the manifest
+    manifest = load_manifest()
+    definition_hash = hashlib.sha256(json.dumps(skillset.as_dict(), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
     try:
         result = client.create_skillset(skillset)
-        logger.info(f"Skillset '{SKILLSET_NAME}' created successfully.")
-        return result
+        logger.info(f"Skillset '{skillset_name}' created successfully.")
     except HttpResponseError as e:
         if e.status_code == 409:
-            logger.warning(f"Skillset '{SKILLSET_NAME}' already exists. Updating...")
+            if manifest.get("skillset") == definition_hash:
+                logger.info(f"Skillset '{skillset_name}' already exists and is unchanged. Skipping update.")
+                return client.get_skillset(skillset_name)
+            logger.warning(f"Skillset '{skillset_name}' already exists. Updating...")
             result = client.create_or_update_skillset(skillset)
-            logger.info(f"Skillset '{SKILLSET_NAME}' updated successfully.")
-            return result
+            logger.info(f"Skillset '{skillset_name}' updated successfully.")
         else:
             raise
 
+    manifest["skillset"] = definition_hash
+    save_manifest(manifest)
+    return result
+
 # ---------------------------
 # Main Workflow
 # ---------------------------
 
-def run_indexer_workflow() -> None:
+def run_indexer_workflow(incremental: bool = False, dry_run: bool = False) -> None:
     """
     Main workflow to create and run the Azure AI Search indexer for PDFs with key phrase extraction.
+
+    In incremental mode the cloud indexer is not run over the whole container: the local ingestion
+    pipeline re-extracts only the PDFs whose content hash changed, and only their new or modified
+    chunks are pushed (stale chunks are deleted). They go to CHUNK_INDEX_NAME, not to the blob
+    indexer's index, whose whole-document entries would duplicate them; point SEARCH_SERVICE_INDEX_NAME
+    at it to query the chunks. With dry_run, only the report of what would be touched is logged.
     """
+    settings = get_settings()
+    if incremental:
+        chunk_index = settings.chunk_index()
+        if not dry_run:
+            create_index(chunk_index)
+        search_client = SearchClient(settings.search_service_endpoint, chunk_index, search_credential())
+        logger.info(f"Indexing the changed chunks into '{chunk_index}'")
+        from azure_ai_search import get_embeddings_client
+
+        run_incremental_indexing(
+            search_client, dry_run=dry_run, embed=get_embeddings_client().embed_documents, index_name=chunk_index
+        )
+        return
+
     try:
-        indexer_client = SearchIndexerClient(SEARCH_SERVICE_ENDPOINT, AzureKeyCredential(SEARCH_SERVICE_KEY))
+        indexer_client = SearchIndexerClient(settings.search_service_endpoint, search_credential())
         
         # Create data source
         data_source = create_datasource()
@@ -132,14 +160,14 @@ def run_indexer_workflow() -> None:
 
         # Create indexer with skillset
         indexer = SearchIndexer(
-            name=INDEXER_NAME,
+            name=settings.indexer_name,
             description="Indexer for driving school content with AI enrichment and key phrase extraction",
             data_source_name=data_source.name,
             target_index_name=index.name,
-            skillset_name=SKILLSET_NAME,
+            skillset_name=settings.skillset_name,
             parameters=IndexingParameters(
                 configuration={
-                    "parsingMode": PARSING_MODE,
+                    "parsingMode": settings.parsing_mode,
                     "dataToExtract": "contentAndMetadata",
                     "imageAction": "generateNormalizedImages",
                     "allowSkillsetToReadFileData": True
@@ -153,17 +181,17 @@ def run_indexer_workflow() -> None:
 
         try:
             indexer_client.create_indexer(indexer)
-            logger.info(f"Indexer '{INDEXER_NAME}' created successfully.")
+            logger.info(f"Indexer '{settings.indexer_name}' created successfully.")
         except HttpResponseError as e:
             if e.status_code == 409:
-                logger.warning(f"Indexer '{INDEXER_NAME}' already exists. Updating...")
+                logger.warning(f"Indexer '{settings.indexer_name}' already exists. Updating...")
                 indexer_client.create_or_update_indexer(indexer)
-                logger.info(f"Indexer '{INDEXER_NAME}' updated successfully.")
+                logger.info(f"Indexer '{settings.indexer_name}' updated successfully.")
             else:
                 raise
 
         # Confirm indexer creation
-        result = indexer_client.get_indexer(INDEXER_NAME)
+        result = indexer_client.get_indexer(settings.indexer_name)
         logger.info(f"Indexer retrieved: {result.name}")
 
         # Run indexer
@@ -187,4 +215,10 @@ def run_indexer_workflow() -> None:
 # ---------------------------
 
 if __name__ == "__main__":
-    run_indexer_workflow()
\ No newline at end of file
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Create and run the driving school search indexer.")
+    parser.add_argument("--incremental", action="store_true", help="only re-index the PDFs and chunks that changed")
+    parser.add_argument("--dry-run", action="store_true", help="with --incremental, only report what would be touched")
+    args = parser.parse_args()
+    run_indexer_workflow(incremental=args.incremental, dry_run=args.dry_run)
\ No newline at end of file
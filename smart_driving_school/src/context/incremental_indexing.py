@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, Optional
+
+from azure.search.documents import SearchClient
+
+from bulk_upload import bulk_delete, bulk_upload
+from local_ingestion import build_chunk_documents, extract_documents, list_pdfs
+
+# the settings module lives in the src directory above
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from settings import get_settings
+
+# ---------------------------
+# Logger Setup
+# ---------------------------
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Hashing and Manifest
+# ---------------------------
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(document: Dict) -> str:
+    """Hash of every indexed field of a chunk, so an enrichment change is detected too."""
+    return hashlib.sha256(json.dumps(document, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def load_manifest(path: Optional[str] = None) -> Dict:
+    """
+    Load the ingestion manifest (INDEX_MANIFEST_PATH when no path is given):
+    {"skillset": <definition hash>, "index": <index the chunks were pushed to>,
+     "documents": {file name: {"sha256": ..., "chunks": {chunk id: chunk hash}}}}
+    """
+    path = path or get_settings().index_manifest_path
+    if not os.path.exists(path):
+        return {"skillset": None, "documents": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: Dict, path: Optional[str] = None) -> None:
+    path = path or get_settings().index_manifest_path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# ---------------------------
+# Planning
+# ---------------------------
+def plan_incremental_update(data_dir: Optional[str] = None, manifest: Optional[Dict] = None) -> Dict:
+    """
+    Compare the PDFs in data_dir with the manifest. Only new or modified PDFs are re-extracted,
+    and of their chunks only the new or modified ones are scheduled for upload.
+
+    Returns:
+        dict: "report" (what would be touched), "uploads" (chunk documents), "deletes" (chunk ids)
+              and "documents" (the manifest entries after the update).
+    """
+    manifest = manifest if manifest is not None else load_manifest()
+    previous = manifest.get("documents", {})
+    paths = {Path(path).name: path for path in list_pdfs(data_dir)}
+
+    hashes = {name: file_hash(path) for name, path in paths.items()}
+    modified = [name for name in paths if name in previous and previous[name]["sha256"] != hashes[name]]
+    added = [name for name in paths if name not in previous]
+    removed = [name for name in previous if name not in paths]
+    unchanged = [name for name in paths if name in previous and name not in modified]
+
+    extracted = extract_documents([paths[name] for name in added + modified]) if added or modified else {}
+
+    uploads: List[Dict] = []
+    deletes: List[str] = []
+    documents = {name: previous[name] for name in unchanged}
+    chunks_unchanged = 0
+    for name in added + modified:
+        old_chunks = previous.get(name, {}).get("chunks", {})
+        new_chunks = {}
+        for chunk in build_chunk_documents(paths[name], extracted.get(paths[name], [])):
+            new_chunks[chunk["id"]] = chunk_hash(chunk)
+            if old_chunks.get(chunk["id"]) == new_chunks[chunk["id"]]:
+                chunks_unchanged += 1
+            else:
+                uploads.append(chunk)
+        deletes.extend(chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks)
+        documents[name] = {"sha256": hashes[name], "chunks": new_chunks}
+    for name in removed:
+        deletes.extend(previous[name]["chunks"])
+
+    report = {
+        "added": added,
+        "modified": modified,
+        "removed": removed,
+        "unchanged": unchanged,
+        "chunks_to_upload": len(uploads),
+        "chunks_to_delete": len(deletes),
+        "chunks_unchanged": chunks_unchanged + sum(len(previous[name]["chunks"]) for name in unchanged),
+    }
+    return {"report": report, "uploads": uploads, "deletes": deletes, "documents": documents}
+
+# ---------------------------
+# Incremental Update
+# ---------------------------
+def apply_plan(plan: Dict, search_client: SearchClient, embed: Optional[Callable[[List[str]], List[List[float]]]] = None) -> List[str]:
+    """
+    Push the changed chunks (with their embeddings when embed is given) and delete the stale ones.
+    :return: Ids of the chunks that could not be uploaded
+    """
+    failed: List[str] = []
+    if plan["uploads"]:
+        failed = bulk_upload(plan["uploads"], search_client, embed=embed)["failed"]
+    if plan["deletes"]:
+        bulk_delete(plan["deletes"], search_client)
+    return failed
+
+def settle_failed_uploads(documents: Dict, failed: Collection[str]) -> Dict:
+    """
+    Manifest entries after an update some chunks of which failed to upload: the failed chunks are left out,
+    and their document's hash is cleared so the next run plans the document again and retries them.
+    """
+    failed = set(failed)
+    settled = {}
+    for name, entry in documents.items():
+        chunks = {chunk_id: digest for chunk_id, digest in entry["chunks"].items() if chunk_id not in failed}
+        sha256 = entry["sha256"] if len(chunks) == len(entry["chunks"]) else None
+        settled[name] = {"sha256": sha256, "chunks": chunks}
+    return settled
+
+def run_incremental_indexing(
+    search_client: SearchClient,
+    data_dir: Optional[str] = None,
+    dry_run: bool = False,
+    embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    manifest_path: Optional[str] = None,
+    index_name: Optional[str] = None,
+) -> Dict:
+    """
+    Re-index only what changed since the last run recorded in the manifest.
+    :param search_client: Client of the target index
+    :param data_dir: Directory holding the course PDFs, DATA_DIR when unset
+    :param dry_run: Only report what would be touched, without uploading or updating the manifest
+    :param embed: Optional batch embedding function filling the vector field of uploaded chunks
+    :param manifest_path: Manifest of the previous run, updated in place; INDEX_MANIFEST_PATH when unset
+    :param index_name: Name of the target index; chunks the manifest records for another index are pushed again
+    :return: The report of the update
+    """
+    manifest = load_manifest(manifest_path)
+    if index_name and manifest.get("index") != index_name:
+        if manifest.get("documents"):
+            logger.warning(f"The manifest records chunks of index '{manifest.get('index')}', re-indexing everything into '{index_name}'")
+        manifest = {**manifest, "index": index_name, "documents": {}}
+    plan = plan_incremental_update(data_dir, manifest)
+    report = plan["report"]
+    logger.info(
+        f"{'[dry-run] ' if dry_run else ''}PDFs added={report['added']} modified={report['modified']} "
+        f"removed={report['removed']} unchanged={len(report['unchanged'])}; chunks to upload={report['chunks_to_upload']} "
+        f"to delete={report['chunks_to_delete']} unchanged={report['chunks_unchanged']}"
+    )
+    if dry_run:
+        return report
+
+    failed = apply_plan(plan, search_client, embed=embed)
+    manifest["documents"] = settle_failed_uploads(plan["documents"], failed)
+    save_manifest(manifest, manifest_path)
+    if failed:
+        logger.warning(f"{len(failed)} chunks failed to upload; their documents are retried on the next run.")
+    logger.info("Incremental indexing completed, manifest updated.")
+    return report
@@ -0,0 +1,203 @@
+import os
+import re
+import sys
+import json
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+# the settings module lives in the src directory above
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from settings import get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Configuration
+# ---------------------------
+_STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i if
+in into is it its itself just may me might more most must my no nor not now of off on once only or other our ours out
+over own same shall she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+_WORD = re.compile(r"[a-zA-Z][a-zA-Z'\-]*")
+_PHRASE_BREAK = re.compile(r"[^a-zA-Z'\-\s]+")
+_KEY_UNSAFE = re.compile(r"[^a-zA-Z0-9_\-]+")
+
+# ---------------------------
+# Extraction
+# ---------------------------
+def _extract_page_range(task: Tuple[str, int, int]) -> Tuple[str, int, List[str]]:
+    """Worker: extract the text of pages [start, end) of one PDF."""
+    path, start, end = task
+    reader = PdfReader(path)
+    return path, start, [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def extract_documents(paths: Iterable[str], workers: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    Extract the page texts of PDFs, spreading page ranges across a process pool.
+    :param paths: PDF files to extract
+    :param workers: Number of worker processes, INGESTION_WORKERS when unset
+    :return: Page texts per PDF path, in page order
+    """
+    settings = get_settings()
+    workers = workers or _workers()
+    pages_per_task = settings.pages_per_task
+    tasks = []
+    for path in paths:
+        page_count = len(PdfReader(path).pages)
+        tasks.extend((path, start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+
+    pages: Dict[str, Dict[int, List[str]]] = defaultdict(dict)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, start, texts in executor.map(_extract_page_range, tasks):
+            pages[path][start] = texts
+    return {path: [text for start in sorted(ranges) for text in ranges[start]] for path, ranges in pages.items()}
+
+# ---------------------------
+# Chunking and Enrichment
+# ---------------------------
+def _workers() -> int:
+    return get_settings().ingestion_workers or os.cpu_count() or 1
+
+def chunk_text(text: str, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks of about `chunk_size` characters overlapping by `overlap` characters
+    (CHUNK_SIZE and CHUNK_OVERLAP when unset).
+    Chunk boundaries are moved back to the previous whitespace so words are not cut.
+    """
+    settings = get_settings()
+    chunk_size = settings.chunk_size if chunk_size is None else chunk_size
+    overlap = settings.chunk_overlap if overlap is None else overlap
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError(f"Chunking needs 0 <= overlap < chunk_size, got overlap={overlap}, chunk_size={chunk_size}.")
+    text = re.sub(r"\s+", " ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            boundary = text.rfind(" ", start + overlap + 1, end)
+            if boundary != -1:
+                end = boundary
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = end - overlap
+        # start the next chunk on a word boundary as well
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [chunk for chunk in chunks if chunk]
+
+def extract_key_phrases(text: str, top_k: Optional[int] = None) -> List[str]:
+    """
+    RAKE-style key phrase extraction: candidate phrases are runs of non-stopwords, scored by the
+    sum of their words' degree/frequency ratio. Stands in for the cognitive KeyPhraseExtractionSkill.
+    Returns the `top_k` best phrases, KEY_PHRASES_PER_CHUNK when unset.
+    """
+    top_k = get_settings().key_phrases_per_chunk if top_k is None else top_k
+    candidates = []
+    for fragment in _PHRASE_BREAK.split(text.lower()):
+        phrase = []
+        for word in fragment.split():
+            if word in _STOPWORDS or not _WORD.fullmatch(word) or len(word) < 3:
+                if phrase:
+                    candidates.append(tuple(phrase))
+                phrase = []
+            else:
+                phrase.append(word)
+        if phrase:
+            candidates.append(tuple(phrase))
+
+    frequency: Counter = Counter()
+    degree: Counter = Counter()
+    for phrase in candidates:
+        if len(phrase) > 4:
+            continue
+        for word in phrase:
+            frequency[word] += 1
+            degree[word] += len(phrase)
+
+    scores = {}
+    for phrase in set(candidates):
+        if len(phrase) <= 4:
+            scores[" ".join(phrase)] = sum(degree[word] / frequency[word] for word in phrase)
+    return [phrase for phrase, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]]
+
+def document_key(path: str) -> str:
+    """Index key prefix for a source file (Azure keys allow letters, digits, '_' and '-')."""
+    return _KEY_UNSAFE.sub("-", Path(path).stem).strip("-").lower()
+
+def build_chunk_documents(path: str, pages: List[str]) -> List[Dict]:
+    """Turn the pages of one PDF into index-ready chunk documents (the fields of `create_index`)."""
+    name = Path(path).name
+    stem = Path(path).stem
+    documents = []
+    for number, chunk in enumerate(chunk_text("\n".join(pages))):
+        documents.append({
+            "id": f"{document_key(path)}-{number:04d}",
+            "metadata_storage_name": name,
+            "metadata_storage_path": str(path),
+            "name": stem,
+            "category": "course",
+            "topic": stem.replace("-", " "),
+            "content": chunk,
+            "mergedContent": chunk,
+            "keyPhrases": extract_key_phrases(chunk),
+        })
+    return documents
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+def list_pdfs(data_dir: Optional[str] = None) -> List[str]:
+    return sorted(str(path) for path in Path(data_dir or get_settings().data_dir).glob("*.pdf"))
+
+def ingest(data_dir: Optional[str] = None, output_path: Optional[str] = None, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Local stand-in for the Azure indexer + skillset: extract, chunk and enrich the course PDFs
+    and write the index-ready documents as JSON lines.
+    :param data_dir: Directory holding the PDFs, DATA_DIR when unset
+    :param output_path: JSONL file receiving one document per line, LOCAL_DOCUMENTS_PATH when unset
+    :param workers: Number of extraction worker processes, INGESTION_WORKERS when unset
+    """
+    settings = get_settings()
+    data_dir = data_dir or settings.data_dir
+    output_path = output_path or settings.local_documents_path
+    workers = workers or _workers()
+    paths = list_pdfs(data_dir)
+    logger.info(f"Extracting {len(paths)} PDFs from '{data_dir}' with {workers} workers")
+    extracted = extract_documents(paths, workers=workers)
+
+    documents = []
+    for path in paths:
+        documents.extend(build_chunk_documents(path, extracted.get(path, [])))
+    write_documents(documents, output_path)
+    logger.info(f"Wrote {len(documents)} chunks to '{output_path}'")
+    return documents
+
+def write_documents(documents: Iterable[Dict], output_path: str) -> None:
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for document in documents:
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+
+def load_documents(path: Optional[str] = None) -> List[Dict]:
+    with open(path or get_settings().local_documents_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------------------------
+# Entrypoint
+# ---------------------------
+
+if __name__ == "__main__":
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    ingest()
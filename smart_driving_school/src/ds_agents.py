@@ -1,15 +1,40 @@
-from typing import Literal
+from typing import List, Literal, Optional
 from state import QuizList, State, Quiz
-from prompts import teacher_prompt, quiz_prompt
-from model import load_model
+from prompts import teacher_prompt, quiz_prompt, quiz_list_prompt
+from model import get_runnable
+from settings import get_settings
+from quiz_bank import BANK_ID_PREFIX, draw_quizzes
+from grading import feedback_message, format_score_table, grade_answer, update_scores
+from summarization import summarize_history, asummarize_history
 from tools import (
     quiz_preparation_tool,
+    read_course_chunk_tool,
     search_course_documents_tool,
     teacher_understanding_tool,
 )
 from langgraph.types import interrupt, Command
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
+# tools whose calls only update the state; the teacher agent applies them itself, the others go to the tool node
+STATE_TOOLS = ("quiz_preparation_tool", "teacher_understanding_tool")
+
+def build_teacher_chain(model):
+    """Builds the teacher chain: the teacher prompt piped into the model with the teacher's tools bound."""
+    model = model.bind_tools([
+        quiz_preparation_tool, # a tool gives the agent ability to prepare quiz topics and study material
+        teacher_understanding_tool, # a tool gives the agent ability to ask clarifying questions
+        search_course_documents_tool, # a tool gives the agent ability to search course documents
+        read_course_chunk_tool # a tool gives the agent ability to read the full text around a search hit
+    ])
+    return teacher_prompt | model
+
+def build_quiz_chain(model):
+    """Builds the quiz chain: the quiz prompt piped into the model with `Quiz` structured output."""
+    return quiz_prompt | model.with_structured_output(Quiz)
+
+def build_quiz_list_chain(model):
+    """Builds the quiz list chain: one structured `QuizList` call covering every quiz topic."""
+    return quiz_list_prompt | model.with_structured_output(QuizList)
 
 def teacher_agent(state: State):
     """
@@ -25,53 +50,111 @@ def teacher_agent(state: State):
     Returns:
         dict: shared state modified.
     """
+    # older turns are folded into the conversation summary once the history exceeds its token budget
+    summary_update = summarize_history(state)
+    # the model with its tools bound is built once per process and reused across turns
+    chain = get_runnable("teacher", build_teacher_chain)
+    response = chain.invoke(teacher_inputs(state, summary_update))
+    return with_summary_update(handle_teacher_response(response), summary_update)
+
+async def ateacher_agent(state: State):
+    """
+    Async version of `teacher_agent`, used when the graph is driven with `ainvoke`/`astream`.
+    """
+    summary_update = await asummarize_history(state)
+    chain = get_runnable("teacher", build_teacher_chain)
+    response = await chain.ainvoke(teacher_inputs(state, summary_update))
+    return with_summary_update(handle_teacher_response(response), summary_update)
+
+def teacher_inputs(state: State, summary_update: dict) -> dict:
+    """Builds the teacher prompt inputs, using the folded history when the summary was just updated."""
     # getting list of messages
-    messages = state.get("messages", [])
-    quiz_history = state.get("quiz_history", [])
-    quiz_completed = state.get("quiz_completed", False)
-    # loading the model and binding the tools to it
-    model = load_model()
-    model = model.bind_tools([
-        quiz_preparation_tool, # a tool gives the agent ability to prepare quiz topics and study material
-        teacher_understanding_tool, # a tool gives the agent ability to ask clarifying questions
-        search_course_documents_tool # a tool gives the agent ability to search course documents
-    ])
-    chain = teacher_prompt | model
-    response = chain.invoke({
-        "messages": messages,
-        "quiz_history": quiz_history
-    })
+    state = {**state, **summary_update}
+    return {
+        "messages": without_quiz_exchange(state.get("messages", [])),
+        "quiz_scores": format_score_table(state.get("quiz_scores"), state.get("quiz_history")),
+        "conversation_summary": state.get("conversation_summary", "")
+    }
+
+def without_quiz_exchange(messages: List) -> List:
+    """
+    Drops the quiz questions and the student's answers from the teacher's messages: the answers are
+    graded locally and reach the teacher through the score table. The last message is always kept.
+    """
+    return [
+        message for message in messages[:-1]
+        if not (isinstance(message, AIMessage) and message.name == "quiz_agent")
+        and not (isinstance(message, HumanMessage) and message.name == "student")
+    ] + list(messages[-1:])
+
+def with_summary_update(update: dict, summary_update: dict) -> dict:
+    """Adds the summary, cleared quiz history and removal of the folded messages to a teacher update."""
+    if not summary_update:
+        return update
+    messages = update.get("messages", [])
+    messages = messages if isinstance(messages, list) else [messages]
+    return {
+        **update,
+        "conversation_summary": summary_update["conversation_summary"],
+        "quiz_history": summary_update["quiz_history"],
+        "messages": summary_update["removed_messages"] + messages
+    }
+
+def handle_teacher_response(response):
+    """
+    Turns the teacher model response into the state update of the teacher agent.
+    Every tool call of the response is handled in this step: the state-only tools are applied here
+    and answered with a `ToolMessage`, the other calls (course search, chunk reads) are left pending
+    for the tool node, which runs them together.
+
+    Args:
+        response (AIMessage): The teacher model response, a message or tool call(s).
+
+    Returns:
+        dict: shared state modified.
+    """
+    # if there is no tool calls means the agent decided to answer the user question
+    if not response.tool_calls:
+        return {
+                    "messages": response,
+                    "sender": "teacher_agent"
+                }
 
-    # the response can be either a message or a tool call(s)
+    update = {"messages": [response], "sender": "teacher_agent"}
+    searching = any(calls['name'] not in STATE_TOOLS for calls in response.tool_calls)
+    preparing_quiz = any(calls['name'] == "quiz_preparation_tool" for calls in response.tool_calls)
+    clarifying_question = None
     for calls in response.tool_calls:
-        # if the tool was teacher_understanding_tool means the agent decided to ask clarifying question
-        # so we push the passed payload that holds the clarifying question to the list of messages
-        if calls['name'] == "teacher_understanding_tool":
-            return {
-                "messages": calls['args']['clarifying_question'],
-                "sender": "teacher_agent" # this used by the tool node to know which agent to call next
-            }
-        # if the tool was teacher_understanding_tool means the agent decided to prepare quiz topics and study material
+        # if the tool was quiz_preparation_tool means the agent decided to prepare quiz topics and study material
         # so we push the passed payload that holds the quiz topics, study material to the varaibles in the state
         if calls['name'] == "quiz_preparation_tool":
-            return {
+            update.update({
                 "quiz_topics": calls['args']['quiz_covered_topics'],
                 "quiz_study_material": calls['args']['theory_study_material'],
-                "sender": "teacher_agent",
-                "is_asking_for_quiz": True
-            }
-        # if the tool was search_course_documents_tool means the agent decided to search course documents
-        # so we push the passed payload that holds the search result to the list of messages
+                "is_asking_for_quiz": True,
+                # a quiz abandoned half-way leaves its questions behind: the new quiz starts from a clean slate
+                "quiz_queue": [],
+                "current_quiz": None,
+                "quiz_completed": False,
+            })
+            content = f"Quiz prepared on: {', '.join(calls['args']['quiz_covered_topics'])}."
+        # if the tool was teacher_understanding_tool means the agent decided to ask clarifying question,
+        # it is asked once the searches of this step are done, unless the quiz starts right away
+        elif calls['name'] == "teacher_understanding_tool":
+            if preparing_quiz:
+                content = "Not asked: the quiz was prepared instead."
+            elif searching:
+                content = "Not asked yet: waiting for the course search results."
+            else:
+                clarifying_question = calls['args']['clarifying_question']
+                content = "Asked to the student."
         else:
-            return {
-                "messages": response,
-                "sender": "teacher_agent"
-            }
-    # if there is no tool calls means the agent decided to answer the user question
-    return {
-                "messages": response,
-                "sender": "teacher_agent"
-            }
+            continue
+        update["messages"].append(ToolMessage(content=content, name=calls['name'], tool_call_id=calls['id']))
+
+    if clarifying_question:
+        update["messages"].append(AIMessage(content=clarifying_question, name="teacher_agent"))
+    return update
 
 def quiz_agent(state: State):
     """
@@ -84,48 +167,159 @@ def quiz_agent(state: State):
         dict | None: A dictionary containing the AI-generated quiz message and the updated state, 
                      or None if no quiz is generated.
     """
-    messages = state.get("messages", [])
-    last_message = messages[-1]
-    quiz_topics = state.get("quiz_topics", [])
+    quiz_topics = list(state.get("quiz_topics", []))
     quiz_study_material = state.get("quiz_study_material", "")
+    quiz_queue = list(state.get("quiz_queue") or [])
+    served = list(state.get("quiz_bank_served") or [])
     if quiz_topics == []:
-        return {
-            "messages": AIMessage(
-                content="Quiz is finished.",
-                name="quiz_agent"
-            ),
-            "quiz_topics": quiz_topics,  # Return updated list
-            "quiz_completed": True,
-            "is_asking_for_quiz":False
-        }
-    # Prepare model and chain
-    model = load_model()
-    model = model.with_structured_output(Quiz)
-    chain = quiz_prompt | model
-
-    response = chain.invoke({
-        "quiz_topics": quiz_topics,
-        "quiz_study_material": quiz_study_material
-    })
-
-    # Remove the first topic after generating the quiz
+        return quiz_finished_update(state)
+    # on the first quiz step the questions for every remaining topic are drawn from the question bank,
+    # the topics it does not cover are generated at once; later steps are served from the queue
+    if quiz_queue == []:
+        quiz_queue = draw_quizzes(quiz_topics, served)
+        missing = [topic for topic, quiz in zip(quiz_topics, quiz_queue) if quiz is None]
+        if missing:
+            quiz_queue = fill_quiz_queue(quiz_queue, generate_quizzes(missing, quiz_study_material))
+    return serve_quiz_update(quiz_topics, quiz_queue, served, state)
+
+async def aquiz_agent(state: State):
+    """
+    Async version of `quiz_agent`, used when the graph is driven with `ainvoke`/`astream`.
+    """
+    quiz_topics = list(state.get("quiz_topics", []))
+    quiz_study_material = state.get("quiz_study_material", "")
+    quiz_queue = list(state.get("quiz_queue") or [])
+    served = list(state.get("quiz_bank_served") or [])
+    if quiz_topics == []:
+        return quiz_finished_update(state)
+    if quiz_queue == []:
+        quiz_queue = draw_quizzes(quiz_topics, served)
+        missing = [topic for topic, quiz in zip(quiz_topics, quiz_queue) if quiz is None]
+        if missing:
+            quiz_queue = fill_quiz_queue(quiz_queue, await agenerate_quizzes(missing, quiz_study_material))
+    return serve_quiz_update(quiz_topics, quiz_queue, served, state)
+
+def quiz_finished_update(state: State):
+    return {
+        "messages": AIMessage(
+            content=with_answer_feedback(state, "Quiz is finished."),
+            name="quiz_agent"
+        ),
+        "quiz_topics": [],  # Return updated list
+        "quiz_queue": [],
+        "current_quiz": None,
+        "quiz_completed": True,
+        "is_asking_for_quiz":False,
+        "user_gave_answer": False
+    }
+
+def serve_quiz_update(quiz_topics: List[str], quiz_queue: List[Quiz], served: List[str], state: State):
+    response = quiz_queue.pop(0)
+    # Remove the first topic after serving the quiz
     used_topic = quiz_topics.pop(0)
+    # the answer is graded against this quiz, under the topic it was asked for
+    response = response.model_copy(update={"topic": response.topic or used_topic})
+    # bank quizzes are not served twice to the same student
+    if response.id and response.id.startswith(BANK_ID_PREFIX):
+        served = served + [response.id]
 
     return {
         "messages": AIMessage(
-            content=str(
-                response.question + '\n' +
-                response.hint + '\n' +
-                str(response.mutliple_choices) + '\n'
-            ),
+            content=with_answer_feedback(state, format_quiz(response)),
             name="quiz_agent"
         ),
-        "quiz_topics": quiz_topics  # Return updated list
+        "quiz_topics": quiz_topics,  # Return updated list
+        "quiz_queue": quiz_queue,
+        "quiz_bank_served": served,
+        "current_quiz": response,
+        "user_gave_answer": False
     }
 
+def with_answer_feedback(state: State, content: str) -> str:
+    """Prefixes the quiz agent's message with the feedback on the answer the student just gave."""
+    quiz_history = state.get("quiz_history") or []
+    if not state.get("user_gave_answer") or not quiz_history:
+        return content
+    feedback = feedback_message(quiz_history[-1])
+    return f"{feedback}\n\n{content}" if feedback else content
+
+def fill_quiz_queue(bank_quizzes: List[Optional[Quiz]], generated: List[Quiz]) -> List[Quiz]:
+    """
+    Fills the topics the bank did not cover with the generated quizzes, in topic order.
+    The queue stops at the first topic left without a quiz; the next quiz step generates the rest.
+    """
+    generated = iter(generated)
+    queue = []
+    for quiz in bank_quizzes:
+        quiz = quiz if quiz is not None else next(generated, None)
+        if quiz is None:
+            break
+        queue.append(quiz)
+    return queue
+
+def generate_quizzes(quiz_topics: List[str], quiz_study_material: str) -> List[Quiz]:
+    """
+    Generates quiz questions for the given topics according to QUIZ_PREFETCH_MODE:
+    - "batch": one structured `Quiz` call per topic, run concurrently.
+    - "list": a single structured `QuizList` call covering every topic.
+    - "off": a single `Quiz` for the next topic (one model call per quiz step).
+
+    Args:
+        quiz_topics (List[str]): The remaining quiz topics, in order.
+        quiz_study_material (str): The study material prepared by the teacher agent.
+
+    Returns:
+        List[Quiz]: The generated quizzes, at most one per topic and in topic order.
+    """
+    settings = get_settings()
+    inputs = {"quiz_topics": quiz_topics, "quiz_study_material": quiz_study_material}
+    if settings.quiz_prefetch_mode == "list":
+        response = get_runnable("quiz_list", build_quiz_list_chain).invoke(inputs)
+        quizzes = list(response.list_of_quiz or [])[:len(quiz_topics)]
+        # if the model returned fewer quizzes than topics, the next quiz step generates the rest
+        if quizzes:
+            return quizzes
+
+    chain = get_runnable("quiz", build_quiz_chain)
+    if settings.quiz_prefetch_mode == "off":
+        return [chain.invoke(inputs)]
+    return chain.batch(
+        [{"quiz_topics": [topic], "quiz_study_material": quiz_study_material} for topic in quiz_topics],
+        config={"max_concurrency": settings.quiz_prefetch_concurrency},
+    )
+
+async def agenerate_quizzes(quiz_topics: List[str], quiz_study_material: str) -> List[Quiz]:
+    """
+    Async version of `generate_quizzes`.
+    """
+    settings = get_settings()
+    inputs = {"quiz_topics": quiz_topics, "quiz_study_material": quiz_study_material}
+    if settings.quiz_prefetch_mode == "list":
+        response = await get_runnable("quiz_list", build_quiz_list_chain).ainvoke(inputs)
+        quizzes = list(response.list_of_quiz or [])[:len(quiz_topics)]
+        if quizzes:
+            return quizzes
+
+    chain = get_runnable("quiz", build_quiz_chain)
+    if settings.quiz_prefetch_mode == "off":
+        return [await chain.ainvoke(inputs)]
+    return await chain.abatch(
+        [{"quiz_topics": [topic], "quiz_study_material": quiz_study_material} for topic in quiz_topics],
+        config={"max_concurrency": settings.quiz_prefetch_concurrency},
+    )
+
+def format_quiz(quiz: Quiz) -> str:
+    """Renders a quiz as the message shown to the student."""
+    return str(
+        (quiz.question or "") + '\n' +
+        (quiz.hint or "") + '\n' +
+        str(quiz.mutliple_choices) + '\n'
+    )
+
 def student_input_node(state: State) -> Command[Literal["quiz_agent"]]:
     """
     Captures the student's latest input and wraps it in a `HumanMessage` to be processed by agents.
+    An answer to a quiz is graded locally and added to the quiz history and the per-topic scores.
 
     Args:
         state (State): The current state containing the message history and context.
@@ -137,4 +331,14 @@ def student_input_node(state: State) -> Command[Literal["quiz_agent"]]:
     last_message = state.get("messages", [])[-1]
     value = interrupt({ "messages": last_message, "sender": "student_input_node" })
 
-    return Command(update={"messages": HumanMessage(content=value, name="student"),"user_gave_answer": True}, goto="quiz_agent") 
+    update = {"messages": HumanMessage(content=value, name="student"), "user_gave_answer": True}
+    # the answer is graded here against the quiz's correct option, no model call is needed
+    current_quiz = state.get("current_quiz")
+    if current_quiz is not None:
+        graded = grade_answer(current_quiz, value)
+        update.update({
+            "quiz_history": list(state.get("quiz_history") or []) + [graded],
+            "quiz_scores": update_scores(state.get("quiz_scores"), graded),
+            "current_quiz": None,
+        })
+    return Command(update=update, goto="quiz_agent")
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from chunk_store import file_lock
+from settings import get_settings
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# On-disk Embedding Cache
+# --------------------------
+class EmbeddingCache:
+    """
+    Append-only embedding cache on disk. Vectors are stored as raw float32 rows in `vectors.f32`
+    and read through a NumPy memmap; `keys.txt` holds the key of each row, in row order.
+    Keys hash the text together with the model deployment, so switching models never mixes vectors.
+    Writes hold an exclusive lock on `cache.lock`, so workers and indexers can share one directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        directory = directory or get_settings().embedding_cache_dir
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.txt")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock_path = os.path.join(directory, "cache.lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._dimensions: Optional[int] = None
+        # bytes of keys.txt holding complete rows, to notice the rows appended by another process
+        self._keys_size = 0
+        self._matrix: Optional[np.memmap] = None
+        with self._lock:
+            self._load()
+        if self._rows:
+            logger.info(f"Loaded embedding cache with {len(self._rows)} vectors from '{self.directory}'")
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if any(key not in self._rows for key in keys) and self._grown():
+                self._load()
+            rows = {key: self._rows[key] for key in keys if key in self._rows}
+            if not rows:
+                return {}
+            matrix = self._open_matrix()
+            return {key: np.asarray(matrix[row]) for key, row in rows.items()}
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, file_lock(self._lock_path):
+            # rows another process appended since this one last read the cache
+            self._load()
+            if self._dimensions is None:
+                self._dimensions = vectors.shape[1]
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dimensions": self._dimensions}, f)
+            elif vectors.shape[1] != self._dimensions:
+                raise ValueError(f"Cached vectors have {self._dimensions} dimensions, got {vectors.shape[1]}.")
+
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows:
+                    new.setdefault(key, vector)
+            if not new:
+                return
+            # a row is the line number of its key: vectors and keys a crashed write left unpaired are cut first
+            for path, size in ((self._vectors_path, len(self._rows) * 4 * self._dimensions), (self._keys_path, self._keys_size)):
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    logger.warning(f"Dropping the partial rows of an interrupted write from '{path}'")
+                    os.truncate(path, size)
+            # vectors are written before keys, so a crash never leaves a key without its row
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack(list(new.values())).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write("".join(f"{key}\n" for key in new).encode("ascii"))
+            self._load()
+
+    def _grown(self) -> bool:
+        try:
+            return os.path.getsize(self._keys_path) > self._keys_size
+        except OSError:
+            return False
+
+    def _load(self) -> None:
+        """(Re)read every key whose vector is complete; called with `_lock` held."""
+        if not os.path.exists(self._meta_path) or not os.path.exists(self._keys_path):
+            return
+        with open(self._meta_path) as f:
+            self._dimensions = json.load(f)["dimensions"]
+        row_count = os.path.getsize(self._vectors_path) // (4 * self._dimensions) if os.path.exists(self._vectors_path) else 0
+        with open(self._keys_path, "rb") as f:
+            # a last line without its newline was cut by a crash
+            keys = f.read().split(b"\n")[:-1][:row_count]
+        self._rows = {key.decode("ascii"): row for row, key in enumerate(keys)}
+        self._keys_size = sum(len(key) + 1 for key in keys)
+        self._matrix = None
+
+    def _open_matrix(self) -> np.memmap:
+        if self._matrix is None:
+            # only the rows listed in keys.txt: another process may be appending a row right now
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self._dimensions))
+        return self._matrix
+
+# --------------------------
+# Embedding Service
+# --------------------------
+class EmbeddingService(Embeddings):
+    """
+    Batched, concurrent embeddings in front of a backend (e.g. AzureOpenAIEmbeddings.embed_documents).
+    Duplicate and cached texts are never sent; the rest go out in batches of `batch_size`,
+    `concurrency` batches at a time, and the results are written to the cache.
+    """
+
+    def __init__(
+        self,
+        backend: Callable[[List[str]], List[List[float]]],
+        model: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.backend = backend
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size or settings.embedding_batch_size
+        self.concurrency = concurrency or settings.embedding_concurrency
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into a float32 matrix, one row per text."""
+        with span("embed", **{"embedding.model": self.model, "embedding.texts": len(texts)}) as current:
+            keys = [EmbeddingCache.key(self.model, text) for text in texts]
+            found = self.cache.get_many(keys) if self.cache is not None else {}
+
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found:
+                    missing.setdefault(key, text)
+            hits = len(texts) - sum(1 for key in keys if key not in found)
+            self.cache_hits += hits
+            self.cache_misses += len(missing)
+            current.set("cache.hits", hits)
+            current.set("embedding.sent", len(missing))
+
+            if missing:
+                missing_keys = list(missing)
+                computed = self._embed_batched([missing[key] for key in missing_keys])
+                if self.cache is not None:
+                    self.cache.put_many(missing_keys, computed)
+                found.update(zip(missing_keys, computed))
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def _embed_batched(self, texts: List[str]) -> np.ndarray:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return np.asarray(self.backend(batches[0]), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(self.backend, batches))
+        return np.concatenate([np.asarray(result, dtype=np.float32) for result in results])
+
+# --------------------------
+# Fake Backend
+# --------------------------
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+class HashingFakeEmbeddings(Embeddings):
+    """
+    Deterministic, offline embeddings for tests and benchmarks: hashed bag of words and word bigrams,
+    L2-normalised. Texts sharing words get similar vectors, so retrieval behaves plausibly.
+    """
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or get_settings().fake_embedding_dimensions
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = _TOKEN.findall(text.lower())
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
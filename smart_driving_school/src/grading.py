@@ -0,0 +1,93 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+from state import Quiz
+
+LETTERS = ("A", "B", "C", "D")
+
+# "B", "b)", "(C)", "D. Stop the car", "A: ..." at the start of the reply
+_LEADING_LETTER = re.compile(r"^\(?([A-D])(?:[\.\):]|\s|$)|^\(?([a-d])(?:[\.\):]|$)")
+# "the answer is C", "option b)", "choice (d)", "answer: c"; a lowercase letter needs a delimiter,
+# so the article in "the answer is a bit unclear" is not read as an answer
+_NAMED_LETTER = re.compile(
+    r"\b(?i:answer|option|choice)\s*(?:is\s*)?[:\-]?\s*(?:\(?([A-D])\b\)?|\(([a-d])\)|([a-d])(?:[\.\)]|\s*$))"
+)
+# "I think B", "it's (D)." at the end of the reply
+_TRAILING_LETTER = re.compile(r"(?:^|\s)\(?([A-D])\)?[\.!]?$")
+_CHOICE_PREFIX = re.compile(r"^\s*\(?[A-D][\.\):]\s*")
+
+# --------------------------
+# Grading
+# --------------------------
+def parse_choice(reply: str, choices: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    The option letter a student's reply picks, or None when it picks none.
+    A reply is read as the text of one of the choices, with or without its letter, and otherwise as a letter
+    ("B", "b)", "the answer is C", "I think D"); the text comes first, so a choice starting with "A" is not read as A.
+    """
+    reply = (reply or "").strip()
+    text = _normalize_choice(reply)
+    for letter, choice in zip(LETTERS, choices or []):
+        if text and text in (_normalize_choice(choice), _normalize_choice(_CHOICE_PREFIX.sub("", choice))):
+            return letter
+    match = _LEADING_LETTER.match(reply) or _NAMED_LETTER.search(reply) or _TRAILING_LETTER.search(reply)
+    if match:
+        return next(group for group in match.groups() if group).upper()
+    return None
+
+def _normalize_choice(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip(".!")
+
+def grade_answer(quiz: Quiz, reply: str) -> Quiz:
+    """
+    Grade a student's reply to a quiz against its correct option, without a model call.
+    :return: The quiz with the chosen letter (or the raw reply when it picks none) as `user_answer` and
+             "correct", "incorrect" or "ungraded" (the quiz has no correct option) as `feedback`
+    """
+    choice = parse_choice(reply, quiz.mutliple_choices)
+    if not quiz.answer:
+        feedback = "ungraded"
+    else:
+        feedback = "correct" if choice == quiz.answer.strip().upper()[:1] else "incorrect"
+    return quiz.model_copy(update={"user_answer": choice or reply, "feedback": feedback})
+
+def feedback_message(quiz: Quiz) -> str:
+    """The feedback shown to the student after a graded answer."""
+    if quiz.feedback == "correct":
+        return "Correct!"
+    if quiz.feedback == "incorrect":
+        return f"Not quite, the answer was {quiz.answer}. {quiz.explanation or ''}".strip()
+    return ""
+
+# --------------------------
+# Scores
+# --------------------------
+def update_scores(scores: Optional[Dict[str, Dict[str, int]]], quiz: Quiz) -> Dict[str, Dict[str, int]]:
+    """Add a graded quiz to the per-topic counts of asked, correct and ungraded questions."""
+    scores = {topic: dict(counts) for topic, counts in (scores or {}).items()}
+    counts = scores.setdefault(quiz.topic or "general", {"asked": 0, "correct": 0, "ungraded": 0})
+    counts["asked"] += 1
+    counts["correct"] += int(quiz.feedback == "correct")
+    counts["ungraded"] += int(quiz.feedback == "ungraded")
+    return scores
+
+def format_score_table(scores: Optional[Dict[str, Dict[str, int]]], quiz_history: Optional[List[Quiz]] = None) -> str:
+    """
+    Render the per-topic scores, and the questions of the recent quizzes the student missed,
+    as the compact table the teacher evaluates from. Empty when no answer was graded yet.
+    """
+    if not scores:
+        return ""
+    lines = ["topic | correct/graded | accuracy"]
+    for topic, counts in scores.items():
+        graded = counts["asked"] - counts["ungraded"]
+        accuracy = f"{counts['correct'] / graded:.0%}" if graded else "n/a"
+        lines.append(f"{topic} | {counts['correct']}/{graded} | {accuracy}")
+    missed = [quiz for quiz in quiz_history or [] if quiz.feedback != "correct"]
+    if missed:
+        lines.append("missed questions:")
+        lines.extend(
+            f"- [{quiz.topic}] {quiz.question} answered {quiz.user_answer}, correct {quiz.answer or 'unknown'}"
+            for quiz in missed
+        )
+    return "\n".join(lines)
@@ -1,23 +1,29 @@
-from typing import Literal
+from typing import Dict, Literal
+import logging
+import os
+import time
 import uuid
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import  Command
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.runnables import RunnableLambda
 
-from ds_agents import teacher_agent, quiz_agent, student_input_node
-from tools import search_course_documents_tool
+from ds_agents import teacher_agent, ateacher_agent, quiz_agent, aquiz_agent, student_input_node
+from tools import read_course_chunk_tool, search_course_documents_tool
 from state import State
+from checkpointer import open_checkpointer
+from tool_node import ParallelToolNode, pending_tool_calls
+from model import LLMCallCounter
+from settings import load_environment
+from tracing import trace_turn, traced_node, tracing_callbacks
 
-from IPython.display import Image, display
-from langchain_core.runnables.graph import CurveStyle, MermaidDrawMethod, NodeStyles
 
+logger = logging.getLogger(__name__)
 
-
-tools = [search_course_documents_tool]
-tool_node = ToolNode(tools)
+tools = [search_course_documents_tool, read_course_chunk_tool]
+# several tool calls of one teacher step run concurrently, identical ones only once
+tool_node = ParallelToolNode(tools)
 
 
 def should_continue(
@@ -38,7 +44,8 @@ def should_continue(
     quiz_topics = state.get("quiz_topics", [])
     quiz_completed = state.get("quiz_completed", False)
 
-    if last_message.content == '' and last_message.tool_calls:
+    # search calls left pending by the teacher are run together by the tool node
+    if pending_tool_calls(messages):
         return "call_tool"
 
     if is_asking_for_quiz:
@@ -70,13 +77,36 @@ def worker_should_continue(state: State) -> Literal["teacher_agent", "student_in
     
     return "student_input_node"
 
+def tool_should_continue(state: State) -> Literal["teacher_agent", "quiz_agent"]:
+    """
+    Determines where the results of the tool node go.
+
+    Args:
+        state (State): The current workflow state.
+
+    Returns:
+        Literal: The quiz agent when the teacher prepared the quiz in the same step as its searches
+                 (no extra teacher call is needed), otherwise the agent that called the tools.
+    """
+    if state.get("is_asking_for_quiz", False):
+        return "quiz_agent"
+    return state["sender"]
+
 workflow = StateGraph(State)
 
 # Define nodes
-workflow.add_node("teacher_agent", teacher_agent)
-workflow.add_node("quiz_agent", quiz_agent)
-workflow.add_node("tool_node", tool_node)
-workflow.add_node("student_input_node", student_input_node)
+# the agents run their async implementation when the graph is driven with ainvoke/astream
+# every node runs inside a span, exported when TRACE_PATH is set
+workflow.add_node("teacher_agent", RunnableLambda(
+    traced_node("teacher_agent", teacher_agent), afunc=traced_node("teacher_agent", ateacher_agent), name="teacher_agent"
+))
+workflow.add_node("quiz_agent", RunnableLambda(
+    traced_node("quiz_agent", quiz_agent), afunc=traced_node("quiz_agent", aquiz_agent), name="quiz_agent"
+))
+workflow.add_node("tool_node", RunnableLambda(
+    traced_node("tool_node", tool_node.invoke), afunc=traced_node("tool_node", tool_node.ainvoke), name="tool_node"
+))
+workflow.add_node("student_input_node", traced_node("student_input_node", student_input_node))
 
 # Start workflow
 workflow.add_edge(START, "teacher_agent")
@@ -107,23 +137,106 @@ workflow.add_edge("student_input_node", "quiz_agent")
 # Conditional transitions from tool node
 workflow.add_conditional_edges(
     "tool_node",
-    lambda x: x["sender"],
+    tool_should_continue,
     {
         "teacher_agent": "teacher_agent",
+        "quiz_agent": "quiz_agent",
     }
 )
 
+# nodes whose outputs are shown to the student while streaming
+STREAMED_NODES = ("teacher_agent", "quiz_agent")
+
+
+def stream_turn(graph, graph_input, thread_config) -> Dict[str, float]:
+    """
+    Runs one turn of the graph and prints the teacher and quiz outputs token by token.
+
+    Args:
+        graph: The compiled workflow.
+        graph_input: The turn input, a state update or a `Command(resume=...)`.
+        thread_config: The thread configuration of the conversation.
+
+    Returns:
+        dict: Time to first token, total duration, streamed tokens, tokens/sec and model calls of the turn.
+    """
+    llm_calls = LLMCallCounter()
+    thread_id = thread_config["configurable"]["thread_id"]
+    thread_config = {**thread_config, "callbacks": [llm_calls, *tracing_callbacks()]}
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    usage_tokens = 0
+    current_node = None
+
+    with trace_turn(thread_id) as turn_span:
+        for message, metadata in graph.stream(graph_input, config=thread_config, stream_mode="messages"):
+            node = metadata.get("langgraph_node")
+            if node not in STREAMED_NODES:
+                continue
+            if isinstance(message, AIMessageChunk):
+                if message.usage_metadata:
+                    usage_tokens += message.usage_metadata.get("output_tokens", 0)
+                # tool call chunks carry the arguments of a tool call, not text for the student
+                if message.tool_call_chunks or not isinstance(message.content, str):
+                    continue
+            elif not isinstance(message, AIMessage) or message.tool_calls:
+                continue
+            if not message.content:
+                continue
+
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            if node != current_node:
+                print(f"\n{node}:")
+                current_node = node
+            print(message.content, end="", flush=True)
+            tokens += 1
+        print("\n")
+        turn_span.set("turn.llm_calls", llm_calls.calls)
+
+    duration = time.perf_counter() - start
+    # providers that report usage give exact counts, otherwise every streamed chunk counts as a token
+    tokens = usage_tokens or tokens
+    generation_time = duration - (first_token_at - start) if first_token_at else 0.0
+    stats = {
+        "ttft": (first_token_at - start) if first_token_at else duration,
+        "duration": duration,
+        "tokens": tokens,
+        "tokens_per_sec": tokens / generation_time if generation_time > 0 else 0.0,
+        "llm_calls": llm_calls.calls,
+    }
+    logger.info(
+        f"turn: ttft={stats['ttft']:.2f}s duration={stats['duration']:.2f}s "
+        f"tokens={stats['tokens']} tokens/sec={stats['tokens_per_sec']:.1f} llm_calls={stats['llm_calls']}"
+    )
+    return stats
+
+
+def draw_workflow_graph(path: str = os.path.join(os.path.dirname(__file__), "..", "artifact", "workflow_graph.png")) -> None:
+    """
+    Renders the workflow to `artifact/workflow_graph.png` through the Mermaid API.
+    The drawing classes are only imported here, so starting the graph does not pay for them.
+    """
+    from langchain_core.runnables.graph import MermaidDrawMethod
+
+    png = workflow.compile().get_graph().draw_mermaid_png(draw_method=MermaidDrawMethod.API)
+    with open(path, "wb") as f:
+        f.write(png)
+
+
 def update_graph(graph,thread_config):
-    graph.get_state(thread_config).values["messages"][-1].pretty_print()
     user_answer = input("provide your answer : ")
-    graph.invoke(Command(resume=user_answer), config=thread_config)
+    stream_turn(graph, Command(resume=user_answer), thread_config)
     
 
 def main():
     """
     Entry point for the interactive CLI application running the LangGraph workflow.
     """
-    checkpointer = MemorySaver()
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    checkpointer = open_checkpointer()
     graph = workflow.compile(checkpointer=checkpointer)
     thread_config = {"configurable": {"thread_id": uuid.uuid4()}}
 
@@ -131,12 +244,7 @@ def main():
     user_input = input("Hello, what would we do today in our cool driving school: ")
 
     # Initial graph stream
-    for chunk in graph.stream({"messages": HumanMessage(content=user_input)},
-                              config=thread_config,
-                              stream_mode='values'):
-        print(chunk["messages"][-1].name)
-        chunk["messages"][-1].pretty_print()
-        print("\n")
+    stream_turn(graph, {"messages": HumanMessage(content=user_input)}, thread_config)
 
     while True:
         if user_input.lower() == "quit":
@@ -148,21 +256,13 @@ def main():
 
         if messages and messages[-1].name == "quiz_agent":
             update_graph(graph, thread_config)
-            messages = graph.get_state(thread_config).values.get("messages", [])
-            if messages:
-                messages[-1].pretty_print()
         else:
             user_input = input("Provide your answer: ")
             if user_input.lower() == "quit":
                 print("Exiting the program.")
                 break
 
-            for chunk in graph.stream({"messages": HumanMessage(content=user_input)},
-                                      config=thread_config,
-                                      stream_mode='values'):
-                print(chunk["messages"][-1].name)
-                chunk["messages"][-1].pretty_print()
-                print("\n")
+            stream_turn(graph, {"messages": HumanMessage(content=user_input)}, thread_config)
 
             
 if __name__ == "__main__":
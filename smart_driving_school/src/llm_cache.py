@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Configuration
+# --------------------------
+# fields of a serialized message that differ between sessions sending the same prompt
+_VOLATILE_FIELDS = ("id", "tool_call_id", "response_metadata", "usage_metadata")
+
+# --------------------------
+# Response Cache
+# --------------------------
+class SqliteResponseCache(BaseCache):
+    """
+    Disk-backed cache of chat model responses, keyed on a hash of the rendered prompt and of the model's
+    name and parameters (the `llm_string`, which also holds the bound tools and structured output schema).
+    Entries expire after `ttl_seconds`; beyond `max_entries` the least recently used are evicted.
+    Cached messages are returned with `response_metadata["cache_hit"]` set.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        settings = get_settings()
+        path = path or settings.llm_cache_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = settings.llm_cache_ttl if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.llm_cache_max_entries if max_entries is None else max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{_normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key, now = self.key(prompt, llm_string), time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        try:
+            entries = json.loads(row[0])
+            messages = messages_from_dict([entry["message"] for entry in entries])
+        except (ValueError, KeyError, TypeError):
+            # written by an older version of the cache
+            logger.warning("Dropping an unreadable cached response")
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return [
+            ChatGeneration(
+                message=message.model_copy(update={"response_metadata": {**message.response_metadata, "cache_hit": True}}),
+                generation_info=entry.get("generation_info"),
+            )
+            for entry, message in zip(entries, messages)
+        ]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        # only chat generations are cached; the message id is given by the run that made it, a cached answer gets a new one
+        generations = [generation for generation in return_val if isinstance(generation, ChatGeneration)]
+        if len(generations) != len(return_val):
+            return
+        messages = messages_to_dict([generation.message.model_copy(update={"id": None}) for generation in generations])
+        value = json.dumps([
+            {"message": message, "generation_info": generation.generation_info}
+            for message, generation in zip(messages, generations)
+        ], default=str)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (self.key(prompt, llm_string), value, now, now),
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,)
+                )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict:
+        # no __len__: langchain checks the cache's truthiness, and an empty cache must still be used
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """The serialized prompt without the message ids and metadata, so identical prompts of two sessions match."""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    for message in messages if isinstance(messages, list) else []:
+        kwargs = message.get("kwargs") if isinstance(message, dict) else None
+        if not isinstance(kwargs, dict):
+            continue
+        for field in _VOLATILE_FIELDS:
+            kwargs.pop(field, None)
+        for call in kwargs.get("tool_calls") or []:
+            call.pop("id", None)
+        for call in (kwargs.get("additional_kwargs") or {}).get("tool_calls") or []:
+            call.pop("id", None)
+    return json.dumps(messages, sort_keys=True)
+
+
+_cache: Optional[SqliteResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache(name: str) -> Optional[SqliteResponseCache]:
+    """
+    The process-wide response cache when responses of the named runnable (see model.get_runnable)
+    are cached, i.e. listed in LLM_CACHE_CHAINS, else None.
+    """
+    global _cache
+    settings = get_settings()
+    if name not in settings.cached_chains():
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SqliteResponseCache(settings.llm_cache_path)
+                logger.info(f"Caching model responses of {settings.llm_cache_chains} in '{settings.llm_cache_path}'")
+    return _cache
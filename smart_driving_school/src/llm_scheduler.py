@@ -0,0 +1,450 @@
+import json
+import time
+import heapq
+import random
+import asyncio
+import hashlib
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from settings import get_settings
+from tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Configuration
+# --------------------------
+# lower runs first: the student waits on interactive calls, background calls prepare work ahead of them
+INTERACTIVE, BACKGROUND, BATCH = 0, 1, 2
+RUNNABLE_PRIORITIES = {
+    "teacher": INTERACTIVE,
+    "summary": INTERACTIVE,
+    "quiz": BACKGROUND,
+    "quiz_list": BACKGROUND,
+    "quiz_bank": BATCH,
+}
+
+# longest sleep of a waiting call before it checks the buckets again
+_POLL_SECONDS = 0.05
+_RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError")
+
+# --------------------------
+# Token Buckets
+# --------------------------
+class TokenBucket:
+    """A bucket holding up to `per_minute` units, refilled continuously at `per_minute` per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self._rate = per_minute / 60
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` units are available, 0 when they already are."""
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self._rate)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+# --------------------------
+# Scheduler
+# --------------------------
+class LLMScheduler:
+    """
+    Admits the model calls of the whole process under a requests/min and a tokens/min budget.
+    Waiting calls are admitted by priority, then in arrival order, so interactive teacher turns
+    overtake background quiz generation. A 429 pauses every call for the provider's Retry-After.
+    Sync callers sleep on their thread, async callers on their event loop.
+    Failing calls (429, 5xx, connection errors) are retried up to `max_retries` times with jittered
+    exponential backoff, and identical requests in flight at once share one call when `coalesce` is set.
+    Unset arguments come from the LLM_* settings; a limit of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        coalesce: Optional[bool] = None,
+        retry_base_delay: Optional[float] = None,
+        retry_max_delay: Optional[float] = None,
+    ):
+        settings = get_settings()
+        requests_per_minute = settings.llm_requests_per_minute if requests_per_minute is None else requests_per_minute
+        tokens_per_minute = settings.llm_tokens_per_minute if tokens_per_minute is None else tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.coalesce = settings.llm_coalesce if coalesce is None else coalesce
+        self.retry_base_delay = settings.llm_retry_base_delay if retry_base_delay is None else retry_base_delay
+        self.retry_max_delay = settings.llm_retry_max_delay if retry_max_delay is None else retry_max_delay
+        self._lock = threading.Lock()
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._in_flight: Dict[str, Future] = {}
+        self._waits = deque(maxlen=1024)
+        self._counters = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0, "coalesced": 0}
+        self._running = 0
+
+    @property
+    def limited(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    # admission
+    def _enqueue(self, priority: int, tokens: int) -> tuple:
+        ticket = (priority, next(self._sequence), tokens)
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_admit(self, ticket: tuple) -> float:
+        """Admit the ticket and return 0 when it is first in line and the budget allows, else the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._queue[0] is not ticket:
+                return _POLL_SECONDS
+            wait = 0.0
+            for bucket, amount in ((self._requests, 1), (self._tokens, ticket[2])):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.time_until(amount))
+            if wait > 0:
+                return wait
+            for bucket, amount in ((self._requests, 1), (self._tokens, ticket[2])):
+                if bucket is not None:
+                    bucket.take(amount)
+            heapq.heappop(self._queue)
+            return 0.0
+
+    def _leave(self, ticket: tuple) -> None:
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+
+    def acquire(self, priority: int, tokens: int) -> float:
+        """Block until the call may start; return the seconds waited."""
+        start = time.monotonic()
+        if self.limited:
+            ticket = self._enqueue(priority, tokens)
+            try:
+                while (wait := self._try_admit(ticket)) > 0:
+                    time.sleep(min(wait, _POLL_SECONDS))
+            except BaseException:
+                self._leave(ticket)
+                raise
+        return self._admitted(start)
+
+    async def aacquire(self, priority: int, tokens: int) -> float:
+        """Async version of `acquire`, waiting on the event loop."""
+        start = time.monotonic()
+        if self.limited:
+            ticket = self._enqueue(priority, tokens)
+            try:
+                while (wait := self._try_admit(ticket)) > 0:
+                    await asyncio.sleep(min(wait, _POLL_SECONDS))
+            except BaseException:
+                self._leave(ticket)
+                raise
+        return self._admitted(start)
+
+    def _admitted(self, start: float) -> float:
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waits.append(waited)
+            self._counters["requests"] += 1
+            self._running += 1
+        # recorded on the span of the model call's node
+        current_span().set("llm.queue_wait_ms", waited * 1000)
+        return waited
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """End an admitted call, returning the unused part of its token reservation."""
+        with self._lock:
+            self._running -= 1
+            if self._tokens is not None and used_tokens is not None:
+                self._tokens.give_back(reserved_tokens - used_tokens)
+
+    # retries
+    def backoff(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying a failed call, or None when it must not be retried:
+        the error is not a 429, a 5xx or a connection error, or the retries are used up.
+        """
+        status = _status_code(error)
+        retryable = status == 429 or (status is not None and status >= 500) or type(error).__name__ in _RETRYABLE_ERRORS
+        with self._lock:
+            if not retryable or attempt >= self.max_retries:
+                self._counters["failures"] += 1
+                return None
+            self._counters["retries"] += 1
+            # full jitter, so the calls failing together do not retry together
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            if status == 429:
+                self._counters["rate_limited"] += 1
+                retry_after = _retry_after(error)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                    # the provider's limit is shared, so every call waits, not only this one
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"Model call failed ({status or type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def run(self, call: Callable[[], ChatResult], priority: int, tokens: int, key: Optional[str] = None) -> ChatResult:
+        """Run a model call under the budget, with retries; identical calls (same `key`) in flight share one."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result().model_copy(deep=True)
+        try:
+            for attempt in itertools.count():
+                self.acquire(priority, tokens)
+                used = None
+                try:
+                    result = call()
+                    used = _used_tokens(result)
+                    break
+                except Exception as e:
+                    delay = self.backoff(e, attempt)
+                    if delay is None:
+                        raise
+                finally:
+                    self.release(tokens, used)
+                time.sleep(delay)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result=result)
+        return result
+
+    async def arun(self, call: Callable[[], Any], priority: int, tokens: int, key: Optional[str] = None) -> ChatResult:
+        """Async version of `run`; `call` returns the awaitable of one attempt."""
+        future, leader = self._join(key)
+        if not leader:
+            return (await asyncio.wrap_future(future)).model_copy(deep=True)
+        try:
+            for attempt in itertools.count():
+                await self.aacquire(priority, tokens)
+                used = None
+                try:
+                    result = await call()
+                    used = _used_tokens(result)
+                    break
+                except Exception as e:
+                    delay = self.backoff(e, attempt)
+                    if delay is None:
+                        raise
+                finally:
+                    self.release(tokens, used)
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result=result)
+        return result
+
+    # coalescing
+    def _join(self, key: Optional[str]):
+        """Return the future of the identical call in flight and False, or a new future and True (the caller runs it)."""
+        future = Future()
+        if key is None or not self.coalesce:
+            return future, True
+        with self._lock:
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                self._counters["coalesced"] += 1
+                return existing, False
+            self._in_flight[key] = future
+        return future, True
+
+    def _settle(self, key: Optional[str], future: Future, result: Optional[ChatResult] = None, error: Optional[BaseException] = None) -> None:
+        if key is not None and self.coalesce:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # metrics
+    def metrics(self) -> Dict:
+        """Queue depth, calls running, wait time percentiles (ms) of the recent calls and counters."""
+        with self._lock:
+            waits = np.asarray(self._waits) * 1000
+            depth_by_priority: Dict[int, int] = {}
+            for priority, _, _ in self._queue:
+                depth_by_priority[priority] = depth_by_priority.get(priority, 0) + 1
+            return {
+                "queue_depth": len(self._queue),
+                "queue_depth_by_priority": depth_by_priority,
+                "running": self._running,
+                "wait_ms": {
+                    "p50": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                    "p95": float(np.percentile(waits, 95)) if len(waits) else 0.0,
+                    "max": float(waits.max()) if len(waits) else 0.0,
+                },
+                **self._counters,
+            }
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _used_tokens(result: ChatResult) -> Optional[int]:
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler shared by every scheduled chat model."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+# --------------------------
+# Scheduled Chat Model
+# --------------------------
+class ScheduledChatModel(BaseChatModel):
+    """
+    Wraps a chat model so that each of its calls goes through the process-wide scheduler, at the priority
+    of the runnable it serves. Streamed calls are retried only when they fail before their first chunk,
+    and are never coalesced, since their tokens go to one student's callbacks.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    priority: int = BACKGROUND
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.model._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # part of the response cache key, so a cached response is only served for the same model and parameters
+        return self.model._get_invocation_params()
+
+    def bind_tools(self, tools, **kwargs):
+        # the wrapped model converts the tools into its own request arguments
+        return self.bind(**self.model.bind_tools(tools, **kwargs).kwargs)
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs) -> bool:
+        return self.model._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return get_scheduler().run(
+            lambda: self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            self.priority,
+            _estimate_tokens(messages, kwargs),
+            _request_key(self.model, messages, stop, kwargs),
+        )
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await get_scheduler().arun(
+            lambda: self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            self.priority,
+            _estimate_tokens(messages, kwargs),
+            _request_key(self.model, messages, stop, kwargs),
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        scheduler, tokens = get_scheduler(), _estimate_tokens(messages, kwargs)
+        for attempt in itertools.count():
+            scheduler.acquire(self.priority, tokens)
+            started, used = False, None
+            try:
+                for chunk in self.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used = _chunk_tokens(chunk, used)
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else scheduler.backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                scheduler.release(tokens, used)
+            time.sleep(delay)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        scheduler, tokens = get_scheduler(), _estimate_tokens(messages, kwargs)
+        for attempt in itertools.count():
+            await scheduler.aacquire(self.priority, tokens)
+            started, used = False, None
+            try:
+                async for chunk in self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used = _chunk_tokens(chunk, used)
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else scheduler.backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                scheduler.release(tokens, used)
+            await asyncio.sleep(delay)
+
+
+def scheduled(model: BaseChatModel, name: str, cache: Optional[BaseCache] = None) -> ScheduledChatModel:
+    """
+    The model wrapped for the named runnable, at that runnable's priority.
+    With a `cache`, responses found in it are returned before the call is scheduled.
+    """
+    return ScheduledChatModel(model=model, priority=RUNNABLE_PRIORITIES.get(name, BACKGROUND), cache=cache)
+
+def _estimate_tokens(messages: List[BaseMessage], kwargs: Dict) -> int:
+    # ~4 characters per token for the prompt and the tool schemas, plus the expected completion
+    characters = sum(len(str(message.content)) for message in messages) + len(json.dumps(kwargs.get("tools") or [], default=str))
+    return characters // 4 + get_settings().llm_expected_output_tokens
+
+def _request_key(model: BaseChatModel, messages: List[BaseMessage], stop, kwargs: Dict) -> str:
+    # message ids differ between sessions asking the same thing, so they are left out of the key
+    payload = json.dumps(
+        [f"{type(model).__name__}:{id(model)}", [message.model_dump(exclude={"id"}) for message in messages], stop, kwargs],
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _chunk_tokens(chunk: ChatGenerationChunk, used: Optional[int]) -> Optional[int]:
+    usage = getattr(chunk.message, "usage_metadata", None)
+    return (used or 0) + usage.get("total_tokens", 0) if usage else used
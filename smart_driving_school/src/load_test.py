@@ -0,0 +1,316 @@
+import os
+import gc
+import re
+import ast
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+from settings import configure, get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Configuration
+# ---------------------------
+# nodes timed by the harness
+TIMED_NODES = ("teacher_agent", "quiz_agent", "tool_node")
+
+# ---------------------------
+# Scripted Fake Chat Model
+# ---------------------------
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic local chat model that plays the teacher, quiz and summary roles of the graph:
+    - teacher (tools bound): searches the course for every student message, then answers from the
+      results or, when the student asked for a quiz, calls quiz_preparation_tool; after a quiz it evaluates.
+    - quiz (structured `Quiz`/`QuizList` output): returns a multiple-choice question per topic.
+    - summary (no tools): returns a short summary.
+    Every call sleeps `latency` seconds to stand in for the model's response time.
+    """
+
+    # simulated model response time (FAKE_LLM_LATENCY), so the graph overhead can be told apart from the model's share
+    latency: float = Field(default_factory=lambda: get_settings().fake_llm_latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Sequence[Any], tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return _result(self._respond(messages, kwargs.get("tools") or []))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return _result(self._respond(messages, kwargs.get("tools") or []))
+
+    def _respond(self, messages: List[BaseMessage], tools: List[Dict]) -> AIMessage:
+        names = {tool["function"]["name"] for tool in tools}
+        if "Quiz" in names:
+            topics = _quiz_topics(messages)
+            return _tool_call("Quiz", _quiz_args(topics[0] if topics else "road rules"))
+        if "QuizList" in names:
+            return _tool_call("QuizList", {"list_of_quiz": [_quiz_args(topic) for topic in _quiz_topics(messages)]})
+        if "quiz_preparation_tool" in names:
+            return _teacher_turn([m for m in messages if not isinstance(m, SystemMessage)])
+        return AIMessage(content="Summary: the student studied road rules and took quizzes.")
+
+
+def _result(message: AIMessage) -> ChatResult:
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+def _tool_call(name: str, args: Dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+
+def _teacher_turn(conversation: List[BaseMessage]) -> AIMessage:
+    last = conversation[-1]
+    request = next((m.content for m in reversed(conversation) if isinstance(m, HumanMessage) and m.name != "student"), "")
+    if isinstance(last, AIMessage) and last.name == "quiz_agent":
+        return AIMessage(content="Evaluation: good knowledge of the rules, review the details you missed.")
+    if isinstance(last, HumanMessage):
+        return _tool_call("search_course_documents_tool", {"query": request})
+    if isinstance(last, ToolMessage):
+        results = " ".join(str(m.content) for m in conversation if isinstance(m, ToolMessage))[-1000:]
+        topics = _requested_topics(request)
+        if topics:
+            return _tool_call("quiz_preparation_tool", {"quiz_covered_topics": topics, "theory_study_material": results})
+        return AIMessage(content=f"Here is what the course says: {results[:300]}")
+    return AIMessage(content="How can I help you prepare for the driving test?")
+
+def _requested_topics(request: str) -> List[str]:
+    match = re.search(r"quiz on (.+)", request, flags=re.IGNORECASE)
+    return [topic.strip() for topic in match.group(1).split(";")] if match else []
+
+def _quiz_topics(messages: List[BaseMessage]) -> List[str]:
+    match = re.search(r"disposal: '(\[.*?\])'", str(messages[0].content))
+    return list(ast.literal_eval(match.group(1))) if match else []
+
+def _quiz_args(topic: str) -> Dict:
+    return {
+        "id": f"quiz-{uuid.uuid4().hex[:8]}",
+        "topic": topic,
+        "question": f"Which statement about {topic} is correct?",
+        "hint": f"Think about what the handbook says on {topic}.",
+        "explanation": f"The handbook section on {topic} states option A.",
+        "mutliple_choices": ["A. The rule", "B. A myth", "C. An old rule", "D. None of these"],
+        "answer": "A",
+    }
+
+# ---------------------------
+# Node Timing
+# ---------------------------
+class NodeTimer(BaseCallbackHandler):
+    """
+    Records the duration of every run of the graph nodes in `nodes`, passed as a callback in the turn config.
+    """
+    run_inline = True
+
+    def __init__(self, nodes: Sequence[str] = TIMED_NODES):
+        self.nodes = set(nodes)
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self._started: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        # only the node's own run, not the runnables nested inside it
+        if node in self.nodes and kwargs.get("name") == node and parent_run_id not in self._started:
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, start = started
+                self.durations[node].append(time.perf_counter() - start)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
+
+# ---------------------------
+# Simulated Students
+# ---------------------------
+async def simulate_student(server, topics: Sequence[str], max_answers: int = 20) -> Dict:
+    """
+    One tutoring session: a question on the first topic, a quiz request on the topics,
+    then an answer to every quiz question until the teacher's evaluation.
+    :return: Turn latencies (s), model calls and whether the session reached the end of its quiz
+    """
+    thread_id = str(uuid.uuid4())
+    latencies, llm_calls = [], 0
+
+    async def send(text: str) -> Dict:
+        nonlocal llm_calls
+        start = time.perf_counter()
+        reply = await server.send(thread_id, text)
+        latencies.append(time.perf_counter() - start)
+        llm_calls += reply["llm_calls"]
+        return reply
+
+    await send(f"What are the rules about {topics[0]}?")
+    reply = await send(f"Give me a quiz on {'; '.join(topics)}")
+    answers = 0
+    while reply["awaiting_answer"] and answers < max_answers:
+        reply = await send("A")
+        answers += 1
+    return {"turn_latencies": latencies, "llm_calls": llm_calls, "completed": not reply["awaiting_answer"]}
+
+async def run_level(concurrency: int, rounds: int, topics: Sequence[str], quiz_size: int, trace_memory: bool) -> Dict:
+    """
+    Run `concurrency` students at once, each going through `rounds` sessions, against a fresh server.
+    :return: Sessions/sec, turn and per-node latency percentiles (ms), model calls and memory per session
+    """
+    from server import TutorServer
+
+    timer = NodeTimer()
+    server = TutorServer(max_concurrency=max(concurrency, 1), max_pending=concurrency * 4, callbacks=[timer])
+
+    async def student(slot: int) -> List[Dict]:
+        sessions = []
+        for round_ in range(rounds):
+            offset = (slot * rounds + round_) * quiz_size
+            sessions.append(await simulate_student(server, [topics[(offset + i) % len(topics)] for i in range(quiz_size)]))
+        return sessions
+
+    if trace_memory:
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    sessions = [session for slot in await asyncio.gather(*(student(i) for i in range(concurrency))) for session in slot]
+    wall = time.perf_counter() - start
+
+    result = {
+        "concurrency": concurrency,
+        "sessions": len(sessions),
+        "completed": sum(1 for s in sessions if s["completed"]),
+        "sessions_per_sec": len(sessions) / wall if wall else 0.0,
+        "turn_ms": _percentiles([t for s in sessions for t in s["turn_latencies"]]),
+        "nodes_ms": {node: _percentiles(timer.durations.get(node, [])) for node in TIMED_NODES},
+        "llm_calls_per_session": float(np.mean([s["llm_calls"] for s in sessions])),
+    }
+    if trace_memory:
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        # the server still holds every session's checkpoints, so this is the memory a session keeps
+        result["retained_kb_per_session"] = (current - baseline) / 1024 / len(sessions)
+        result["peak_kb_per_concurrent_session"] = (peak - baseline) / 1024 / concurrency
+    return result
+
+def _percentiles(values: Sequence[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(ms),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "mean": float(ms.mean()),
+    }
+
+# ---------------------------
+# Harness
+# ---------------------------
+def ensure_local_search_index() -> None:
+    """Build the local BM25 index from the ingested documents when it does not exist yet."""
+    from bm25_index import BM25Index
+
+    settings = get_settings()
+    if os.path.exists(settings.local_search_index_path):
+        return
+    documents_path = settings.local_documents_path
+    if not os.path.exists(documents_path):
+        raise FileNotFoundError(f"'{documents_path}' not found, run context/local_ingestion.py first.")
+    with open(documents_path, encoding="utf-8") as f:
+        BM25Index.from_documents(json.loads(line) for line in f if line.strip()).save(settings.local_search_index_path)
+
+async def run_load_test(levels: Sequence[int], rounds: int = 2, quiz_size: int = 2, trace_memory: bool = True) -> Dict:
+    """
+    Ramp the number of concurrent simulated students through `levels` against the compiled workflow,
+    with the scripted fake model and the local search backend standing in for the services.
+    """
+    from llm_scheduler import get_scheduler
+    from model import set_model_override
+    from retrieval_benchmark import load_topics
+
+    # the services are replaced by the scripted model and the offline search backend
+    configure(search_backend="local", embedding_backend="fake")
+    ensure_local_search_index()
+    model = ScriptedChatModel()
+    set_model_override(model)
+    topics = load_topics()
+    # one untimed session loads the search index and builds the chains, which a running worker pays only once
+    await run_level(1, 1, topics, quiz_size, trace_memory=False)
+    if trace_memory:
+        tracemalloc.start()
+    results = []
+    try:
+        for concurrency in levels:
+            logger.info(f"Running {concurrency} concurrent students, {rounds} sessions each")
+            results.append(await run_level(concurrency, rounds, topics, quiz_size, trace_memory))
+            log_level(results[-1])
+    finally:
+        set_model_override(None)
+        if trace_memory:
+            tracemalloc.stop()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"levels": list(levels), "rounds": rounds, "quiz_size": quiz_size, "fake_llm_latency": model.latency, "trace_memory": trace_memory},
+        "results": results,
+        "llm_scheduler": get_scheduler().metrics(),
+    }
+
+def log_level(result: Dict) -> None:
+    nodes = "  ".join(
+        f"{node} p50 {stats['p50']:.1f}ms p95 {stats['p95']:.1f}ms" for node, stats in result["nodes_ms"].items() if stats["count"]
+    )
+    memory = f"  {result['retained_kb_per_session']:.0f}KB/session" if "retained_kb_per_session" in result else ""
+    logger.info(
+        f"concurrency {result['concurrency']:>4}: {result['sessions_per_sec']:.2f} sessions/s  "
+        f"turn p95 {result['turn_ms'].get('p95', 0):.1f}ms  {nodes}  "
+        f"{result['llm_calls_per_session']:.1f} llm calls/session{memory}  "
+        f"completed {result['completed']}/{result['sessions']}"
+    )
+
+# ---------------------------
+# Entrypoint
+# ---------------------------
+
+if __name__ == "__main__":
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Load-test the tutoring workflow with simulated students and a fake model.")
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated numbers of concurrent students")
+    parser.add_argument("--rounds", type=int, default=2, help="sessions run by each student at every level")
+    parser.add_argument("--quiz-size", type=int, default=2, help="topics per quiz")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows the run down")
+    parser.add_argument("--output", help="JSON results file, defaults to a timestamped file in BENCHMARK_DIR")
+    args = parser.parse_args()
+
+    from retrieval_benchmark import write_report
+
+    levels = [int(level) for level in args.levels.split(",") if level]
+    report = asyncio.run(run_load_test(levels, args.rounds, args.quiz_size, trace_memory=not args.no_memory))
+    write_report(report, args.output, prefix="load")
@@ -1,16 +1,120 @@
-import os
-from langchain_openai import ChatOpenAI
-import getpass
-import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
 
-API_HOST = os.getenv("API_HOST", "github")
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
 
-def load_model():
-    
-    model = ChatOpenAI(
-        model="gpt-4o-mini", base_url="https://models.inference.ai.azure.com", api_key=os.environ["GITHUB_TOKEN"]
+from llm_cache import get_response_cache
+from llm_scheduler import scheduled
+from settings import get_settings
+
+_lock = threading.Lock()
+_http_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_chat_model: Optional[BaseChatModel] = None
+_model_override: Optional[BaseChatModel] = None
+_runnables: Dict[str, Runnable] = {}
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Return the process-wide pooled sync and async HTTP clients used by the chat model,
+    shared by every call (sync and async) up to the LLM_POOL_* limits.
+    """
+    global _http_clients
+    with _lock:
+        if _http_clients is None:
+            settings = get_settings()
+            limits = httpx.Limits(
+                max_connections=settings.llm_pool_max_connections,
+                max_keepalive_connections=settings.llm_pool_max_keepalive,
+            )
+            _http_clients = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+        return _http_clients
+
+def load_model() -> BaseChatModel:
+    """Return the shared chat model, or the override installed with set_model_override."""
+    global _chat_model
+    if _model_override is not None:
+        return _model_override
+    if _chat_model is None:
+        # langchain_openai is the heaviest import of the app, so it waits for the first model call
+        from langchain_openai import ChatOpenAI
+
+        token = get_settings().github_token
+        if not token:
+            raise ValueError("GITHUB_TOKEN is not set.")
+        http_client, http_async_client = get_http_clients()
+        with _lock:
+            if _chat_model is None:
+                _chat_model = ChatOpenAI(
+                    model="gpt-4o-mini",
+                    base_url="https://models.inference.ai.azure.com",
+                    api_key=token,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    # retries are made by the scheduler, which paces them across every call of the process
+                    max_retries=0,
+                )
+    return _chat_model
+
+def get_runnable(name: str, build: Callable[[BaseChatModel], Runnable]) -> Runnable:
+    """
+    Return the named runnable (e.g. the teacher chain with its tools bound), building it once per process.
+    Its model calls go through the process-wide LLM scheduler, at the priority of `name`,
+    and are answered from the response cache when `name` is in LLM_CACHE_CHAINS.
+    Args:
+        name (str): Registry key of the runnable.
+        build (Callable): Builds the runnable from the chat model on first use.
+    """
+    runnable = _runnables.get(name)
+    if runnable is None:
+        model = load_model()
+        with _lock:
+            runnable = _runnables.get(name)
+            if runnable is None:
+                runnable = build(scheduled(model, name, cache=get_response_cache(name)))
+                _runnables[name] = runnable
+    return runnable
+
+def set_model_override(model: Optional[BaseChatModel]) -> None:
+    """
+    Swap the chat model behind every runnable, e.g. for a fake local model in tests.
+    Passing None restores the real model. Already built runnables are discarded.
+    """
+    global _model_override
+    with _lock:
+        _model_override = model
+        _runnables.clear()
+
+class LLMCallCounter(BaseCallbackHandler):
+    """
+    Counts the model calls made while running a graph turn, passed as a callback in the turn's config.
+    Calls answered from the response cache are not counted.
+    """
+    # counted on the caller's thread or event loop instead of being dispatched to an executor
+    run_inline = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.calls += 1
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        if is_cache_hit(response):
+            self.calls -= 1
+
+def is_cache_hit(response) -> bool:
+    """Whether a model call's result (an `LLMResult`) was served from the response cache."""
+    return any(
+        getattr(generation, "message", None) is not None and generation.message.response_metadata.get("cache_hit")
+        for generations in response.generations
+        for generation in generations
     )
-    return model
 
 # def load_model():
     # model = ChatMistralAI(
@@ -0,0 +1,273 @@
+import os
+import re
+import gzip
+import json
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Collection, Dict, List, Optional, Sequence
+
+from bm25_index import tokenize
+from settings import get_settings, load_environment
+from state import Quiz
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Configuration
+# --------------------------
+DIFFICULTIES = ("easy", "medium", "hard")
+# quiz ids of the bank, so a served quiz can be told apart from a live one
+BANK_ID_PREFIX = "bank-"
+
+_CHOICE = re.compile(r"^\s*\(?([A-D])[\.\):]")
+
+# --------------------------
+# Validation
+# --------------------------
+def topic_key(topic: str) -> str:
+    """Normalised topic, so "Speed limits" and "speed limit" share their questions."""
+    return " ".join(sorted(set(tokenize(topic))))
+
+def validate_quiz(quiz: Quiz) -> Optional[str]:
+    """Return why a generated quiz cannot go in the bank, or None when it is valid."""
+    if not quiz.topic or not topic_key(quiz.topic):
+        return "no topic"
+    if not quiz.question or not quiz.question.strip():
+        return "no question"
+    choices = quiz.mutliple_choices or []
+    letters = [match.group(1) if match else None for match in (_CHOICE.match(choice) for choice in choices)]
+    if letters != ["A", "B", "C", "D"]:
+        return "choices are not lettered A to D"
+    if len({choice.strip().lower() for choice in choices}) != len(choices):
+        return "duplicate choices"
+    if (quiz.answer or "").strip().upper()[:1] not in letters:
+        return "answer is not one of the choices"
+    if quiz.difficulty not in DIFFICULTIES:
+        return "unknown difficulty"
+    return None
+
+def _question_key(question: str) -> str:
+    return " ".join(tokenize(question))
+
+# --------------------------
+# Question Bank
+# --------------------------
+class QuizBank:
+    """
+    Pre-generated, validated quizzes indexed by normalised topic and difficulty.
+    Served quizzes cost no model call; topics missing from the bank are generated live by the quiz agent.
+    """
+
+    def __init__(self):
+        self._quizzes: Dict[str, Quiz] = {}
+        # topic key -> difficulty -> quiz ids
+        self._index: Dict[str, Dict[str, List[str]]] = {}
+        self._questions: set = set()
+
+    def __len__(self) -> int:
+        return len(self._quizzes)
+
+    def __contains__(self, topic: str) -> bool:
+        return topic_key(topic) in self._index
+
+    def topics(self) -> List[str]:
+        return sorted({quiz.topic for quiz in self._quizzes.values()})
+
+    def add(self, quiz: Quiz) -> Optional[str]:
+        """Validate and add a quiz; return why it was rejected, or None when it was added."""
+        reason = validate_quiz(quiz)
+        if reason is not None:
+            return reason
+        question = _question_key(quiz.question)
+        if question in self._questions:
+            return "duplicate question"
+        # the id only depends on the question, so the ids served to a session survive a rebuild of the bank
+        quiz = quiz.model_copy(update={
+            "id": f"{BANK_ID_PREFIX}{hashlib.sha1(question.encode('utf-8')).hexdigest()[:12]}",
+            "answer": quiz.answer.strip().upper()[:1],
+            "user_answer": None,
+            "feedback": None,
+        })
+        self._quizzes[quiz.id] = quiz
+        self._index.setdefault(topic_key(quiz.topic), {}).setdefault(quiz.difficulty, []).append(quiz.id)
+        self._questions.add(question)
+        return None
+
+    def questions(self, topic: str) -> List[str]:
+        """The questions already in the bank for a topic."""
+        by_difficulty = self._index.get(topic_key(topic), {})
+        return [self._quizzes[quiz_id].question for ids in by_difficulty.values() for quiz_id in ids]
+
+    def draw(
+        self,
+        topic: str,
+        exclude: Collection[str] = (),
+        difficulty: Optional[str] = None,
+        rng: Optional[random.Random] = None,
+    ) -> Optional[Quiz]:
+        """
+        Pick a random quiz on a topic that is not in `exclude`.
+        :param topic: Quiz topic, matched on its normalised form
+        :param exclude: Ids of the quizzes already served to the student
+        :param difficulty: Only draw quizzes of this difficulty, any difficulty when None
+        :return: A quiz, or None when the bank has no unserved quiz on the topic
+        """
+        by_difficulty = self._index.get(topic_key(topic), {})
+        difficulties = [difficulty] if difficulty else list(by_difficulty)
+        candidates = [quiz_id for d in difficulties for quiz_id in by_difficulty.get(d, ()) if quiz_id not in exclude]
+        if not candidates:
+            return None
+        return self._quizzes[(rng or random).choice(candidates)]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "quizzes": [quiz.model_dump(exclude_none=True) for quiz in self._quizzes.values()],
+            "index": self._index,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        logger.info(f"Saved quiz bank with {len(self)} quizzes on {len(self._index)} topics to '{path}'")
+
+    @classmethod
+    def load(cls, path: str) -> "QuizBank":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        bank = cls()
+        bank._quizzes = {quiz["id"]: Quiz(**quiz) for quiz in payload["quizzes"]}
+        bank._index = payload["index"]
+        bank._questions = {_question_key(quiz.question) for quiz in bank._quizzes.values()}
+        return bank
+
+
+_bank: Optional[QuizBank] = None
+_bank_loaded = False
+_bank_lock = threading.Lock()
+
+def get_quiz_bank() -> Optional[QuizBank]:
+    """
+    Return the process-wide quiz bank loaded from QUIZ_BANK_PATH, the gzipped JSON bank built by this module's entrypoint,
+    or None when there is none (an empty path disables the bank).
+    """
+    global _bank, _bank_loaded
+    if not _bank_loaded:
+        with _bank_lock:
+            if not _bank_loaded:
+                path = get_settings().quiz_bank_path
+                if path and os.path.exists(path):
+                    _bank = QuizBank.load(path)
+                    logger.info(f"Loaded quiz bank with {len(_bank)} quizzes from '{path}'")
+                _bank_loaded = True
+    return _bank
+
+def draw_quizzes(quiz_topics: Sequence[str], served: Collection[str], difficulty: Optional[str] = None) -> List[Optional[Quiz]]:
+    """
+    Draw one bank quiz per topic, none of them already served to the student nor repeated within the quiz.
+    :param difficulty: Difficulty served, QUIZ_BANK_DIFFICULTY by default; empty serves every difficulty
+    :return: A quiz or None (to be generated live) per topic, in topic order
+    """
+    bank = get_quiz_bank()
+    if bank is None:
+        return [None] * len(quiz_topics)
+    if difficulty is None:
+        difficulty = get_settings().quiz_bank_difficulty
+    exclude = set(served)
+    quizzes = []
+    for topic in quiz_topics:
+        quiz = bank.draw(topic, exclude, difficulty or None)
+        if quiz is not None:
+            exclude.add(quiz.id)
+        quizzes.append(quiz)
+    return quizzes
+
+# --------------------------
+# Offline Generation
+# --------------------------
+def build_quiz_bank_chain(model):
+    """Builds the quiz bank chain: the quiz bank prompt piped into the model with `Quiz` structured output."""
+    from prompts import quiz_bank_prompt
+
+    return quiz_bank_prompt | model.with_structured_output(Quiz)
+
+def study_material(topic: str, top: int = 5) -> str:
+    """The full text of the course chunks found for a topic."""
+    from azure_ai_search import read_chunk, search_documents
+
+    chunks = []
+    for hit in search_documents(topic, top=top):
+        chunks.extend(chunk["content"] for chunk in read_chunk(hit["id"]) or [hit])
+    return "\n\n".join(chunks)
+
+def generate_bank(
+    topics: Sequence[str],
+    per_difficulty: int = 3,
+    difficulties: Sequence[str] = DIFFICULTIES,
+    bank: Optional[QuizBank] = None,
+    concurrency: Optional[int] = None,
+) -> QuizBank:
+    """
+    Generate `per_difficulty` quizzes per topic and difficulty from the course documents and keep the valid ones.
+    Each round asks for one more quiz per (topic, difficulty), showing the model the questions already kept.
+    :param bank: Bank to extend, a new one when None
+    :param concurrency: Generation calls running at once, QUIZ_BANK_CONCURRENCY by default
+    """
+    from model import get_runnable
+
+    bank = bank if bank is not None else QuizBank()
+    materials = {topic: study_material(topic) for topic in topics}
+    chain = get_runnable("quiz_bank", build_quiz_bank_chain)
+    rejected: Dict[str, int] = {}
+    for round_ in range(per_difficulty):
+        jobs = [(topic, difficulty) for topic in topics for difficulty in difficulties]
+        responses = chain.batch(
+            [
+                {
+                    "quiz_topics": [topic],
+                    "quiz_study_material": materials[topic],
+                    "difficulty": difficulty,
+                    "avoid_questions": bank.questions(topic),
+                }
+                for topic, difficulty in jobs
+            ],
+            config={"max_concurrency": concurrency or get_settings().quiz_bank_concurrency},
+            return_exceptions=True,
+        )
+        for (topic, difficulty), response in zip(jobs, responses):
+            if isinstance(response, Exception):
+                reason = f"generation failed ({type(response).__name__})"
+            else:
+                reason = bank.add(response.model_copy(update={"topic": topic, "difficulty": difficulty}))
+            if reason is not None:
+                rejected[reason] = rejected.get(reason, 0) + 1
+        logger.info(f"Round {round_ + 1}/{per_difficulty}: {len(bank)} quizzes in the bank")
+    if rejected:
+        logger.warning(f"Rejected quizzes: {rejected}")
+    return bank
+
+# --------------------------
+# Entrypoint
+# --------------------------
+
+if __name__ == "__main__":
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Pre-generate the quiz question bank from the course documents.")
+    parser.add_argument("--topics", help="file with one topic per line, defaults to questions_test.txt")
+    parser.add_argument("--per-difficulty", type=int, default=3, help="quizzes per topic and difficulty")
+    parser.add_argument("--difficulties", default=",".join(DIFFICULTIES), help="comma-separated difficulties")
+    parser.add_argument("--extend", action="store_true", help="add to the existing bank instead of replacing it")
+    parser.add_argument("--output", default=get_settings().quiz_bank_path, help="bank file, defaults to QUIZ_BANK_PATH")
+    args = parser.parse_args()
+
+    from retrieval_benchmark import load_topics
+
+    difficulties = [d for d in args.difficulties.split(",") if d]
+    for difficulty in difficulties:
+        if difficulty not in DIFFICULTIES:
+            parser.error(f"'{difficulty}' is not one of {', '.join(DIFFICULTIES)}")
+    existing = QuizBank.load(args.output) if args.extend and os.path.exists(args.output) else None
+    topics = load_topics(args.topics or get_settings().benchmark_questions_path)
+    generate_bank(topics, args.per_difficulty, difficulties, existing).save(args.output)
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from settings import configure, get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Configuration
+# ---------------------------
+BACKENDS = ("azure", "local")
+MODES = ("keyword", "vector", "hybrid", "cached")
+
+SearchFn = Callable[[str, int], List[Dict]]
+
+# ---------------------------
+# Query Sets
+# ---------------------------
+def load_topics(path: Optional[str] = None) -> List[str]:
+    """
+    The quiz topics of BENCHMARK_QUESTIONS_PATH (questions_test.txt by default), one per non-empty line.
+    They are unlabelled and only timed.
+    """
+    with open(path or get_settings().benchmark_questions_path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def load_labels(path: Optional[str] = None) -> List[Dict]:
+    """
+    Labelled queries of BENCHMARK_LABELS_PATH, one JSON object per line: {"query": ..., "relevant": [...]}.
+    A relevant entry is a chunk id or a document key (the slug of the PDF name, as local_ingestion.document_key),
+    which matches every chunk of that document. Hits of the Azure indexer, whose ids are encoded storage paths,
+    only match document keys, through their "metadata_storage_name".
+    """
+    with open(path or get_settings().benchmark_labels_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------------------------
+# Quality Metrics
+# ---------------------------
+_KEY_UNSAFE = re.compile(r"[^a-zA-Z0-9_\-]+")
+
+def document_key(name: str) -> str:
+    """Label key of a source file name, the chunk id prefix of local_ingestion.document_key."""
+    return _KEY_UNSAFE.sub("-", Path(name).stem).strip("-").lower()
+
+def _matches(hit: Dict, label: str) -> bool:
+    hit_id = hit.get("id") or ""
+    if hit_id == label or hit_id.startswith(f"{label}-"):
+        return True
+    name = hit.get("metadata_storage_name")
+    return bool(name) and document_key(name) == label
+
+def recall_at_k(hits: Sequence[Dict], relevant: Sequence[str], k: int) -> float:
+    """Share of the relevant labels matched by at least one of the top k hits."""
+    if not relevant:
+        return 0.0
+    found = sum(1 for label in relevant if any(_matches(hit, label) for hit in hits[:k]))
+    return found / len(relevant)
+
+def reciprocal_rank(hits: Sequence[Dict], relevant: Sequence[str]) -> float:
+    """1 / rank of the first relevant hit, 0 when none is relevant."""
+    for rank, hit in enumerate(hits, start=1):
+        if any(_matches(hit, label) for label in relevant):
+            return 1.0 / rank
+    return 0.0
+
+# ---------------------------
+# Search Modes
+# ---------------------------
+def build_search(mode: str) -> SearchFn:
+    """Return the search function of a mode, against the backend currently selected in azure_ai_search."""
+    import azure_ai_search
+
+    if mode == "keyword":
+        return lambda query, top: azure_ai_search.search_documents(query, use_vector=False, top=top)
+    if mode == "hybrid":
+        return lambda query, top: azure_ai_search.search_documents(query, use_vector=True, top=top)
+    if mode == "vector":
+        return lambda query, top: azure_ai_search._vector_search(azure_ai_search.get_embedding(query), top)
+    if mode == "cached":
+        from search_cache import SearchCache
+
+        # a fresh cache per run, so the first pass misses and the repeats measure the hit path
+        cache = SearchCache(max_size=4096)
+        return lambda query, top: cache.get_or_search(
+            query, lambda q: azure_ai_search.search_documents(q, use_vector=False, top=top)
+        )
+    raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}.")
+
+# ---------------------------
+# Runner
+# ---------------------------
+def _timed(search: SearchFn, query: str, top: int) -> Tuple[float, List[Dict], bool]:
+    start = time.perf_counter()
+    try:
+        hits, failed = search(query, top), False
+    except Exception:
+        logger.exception(f"Search failed for '{query}'")
+        hits, failed = [], True
+    return time.perf_counter() - start, hits, failed
+
+def run_benchmark(
+    mode: str,
+    topics: Sequence[str],
+    labels: Sequence[Dict],
+    top: int = 5,
+    concurrency: int = 1,
+    repeats: int = 3,
+) -> Dict:
+    """
+    Time every query `repeats` times across `concurrency` threads and score the labelled ones.
+    :return: Latency percentiles (ms), throughput (queries/s), error and empty-result counts, recall@k and MRR
+    """
+    search = build_search(mode)
+    queries = [label["query"] for label in labels] + list(topics)
+    # one untimed query loads the clients and indexes, which a long-running process pays only once
+    _timed(search, queries[0], top)
+
+    workload = queries * repeats
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda query: _timed(search, query, top), workload))
+    wall = time.perf_counter() - start
+
+    latencies = np.asarray([latency for latency, _, _ in outcomes]) * 1000
+    # quality is scored on the first pass; repeats only add timing samples
+    first_pass = outcomes[:len(labels)]
+    recalls = [recall_at_k(hits, label["relevant"], top) for (_, hits, _), label in zip(first_pass, labels)]
+    ranks = [reciprocal_rank(hits, label["relevant"]) for (_, hits, _), label in zip(first_pass, labels)]
+    return {
+        "mode": mode,
+        "queries": len(workload),
+        "concurrency": concurrency,
+        "top": top,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "throughput_qps": len(workload) / wall if wall else 0.0,
+        "errors": sum(1 for _, _, failed in outcomes if failed),
+        "empty": sum(1 for _, hits, failed in outcomes if not hits and not failed),
+        f"recall@{top}": float(np.mean(recalls)) if recalls else None,
+        "mrr": float(np.mean(ranks)) if ranks else None,
+    }
+
+def run_suite(
+    backends: Sequence[str],
+    modes: Sequence[str],
+    top: int = 5,
+    concurrency: int = 1,
+    repeats: int = 3,
+    questions_path: Optional[str] = None,
+    labels_path: Optional[str] = None,
+) -> Dict:
+    """Run every mode against every backend and return the machine-readable report."""
+    import azure_ai_search
+
+    questions_path = questions_path or get_settings().benchmark_questions_path
+    labels_path = labels_path or get_settings().benchmark_labels_path
+    topics, labels = load_topics(questions_path), load_labels(labels_path)
+    results = []
+    for backend in backends:
+        configure(search_backend=backend)
+        for mode in modes:
+            if backend == "local" and mode == "vector" and azure_ai_search.get_vector_index() is None:
+                logger.warning("Skipping vector mode on the local backend: VECTOR_INDEX_PATH is not set")
+                continue
+            logger.info(f"Benchmarking {backend}/{mode} ({len(labels)} labelled queries, {len(topics)} topics)")
+            results.append({"backend": backend, **run_benchmark(mode, topics, labels, top, concurrency, repeats)})
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "top": top,
+            "concurrency": concurrency,
+            "repeats": repeats,
+            "questions_path": questions_path,
+            "labels_path": labels_path,
+            "vector_index_path": get_settings().vector_index_path,
+            "embedding_backend": get_settings().embedding_backend,
+        },
+        "results": results,
+    }
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def log_report(report: Dict, baseline: Optional[Dict] = None) -> None:
+    """Log one line per run, with the p95 and recall change against a baseline report when one is given."""
+    previous = {(r["backend"], r["mode"]): r for r in (baseline or {}).get("results", [])}
+    for result in report["results"]:
+        recall_key = f"recall@{result['top']}"
+        line = (
+            f"{result['backend']:>6}/{result['mode']:<8} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+            f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_qps']:8.1f} q/s  "
+            f"{recall_key} {_format(result[recall_key])}  MRR {_format(result['mrr'])}  "
+            f"errors {result['errors']}  empty {result['empty']}"
+        )
+        old = previous.get((result["backend"], result["mode"]))
+        if old is not None:
+            line += f"  | Δp95 {result['p95_ms'] - old['p95_ms']:+.2f}ms"
+            if result[recall_key] is not None and old.get(recall_key) is not None:
+                line += f"  Δ{recall_key} {result[recall_key] - old[recall_key]:+.3f}"
+        logger.info(line)
+
+def _format(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else "  n/a"
+
+def write_report(report: Dict, output_path: Optional[str] = None, prefix: str = "retrieval") -> str:
+    """Write a report as JSON, by default to a timestamped `<prefix>-*.json` file in BENCHMARK_DIR."""
+    if output_path is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output_path = os.path.join(get_settings().benchmark_dir, f"{prefix}-{stamp}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote benchmark results to '{output_path}'")
+    return output_path
+
+# ---------------------------
+# Entrypoint
+# ---------------------------
+
+if __name__ == "__main__":
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput and quality.")
+    parser.add_argument("--backends", default="local", help=f"comma-separated subset of {','.join(BACKENDS)}")
+    parser.add_argument("--modes", default="keyword,hybrid,cached", help=f"comma-separated subset of {','.join(MODES)}")
+    parser.add_argument("--top", type=int, default=5, help="hits per query, also the k of recall@k")
+    parser.add_argument("--concurrency", type=int, default=1, help="queries in flight at once")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the query set")
+    parser.add_argument("--output", help="JSON results file, defaults to a timestamped file in BENCHMARK_DIR")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    backends = [b for b in args.backends.split(",") if b]
+    modes = [m for m in args.modes.split(",") if m]
+    for value, allowed in [(b, BACKENDS) for b in backends] + [(m, MODES) for m in modes]:
+        if value not in allowed:
+            parser.error(f"'{value}' is not one of {', '.join(allowed)}")
+
+    report = run_suite(backends, modes, args.top, args.concurrency, args.repeats)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    log_report(report, baseline)
+    write_report(report, args.output)
+    sys.exit(1 if any(result["errors"] for result in report["results"]) else 0)
@@ -0,0 +1,152 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Query Normalisation
+# --------------------------
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Lower-case the query and strip punctuation and repeated whitespace so trivial variants share a key."""
+    query = _PUNCTUATION.sub(" ", query.lower())
+    return _WHITESPACE.sub(" ", query).strip()
+
+# --------------------------
+# Search Result Cache
+# --------------------------
+class SearchCache:
+    """
+    LRU/TTL cache of search results keyed on the normalised query.
+    When an embedding function and a cosine threshold are given, a query that misses the
+    exact key can still reuse the results of a cached query whose embedding is close enough.
+    Callers get copies of the cached hits, so changing them never changes the cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl_seconds: float = 3600.0,
+        semantic_threshold: Optional[float] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.embed = embed
+        # key -> (expires_at, results, unit embedding or None)
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict], Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.embed is not None and self.semantic_threshold is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_search(self, query: str, search: Callable[[str], List[Dict]]) -> List[Dict]:
+        """
+        Return cached results for the query, or run the search and cache its results.
+        :param query: The raw user query
+        :param search: Function running the real search on a miss
+        """
+        key = normalize_query(query)
+        results = self._get_exact(key)
+        if results is not None:
+            return results
+
+        vector = self._embed(key) if self.semantic_enabled else None
+        if vector is not None:
+            results = self._get_semantic(vector)
+            if results is not None:
+                return results
+
+        with self._lock:
+            self.misses += 1
+        results = search(query)
+        # empty results are also what a failed search returns, so they are not cached
+        if results:
+            self._put(key, results, vector)
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.semantic_hits = self.misses = 0
+
+    def _embed(self, key: str) -> Optional[np.ndarray]:
+        # the semantic layer is an optimisation: when the embedding call fails, the lookup is an exact-key miss
+        try:
+            return _unit(self.embed(key))
+        except Exception:
+            logger.warning(f"Embedding the query '{key}' failed, skipping the semantic cache", exc_info=True)
+            return None
+
+    def _get_exact(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy(entry[1])
+
+    def _get_semantic(self, vector: np.ndarray) -> Optional[List[Dict]]:
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_score = None, self.semantic_threshold
+            for key, (expires_at, _, cached_vector) in self._entries.items():
+                if cached_vector is None or expires_at < now:
+                    continue
+                score = float(cached_vector @ vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            logger.debug(f"Semantic cache hit on '{best_key}' (cosine={best_score:.3f})")
+            return _copy(self._entries[best_key][1])
+
+    def _put(self, key: str, results: List[Dict], vector: Optional[np.ndarray]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, _copy(results), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+def _copy(results: List[Dict]) -> List[Dict]:
+    return [dict(hit) for hit in results]
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -0,0 +1,209 @@
+import uuid
+import asyncio
+import logging
+import weakref
+from typing import Dict, List, Optional, Sequence
+
+from aiohttp import web
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
+
+from graph import workflow
+from checkpointer import open_async_checkpointer
+from model import LLMCallCounter
+from llm_scheduler import get_scheduler
+from settings import get_settings, load_environment
+from tracing import trace_turn, tracing_callbacks
+
+logger = logging.getLogger(__name__)
+
+
+class ServerBusyError(Exception):
+    """Raised when the server already holds SERVER_MAX_PENDING turns."""
+
+
+# --------------------------
+# Session Server
+# --------------------------
+class TutorServer:
+    """
+    Hosts the compiled workflow for many concurrent tutoring sessions, one `thread_id` per student.
+    Turns of the same session run one at a time, turns of different sessions run concurrently
+    up to `max_concurrency`, and at most `max_pending` turns (running + waiting) are accepted at once;
+    both default to the SERVER_* settings.
+    `callbacks` are added to the config of every turn, e.g. to time the graph nodes.
+    """
+
+    def __init__(
+        self,
+        checkpointer=None,
+        max_concurrency: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        callbacks: Sequence[BaseCallbackHandler] = (),
+    ):
+        settings = get_settings()
+        self.graph = workflow.compile(checkpointer=checkpointer or MemorySaver())
+        self.max_pending = max_pending or settings.server_max_pending
+        self.callbacks = list(callbacks)
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.server_max_concurrency)
+        self._pending = 0
+        # a session lock lives only as long as a turn of that session holds it
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def send(self, thread_id: str, text: str) -> Dict:
+        """
+        Runs one turn of a session. The text resumes the pending `student_input_node` interrupt
+        when the session is waiting for a quiz answer, otherwise it starts a new turn.
+
+        Args:
+            thread_id (str): The session id.
+            text (str): The student's message or quiz answer.
+
+        Returns:
+            dict: The agent messages produced by the turn, whether an answer is awaited and the model calls made.
+        """
+        if self._pending >= self.max_pending:
+            raise ServerBusyError(f"{self._pending} turns pending")
+        self._pending += 1
+        try:
+            lock = self._session_locks.get(thread_id)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._session_locks[thread_id] = lock
+            async with lock, self._semaphore:
+                return await self._run_turn(thread_id, text)
+        finally:
+            self._pending -= 1
+
+    async def get_session(self, thread_id: str) -> Optional[Dict]:
+        config = self._config(thread_id)
+        state = await self.graph.aget_state(config)
+        if not state.values:
+            return None
+        return {
+            "thread_id": thread_id,
+            "awaiting_answer": _is_interrupted(state),
+            "messages": _agent_messages(state.values.get("messages", [])),
+        }
+
+    async def _run_turn(self, thread_id: str, text: str) -> Dict:
+        config = self._config(thread_id)
+        state = await self.graph.aget_state(config)
+        seen = {message.id for message in state.values.get("messages", [])}
+
+        if _is_interrupted(state):
+            graph_input = Command(resume=text)
+        else:
+            graph_input = {"messages": HumanMessage(content=text)}
+        llm_calls = LLMCallCounter()
+        callbacks = [llm_calls, *tracing_callbacks(), *self.callbacks]
+        with trace_turn(thread_id) as turn_span:
+            await self.graph.ainvoke(graph_input, config={**config, "callbacks": callbacks})
+            turn_span.set("turn.llm_calls", llm_calls.calls)
+
+        state = await self.graph.aget_state(config)
+        new_messages = [m for m in state.values.get("messages", []) if m.id not in seen]
+        return {
+            "thread_id": thread_id,
+            "awaiting_answer": _is_interrupted(state),
+            "messages": _agent_messages(new_messages),
+            "llm_calls": llm_calls.calls,
+        }
+
+    @staticmethod
+    def _config(thread_id: str) -> Dict:
+        return {"configurable": {"thread_id": thread_id}}
+
+
+def _is_interrupted(state) -> bool:
+    return any(task.interrupts for task in state.tasks)
+
+
+def _agent_messages(messages) -> List[Dict[str, str]]:
+    return [
+        {"name": message.name, "content": message.content}
+        for message in messages
+        if isinstance(message, AIMessage) and message.content
+    ]
+
+# --------------------------
+# HTTP API
+# --------------------------
+async def create_session(request: web.Request) -> web.Response:
+    return web.json_response({"thread_id": str(uuid.uuid4())}, status=201)
+
+
+async def post_message(request: web.Request) -> web.Response:
+    server: TutorServer = request.app["tutor_server"]
+    payload = await request.json()
+    text = payload.get("text")
+    if not text:
+        return web.json_response({"error": "'text' is required"}, status=400)
+    try:
+        reply = await server.send(request.match_info["thread_id"], text)
+    except ServerBusyError:
+        return web.json_response({"error": "server busy, retry later"}, status=503, headers={"Retry-After": "1"})
+    return web.json_response(reply)
+
+
+async def get_session(request: web.Request) -> web.Response:
+    server: TutorServer = request.app["tutor_server"]
+    session = await server.get_session(request.match_info["thread_id"])
+    if session is None:
+        return web.json_response({"error": "unknown session"}, status=404)
+    return web.json_response(session)
+
+
+async def get_metrics(request: web.Request) -> web.Response:
+    server: TutorServer = request.app["tutor_server"]
+    return web.json_response({"pending_turns": server.pending, "llm_scheduler": get_scheduler().metrics()})
+
+
+async def _persistent_server(app: web.Application):
+    # sessions are persisted in the checkpoint database, so they survive restarts
+    async with open_async_checkpointer() as checkpointer:
+        app["tutor_server"] = TutorServer(checkpointer=checkpointer)
+        yield
+
+
+def create_app(server: Optional[TutorServer] = None) -> web.Application:
+    """
+    Builds the HTTP front-end:
+    - POST /sessions creates a session id.
+    - POST /sessions/{thread_id}/messages sends a message or quiz answer ({"text": ...}).
+    - GET /sessions/{thread_id} returns the session's agent messages.
+    - GET /metrics returns the pending turns and the LLM scheduler's queue depth, wait times and retries.
+    Without a server, one backed by the persistent checkpointer is created on startup.
+    """
+    app = web.Application()
+    if server is not None:
+        app["tutor_server"] = server
+    else:
+        app.cleanup_ctx.append(_persistent_server)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_post("/sessions/{thread_id}/messages", post_message)
+    app.router.add_get("/sessions/{thread_id}", get_session)
+    app.router.add_get("/metrics", get_metrics)
+    return app
+
+# --------------------------
+# Main Entrypoint
+# --------------------------
+def main() -> None:
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    settings = get_settings()
+    logger.info(
+        f"Serving on {settings.server_host}:{settings.server_port} "
+        f"(concurrency={settings.server_max_concurrency}, max pending={settings.server_max_pending})"
+    )
+    web.run_app(create_app(), host=settings.server_host, port=settings.server_port)
+
+if __name__ == "__main__":
+    main()
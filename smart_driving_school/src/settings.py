@@ -0,0 +1,243 @@
+import os
+import logging
+import threading
+from dataclasses import dataclass, field, fields, replace
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_environment_loaded = False
+_settings: Optional["Settings"] = None
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+# --------------------------
+# Environment
+# --------------------------
+def load_environment() -> None:
+    """
+    Load the .env file into the process environment, once per process.
+    `get_settings` calls it on first use; entrypoints call it first thing, before anything reads the environment.
+    """
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    with _lock:
+        if not _environment_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv(override=True)
+            _environment_loaded = True
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+def _optional(parse: Callable[[str], Any]) -> Callable[[str], Any]:
+    """An empty value is None rather than an error or an empty string."""
+    return lambda value: parse(value) if value else None
+
+def _env(name: str, default: Any = None, parse: Callable[[str], Any] = str, local_index_file: Optional[str] = None):
+    """
+    A setting read from the environment variable `name`.
+    :param local_index_file: When the variable is unset, the default path is this file of LOCAL_INDEX_DIR
+    """
+    return field(default=default, metadata={"env": name, "parse": parse, "local_index_file": local_index_file})
+
+# --------------------------
+# Settings
+# --------------------------
+@dataclass(frozen=True)
+class Settings:
+    """
+    Configuration of the whole app, resolved once from the environment (see .env.example for every variable).
+    Modules read it through `get_settings()` when they need a value, never at import time.
+    """
+
+    # Azure AI Search and embeddings (azure_ai_search)
+    search_service_name: Optional[str] = _env("SEARCH_SERVICE_NAME")
+    search_service_endpoint: Optional[str] = _env("SEARCH_SERVICE_ENDPOINT")
+    search_service_index_name: Optional[str] = _env("SEARCH_SERVICE_INDEX_NAME")
+    search_service_key: Optional[str] = _env("SEARCH_SERVICE_KEY")
+    azure_openai_endpoint: Optional[str] = _env("AZURE_OPENAI_ENDPOINT")
+    azure_openai_api_key: Optional[str] = _env("AZURE_OPENAI_API_KEY")
+    azure_deployment: Optional[str] = _env("AZURE_DEPLOYMENT")
+    # "azure" queries the search service, "local" the BM25 index built by bm25_index.py, with no service at all
+    search_backend: str = _env("SEARCH_BACKEND", "azure")
+    search_vector_field: str = _env("SEARCH_VECTOR_FIELD", "contentVector")
+    # HTTP connection pool limits shared by every pooled SearchClient
+    search_pool_connections: int = _env("SEARCH_POOL_CONNECTIONS", 10, int)
+    search_pool_maxsize: int = _env("SEARCH_POOL_MAXSIZE", 32, int)
+    # hybrid retrieval: optional local vector index and fusion parameters
+    vector_index_path: Optional[str] = _env("VECTOR_INDEX_PATH", None, _optional(str))
+    hybrid_candidates: int = _env("HYBRID_CANDIDATES", 20, int)
+    hybrid_rrf_k: int = _env("HYBRID_RRF_K", 60, int)
+    # length of the content preview returned with each hit; the full text is read from the chunk store
+    chunk_preview_chars: int = _env("CHUNK_PREVIEW_CHARS", 200, int)
+
+    # Embedding service (embeddings): "azure" or "fake" (deterministic, offline) backend and on-disk vector cache
+    embedding_backend: str = _env("EMBEDDING_BACKEND", "azure")
+    embedding_cache: bool = _env("EMBEDDING_CACHE", True, _flag)
+    embedding_cache_dir: str = _env("EMBEDDING_CACHE_DIR", local_index_file="embeddings")
+    embedding_batch_size: int = _env("EMBEDDING_BATCH_SIZE", 256, int)
+    embedding_concurrency: int = _env("EMBEDDING_CONCURRENCY", 4, int)
+    fake_embedding_dimensions: int = _env("FAKE_EMBEDDING_DIMENSIONS", 256, int)
+
+    # Local indexes and stores, under LOCAL_INDEX_DIR unless set one by one
+    local_index_dir: str = _env("LOCAL_INDEX_DIR", ".local_index")
+    local_documents_path: str = _env("LOCAL_DOCUMENTS_PATH", local_index_file="documents.jsonl")
+    local_search_index_path: str = _env("LOCAL_SEARCH_INDEX_PATH", local_index_file="bm25.npz")
+    bm25_k1: float = _env("BM25_K1", 1.2, float)
+    bm25_b: float = _env("BM25_B", 0.75, float)
+    # weight of a query term found in a chunk's keyPhrases, relative to its idf
+    keyphrase_boost: float = _env("KEYPHRASE_BOOST", 0.5, float)
+    # an empty CHUNK_STORE_DIR disables the store
+    chunk_store_dir: str = _env("CHUNK_STORE_DIR", local_index_file="chunks")
+
+    # Local ingestion pipeline (context/local_ingestion, context/incremental_indexing)
+    data_dir: str = _env("DATA_DIR", str(PROJECT_DIR / "data"))
+    chunk_size: int = _env("CHUNK_SIZE", 1200, int)
+    chunk_overlap: int = _env("CHUNK_OVERLAP", 200, int)
+    key_phrases_per_chunk: int = _env("KEY_PHRASES_PER_CHUNK", 10, int)
+    # pages extracted by one worker task, so a PDF is not re-opened for every page
+    pages_per_task: int = _env("PAGES_PER_TASK", 8, int)
+    # extraction worker processes, one per CPU when unset
+    ingestion_workers: Optional[int] = _env("INGESTION_WORKERS", None, _optional(int))
+    index_manifest_path: str = _env("INDEX_MANIFEST_PATH", local_index_file="manifest.json")
+
+    # Blob indexer, its data source and skillset (context/creating_index, context/creating_indexer)
+    azure_storage_connection_string: Optional[str] = _env("AZURE_STORAGE_CONNECTION_STRING")
+    blob_container_name: str = _env("BLOB_CONTAINER_NAME", "drvschoolcontainer")
+    datasource_name: str = _env("DATASOURCE_NAME", "drvschool-datasource")
+    indexer_name: str = _env("INDEXER_NAME", "drvschool-indexer")
+    skillset_name: str = _env("SKILLSET_NAME", "drvschool-skillset")
+    parsing_mode: str = _env("PARSING_MODE", "default")
+    cognitive_services_key: Optional[str] = _env("COGNITIVE_SERVICES_KEY", None, _optional(str))
+    # dimensions of the index's vector field, those of the embedding deployment
+    embedding_dimensions: int = _env("EMBEDDING_DIMENSIONS", 1536, int)
+
+    # Bulk push of the local pipeline's chunks (context/bulk_upload); requests retried on 429/503 with backoff
+    upload_batch_size: int = _env("UPLOAD_BATCH_SIZE", 500, int)
+    upload_concurrency: int = _env("UPLOAD_CONCURRENCY", 4, int)
+    upload_max_retries: int = _env("UPLOAD_MAX_RETRIES", 6, int)
+    upload_backoff_seconds: float = _env("UPLOAD_BACKOFF_SECONDS", 1.0, float)
+    # index filled by the blob indexer, and index of the chunks pushed by the local pipeline (see `chunk_index`)
+    index_name: str = _env("INDEX_NAME", "drvschoollessons-index")
+    chunk_index_name: Optional[str] = _env("CHUNK_INDEX_NAME", None, _optional(str))
+
+    # Search result cache (tools); setting a cosine threshold enables the semantic layer
+    search_cache_size: int = _env("SEARCH_CACHE_SIZE", 256, int)
+    search_cache_ttl: float = _env("SEARCH_CACHE_TTL", 3600.0, float)
+    search_cache_semantic_threshold: Optional[float] = _env("SEARCH_CACHE_SEMANTIC_THRESHOLD", None, _optional(float))
+    # tool calls of one teacher step running at once (tool_node)
+    tool_concurrency: int = _env("TOOL_CONCURRENCY", 4, int)
+
+    # Conversation state (state, summarization); a MESSAGE_WINDOW of 0 keeps every message
+    message_window: int = _env("MESSAGE_WINDOW", 0, int)
+    summary_keep_turns: int = _env("SUMMARY_KEEP_TURNS", 4, int)
+    summary_token_budget: int = _env("SUMMARY_TOKEN_BUDGET", 3000, int)
+
+    # Quiz generation (ds_agents): "batch" (concurrent, one call per topic), "list" (one QuizList call) or "off"
+    quiz_prefetch_mode: str = _env("QUIZ_PREFETCH_MODE", "batch")
+    quiz_prefetch_concurrency: int = _env("QUIZ_PREFETCH_CONCURRENCY", 5, int)
+    # pre-generated question bank (quiz_bank); an empty path disables it, an empty difficulty serves every one
+    quiz_bank_path: str = _env("QUIZ_BANK_PATH", local_index_file="quiz_bank.json.gz")
+    quiz_bank_difficulty: str = _env("QUIZ_BANK_DIFFICULTY", "")
+    quiz_bank_concurrency: int = _env("QUIZ_BANK_CONCURRENCY", 5, int)
+
+    # Chat model (model) and its HTTP connection pool
+    github_token: Optional[str] = _env("GITHUB_TOKEN")
+    llm_pool_max_connections: int = _env("LLM_POOL_MAX_CONNECTIONS", 100, int)
+    llm_pool_max_keepalive: int = _env("LLM_POOL_MAX_KEEPALIVE", 20, int)
+    # process-wide LLM scheduler (llm_scheduler): provider limits (0 disables), retries on 429/5xx and coalescing
+    llm_requests_per_minute: float = _env("LLM_REQUESTS_PER_MINUTE", 0.0, float)
+    llm_tokens_per_minute: float = _env("LLM_TOKENS_PER_MINUTE", 0.0, float)
+    # output tokens reserved per call before its real usage is known
+    llm_expected_output_tokens: int = _env("LLM_EXPECTED_OUTPUT_TOKENS", 400, int)
+    llm_max_retries: int = _env("LLM_MAX_RETRIES", 4, int)
+    llm_retry_base_delay: float = _env("LLM_RETRY_BASE_DELAY", 1.0, float)
+    llm_retry_max_delay: float = _env("LLM_RETRY_MAX_DELAY", 30.0, float)
+    llm_coalesce: bool = _env("LLM_COALESCE", True, _flag)
+    # response cache (llm_cache) of the runnables listed, e.g. "quiz,quiz_list"; empty disables it
+    llm_cache_chains: str = _env("LLM_CACHE_CHAINS", "")
+    llm_cache_path: str = _env("LLM_CACHE_PATH", local_index_file="llm_cache.sqlite")
+    llm_cache_ttl: float = _env("LLM_CACHE_TTL", 7 * 24 * 3600.0, float)
+    llm_cache_max_entries: int = _env("LLM_CACHE_MAX_ENTRIES", 10000, int)
+
+    # Checkpoint persistence (checkpointer)
+    checkpoint_db_path: str = _env("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+    # checkpoints kept per thread, older ones are pruned after each write
+    checkpoint_keep_last: int = _env("CHECKPOINT_KEEP_LAST", 5, int)
+    # checkpoint payloads at least this large are zlib-compressed
+    checkpoint_compress_min_bytes: int = _env("CHECKPOINT_COMPRESS_MIN_BYTES", 512, int)
+
+    # Async serving front-end (server): turns running at once, and queued beyond that before 503s
+    server_host: str = _env("SERVER_HOST", "0.0.0.0")
+    server_port: int = _env("SERVER_PORT", 8080, int)
+    server_max_concurrency: int = _env("SERVER_MAX_CONCURRENCY", 64, int)
+    server_max_pending: int = _env("SERVER_MAX_PENDING", 512, int)
+
+    # Tracing (tracing): JSONL span file, and a directory of per-turn cProfile dumps; empty disables them
+    trace_path: str = _env("TRACE_PATH", "")
+    trace_profile_dir: str = _env("TRACE_PROFILE_DIR", "")
+
+    # Benchmarks (retrieval_benchmark, load_test)
+    benchmark_questions_path: str = _env("BENCHMARK_QUESTIONS_PATH", str(PROJECT_DIR / "questions_test.txt"))
+    benchmark_labels_path: str = _env("BENCHMARK_LABELS_PATH", str(PROJECT_DIR / "retrieval_labels.jsonl"))
+    benchmark_dir: str = _env("BENCHMARK_DIR", local_index_file="benchmarks")
+    # seconds the scripted fake model of the load test waits per call
+    fake_llm_latency: float = _env("FAKE_LLM_LATENCY", 0.05, float)
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        local_index_dir = os.getenv("LOCAL_INDEX_DIR") or ".local_index"
+        values = {}
+        for setting in fields(cls):
+            value = os.getenv(setting.metadata["env"])
+            if value is not None:
+                values[setting.name] = setting.metadata["parse"](value)
+            elif setting.metadata["local_index_file"]:
+                values[setting.name] = os.path.join(local_index_dir, setting.metadata["local_index_file"])
+        return cls(**values)
+
+    def require_search_service(self) -> None:
+        """Raise when the Azure Search service is needed but not configured."""
+        if not all([self.search_service_endpoint, self.search_service_index_name, self.search_service_key]):
+            logger.error("Missing one or more required Azure Search environment variables.")
+            raise ValueError("Environment configuration incomplete.")
+
+    def chunk_index(self) -> str:
+        """
+        Index of the local pipeline's chunks, CHUNK_INDEX_NAME or "<INDEX_NAME>-chunks". It is kept apart from INDEX_NAME,
+        which the blob indexer fills with whole documents under other keys: pushing chunks there would return every passage twice.
+        """
+        return self.chunk_index_name or f"{self.index_name}-chunks"
+
+    def cached_chains(self) -> frozenset:
+        """Names of the runnables whose responses are cached (LLM_CACHE_CHAINS)."""
+        return frozenset(chain.strip() for chain in self.llm_cache_chains.split(",") if chain.strip())
+
+def get_settings() -> Settings:
+    """Return the process-wide settings, loading .env and reading the environment on first use."""
+    global _settings
+    if _settings is None:
+        load_environment()
+        with _lock:
+            if _settings is None:
+                _settings = Settings.from_env()
+    return _settings
+
+def configure(**overrides) -> Settings:
+    """
+    Replace some settings for the rest of the process, e.g. configure(search_backend="local").
+    Clients, caches and stores already built with the previous settings are kept.
+    """
+    global _settings
+    unknown = set(overrides) - {setting.name for setting in fields(Settings)}
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}.")
+    current = get_settings()
+    with _lock:
+        _settings = replace(current, **overrides)
+    return _settings
@@ -0,0 +1,65 @@
+import os
+import sys
+import logging
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ---------------------------
+# Startup Profile
+# ---------------------------
+_READY_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+{ready}
+print(f"ready_s={{time.perf_counter() - start}}")
+"""
+
+def profile_startup(module: str = "graph", compile_graph: bool = True) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """
+    Import a module in a fresh interpreter with `-X importtime` and measure the time until it is ready.
+    :param module: Module to import from the src directory
+    :param compile_graph: Also compile the workflow graph, as the server does before its first turn
+    :return: Seconds to ready, and (module, self ms, cumulative ms) for every imported module
+    """
+    ready = "{}.workflow.compile()".format(module) if compile_graph and module == "graph" else ""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _READY_SCRIPT.format(module=module, ready=ready)],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    ready_s = next(float(line.split("=", 1)[1]) for line in result.stdout.splitlines() if line.startswith("ready_s="))
+    return ready_s, _parse_importtime(result.stderr)
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, float, float]]:
+    """Parse the `import time: self [us] | cumulative | imported package` lines written by -X importtime."""
+    imports: Dict[str, Tuple[float, float]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        imports[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return [(name, self_ms, cumulative_ms) for name, (self_ms, cumulative_ms) in imports.items()]
+
+# ---------------------------
+# Entrypoint
+# ---------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Profile the import time of a src module.")
+    parser.add_argument("module", nargs="?", default="graph", help="module to import, defaults to graph")
+    parser.add_argument("--top", type=int, default=20, help="slowest imports to list, by cumulative time")
+    args = parser.parse_args()
+
+    ready_s, imports = profile_startup(args.module)
+    for name, self_ms, cumulative_ms in sorted(imports, key=lambda item: item[2], reverse=True)[:args.top]:
+        logger.info(f"{cumulative_ms:9.1f}ms cumulative  {self_ms:8.1f}ms self  {name}")
+    logger.info(f"'{args.module}' ready in {ready_s * 1000:.0f}ms ({len(imports)} modules imported)")
@@ -1,10 +1,27 @@
 from typing import Annotated, Dict, List
 from pydantic import BaseModel, Field
 from typing import Sequence
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, ToolMessage
 from langgraph.graph.message import add_messages
 from typing_extensions import Annotated, TypedDict
 
+from settings import get_settings
+
+def add_messages_window(left, right):
+    """
+    `add_messages` reducer that keeps only the last MESSAGE_WINDOW messages (0 keeps everything),
+    so checkpoints and prompts stay the same size over long sessions.
+    """
+    merged = add_messages(left, right)
+    window = get_settings().message_window
+    if window <= 0 or len(merged) <= window:
+        return merged
+    start = len(merged) - window
+    # never start the window on tool results whose tool call was dropped
+    while start < len(merged) - 1 and isinstance(merged[start], ToolMessage):
+        start += 1
+    return merged[start:]
+
 class Quiz(BaseModel):
     id: str = Field(None, description="Quiz ID")
     topic: str = Field(None, description="Topic to be quized")
@@ -14,6 +31,8 @@ class Quiz(BaseModel):
     explanation: str = Field(None, description="Explanation to be given")
     feedback: str = Field(None, description="Feedback to be given")
     mutliple_choices: List[str] = Field(None, description="Multiple choices for the user the choose from")
+    answer: str = Field(None, description="Letter of the correct choice (A, B, C or D)")
+    difficulty: str = Field(None, description="Difficulty of the question: easy, medium or hard")
 
 class QuizList(BaseModel):
     list_of_quiz: List[Quiz] = Field(None, description="List of quiz to be asked")
@@ -21,7 +40,7 @@ class QuizList(BaseModel):
 # Graph state
 class State(TypedDict):
     # modified by the teacher agent
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+    messages: Annotated[Sequence[BaseMessage], add_messages_window]
     # modified by the quiz agent
     quiz_topics: List[str] # {topic}
     # modified by the readiness agent
@@ -33,4 +52,15 @@ class State(TypedDict):
     user_gave_answer: bool # {True, False}
     question_answer:List[Dict[str,str]] # {question, answer}
     quiz_completed: bool # {True, False}
-    quiz_history: List[Quiz] # {quiz history}
\ No newline at end of file
+    # modified by the student input node, the graded quizzes not yet folded into the summary
+    quiz_history: List[Quiz] # {quiz history}
+    # modified by the quiz agent, the quiz waiting for the student's answer
+    current_quiz: Quiz # {quiz}
+    # modified by the student input node, graded answers per topic
+    quiz_scores: Dict[str, Dict[str, int]] # {topic: {asked, correct, ungraded}}
+    # modified by the quiz agent, pre-generated quizzes for the remaining quiz_topics
+    quiz_queue: List[Quiz] # {prefetched quizzes}
+    # modified by the quiz agent, ids of the question bank quizzes already served in this session
+    quiz_bank_served: List[str] # {quiz ids}
+    # modified by the teacher agent, older turns and finished quizzes folded into a rolling summary
+    conversation_summary: str # {summary}
\ No newline at end of file
@@ -0,0 +1,105 @@
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+from langchain_core.output_parsers import StrOutputParser
+from langgraph.constants import TAG_NOSTREAM
+
+from model import get_runnable
+from prompts import summary_prompt
+from settings import get_settings
+from state import State
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Helpers
+# --------------------------
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token), good enough to enforce a budget."""
+    return len(text) // 4 + 1
+
+def _history_tokens(messages: Sequence[BaseMessage], quiz_history: List) -> int:
+    return sum(estimate_tokens(str(message.content)) for message in messages) + estimate_tokens(str(quiz_history or ""))
+
+def split_turns(messages: Sequence[BaseMessage], keep_turns: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    Split messages into the older part to fold and the last `keep_turns` student turns to keep.
+    The split is always made on a student message, so tool calls stay with their results.
+    """
+    turn_starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    if len(turn_starts) <= keep_turns:
+        return [], list(messages)
+    split = turn_starts[-keep_turns] if keep_turns > 0 else len(messages)
+    return list(messages[:split]), list(messages[split:])
+
+def _render(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(f"{message.name or message.type}: {message.content}" for message in messages if message.content)
+
+def build_summary_chain(model):
+    """Builds the summary chain: folds older turns and quizzes into the rolling summary."""
+    # tagged so the summary tokens are not streamed to the student as teacher output
+    return (summary_prompt | model | StrOutputParser()).with_config(tags=[TAG_NOSTREAM])
+
+# --------------------------
+# Summarisation
+# --------------------------
+def _fold_plan(state: State):
+    messages = state.get("messages", [])
+    quiz_history = state.get("quiz_history", [])
+    settings = get_settings()
+    # estimated prompt tokens of messages + quiz history above which older turns are folded into the summary
+    if _history_tokens(messages, quiz_history) <= settings.summary_token_budget:
+        return None
+    # student turns (a student message and everything answering it) always kept verbatim
+    to_fold, to_keep = split_turns(messages, settings.summary_keep_turns)
+    if not to_fold and not quiz_history:
+        return None
+    inputs = {
+        "conversation_summary": state.get("conversation_summary", ""),
+        "conversation": _render(to_fold),
+        "quiz_history": quiz_history,
+    }
+    return inputs, to_fold, to_keep
+
+def _fold_update(summary: str, to_fold: List[BaseMessage], to_keep: List[BaseMessage], quiz_history: List) -> Dict:
+    logger.info(f"Folded {len(to_fold)} messages and {len(quiz_history or [])} quizzes into the conversation summary")
+    return {
+        "conversation_summary": summary,
+        "quiz_history": [],
+        # removals applied to State.messages together with the teacher's reply
+        "removed_messages": [RemoveMessage(id=message.id) for message in to_fold],
+        "messages": to_keep,
+    }
+
+def summarize_history(state: State) -> Dict:
+    """
+    Keeps the teacher prompt bounded: once the estimated size of messages and quiz history exceeds
+    SUMMARY_TOKEN_BUDGET, the turns before the last SUMMARY_KEEP_TURNS and the finished quizzes
+    are folded into `conversation_summary`.
+
+    Args:
+        state (State): The current state.
+
+    Returns:
+        dict: Empty when nothing was folded, otherwise the new summary, the messages kept verbatim
+              ("messages"), the `RemoveMessage`s for the folded ones ("removed_messages") and the
+              cleared quiz history.
+    """
+    plan = _fold_plan(state)
+    if plan is None:
+        return {}
+    inputs, to_fold, to_keep = plan
+    summary = get_runnable("summary", build_summary_chain).invoke(inputs)
+    return _fold_update(summary, to_fold, to_keep, inputs["quiz_history"])
+
+async def asummarize_history(state: State) -> Dict:
+    """
+    Async version of `summarize_history`.
+    """
+    plan = _fold_plan(state)
+    if plan is None:
+        return {}
+    inputs, to_fold, to_keep = plan
+    summary = await get_runnable("summary", build_summary_chain).ainvoke(inputs)
+    return _fold_update(summary, to_fold, to_keep, inputs["quiz_history"])
@@ -0,0 +1,136 @@
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.prebuilt.tool_node import msg_content_output
+
+from search_cache import normalize_query
+from settings import get_settings
+from state import State
+from tracing import current_span, span
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Pending Tool Calls
+# --------------------------
+def pending_tool_calls(messages: Sequence[BaseMessage]) -> List[Dict]:
+    """Tool calls of the last AI message that are not answered by a `ToolMessage` yet."""
+    position = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], AIMessage)), None)
+    if position is None:
+        return []
+    answered = {m.tool_call_id for m in messages[position + 1:] if isinstance(m, ToolMessage)}
+    return [call for call in messages[position].tool_calls if call["id"] not in answered]
+
+# --------------------------
+# Parallel Tool Node
+# --------------------------
+class ParallelToolNode:
+    """
+    Runs every tool call of the last AI message in one step: identical calls (same tool, same
+    arguments, queries normalised) are executed once, and the distinct ones run concurrently, at most
+    `max_concurrency` at a time (TOOL_CONCURRENCY when unset). A step therefore takes as long as its
+    slowest call, not the sum.
+    Each tool call still gets its own `ToolMessage`, in the order the model emitted them.
+    """
+
+    def __init__(self, tools: Sequence[BaseTool], max_concurrency: Optional[int] = None):
+        self.tools = {tool.name: tool for tool in tools}
+        self._max_concurrency = max_concurrency
+
+    @property
+    def max_concurrency(self) -> int:
+        # read on each step, as the node is built when the graph module is imported
+        return self._max_concurrency or get_settings().tool_concurrency
+
+    def invoke(self, state: State) -> Dict:
+        start = time.perf_counter()
+        tool_calls, unique = self._plan(state)
+        # each call runs in a copy of this context, so its spans nest under the tool node's
+        contexts = [contextvars.copy_context() for _ in unique]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(unique)))) as executor:
+            outputs = dict(zip(unique, executor.map(lambda context, call: context.run(self._run, call), contexts, unique.values())))
+        return self._update(tool_calls, unique, outputs, start)
+
+    async def ainvoke(self, state: State) -> Dict:
+        start = time.perf_counter()
+        tool_calls, unique = self._plan(state)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(call: Dict) -> Tuple[Any, str]:
+            async with semaphore:
+                return await self._arun(call)
+
+        results = await asyncio.gather(*(run(call) for call in unique.values()))
+        return self._update(tool_calls, unique, dict(zip(unique, results)), start)
+
+    def _plan(self, state: State) -> Tuple[List[Dict], Dict[str, Dict]]:
+        # calls already answered (e.g. applied directly by the agent) are not run again
+        tool_calls = pending_tool_calls(state["messages"])
+        unique: Dict[str, Dict] = {}
+        for call in tool_calls:
+            unique.setdefault(_call_key(call), call)
+        return tool_calls, unique
+
+    def _run(self, call: Dict) -> Tuple[Any, str]:
+        if call["name"] not in self.tools:
+            return _unknown_tool_content(call, self.tools), "error"
+        with span(f"tool {call['name']}") as current:
+            try:
+                return self.tools[call["name"]].invoke(call["args"]), "success"
+            except Exception as e:
+                logger.exception(f"Tool '{call['name']}' failed")
+                current.set("tool.error", repr(e))
+                return _error_content(e), "error"
+
+    async def _arun(self, call: Dict) -> Tuple[Any, str]:
+        if call["name"] not in self.tools:
+            return _unknown_tool_content(call, self.tools), "error"
+        with span(f"tool {call['name']}") as current:
+            try:
+                return await self.tools[call["name"]].ainvoke(call["args"]), "success"
+            except Exception as e:
+                logger.exception(f"Tool '{call['name']}' failed")
+                current.set("tool.error", repr(e))
+                return _error_content(e), "error"
+
+    def _update(self, tool_calls: List[Dict], unique: Dict[str, Dict], outputs: Dict[str, Tuple[Any, str]], start: float) -> Dict:
+        messages = []
+        for call in tool_calls:
+            output, status = outputs[_call_key(call)]
+            messages.append(ToolMessage(
+                content=msg_content_output(output),
+                name=call["name"],
+                tool_call_id=call["id"],
+                status=status,
+            ))
+        logger.info(
+            f"Ran {len(unique)} distinct of {len(tool_calls)} tool calls in {time.perf_counter() - start:.2f}s"
+        )
+        current_span().set("tool.calls", len(tool_calls))
+        current_span().set("tool.distinct_calls", len(unique))
+        return {"messages": messages}
+
+
+# arguments compared like search queries, so trivial variants run once; the others (e.g. the
+# case-sensitive chunk ids of read_course_chunk_tool) are compared verbatim
+_NORMALIZED_ARGUMENTS = frozenset({"query"})
+
+def _call_key(call: Dict) -> str:
+    args = {
+        name: normalize_query(value) if name in _NORMALIZED_ARGUMENTS and isinstance(value, str) else value
+        for name, value in call["args"].items()
+    }
+    return json.dumps([call["name"], args], sort_keys=True, default=str)
+
+def _unknown_tool_content(call: Dict, tools: Dict[str, BaseTool]) -> str:
+    return f"Error: {call['name']} is not a valid tool, try one of [{', '.join(tools)}]."
+
+def _error_content(error: Exception) -> str:
+    return f"Error: {error!r}\n Please fix your mistakes."
@@ -1,17 +1,65 @@
-from typing import List
-from azure_ai_search import search_documents
-from langchain_core.tools import tool
+import asyncio
+import threading
+from typing import List, Optional
+from azure_ai_search import read_chunk, search_documents, get_embedding
+from langchain_core.tools import StructuredTool, tool
 from pydantic import BaseModel, Field
+from search_cache import SearchCache
+from settings import get_settings
 from state import Quiz
+from tracing import span
 
-@tool
-def search_course_documents_tool(query:str):
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache() -> SearchCache:
+    """
+    Return the process-wide search cache, building it on first use: repeated topics are served from memory,
+    and setting SEARCH_CACHE_SEMANTIC_THRESHOLD enables the semantic layer.
+    """
+    global _search_cache
+    if _search_cache is None:
+        settings = get_settings()
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache(
+                    max_size=settings.search_cache_size,
+                    ttl_seconds=settings.search_cache_ttl,
+                    semantic_threshold=settings.search_cache_semantic_threshold,
+                    embed=get_embedding,
+                )
+    return _search_cache
+
+def search_course_documents(query:str):
     """
     Gets Informations from courses content. and it is used by the teacher agent to search for course documents for the quiz preparation.
     """
-    output = search_documents(query)
+    with span("search_course_documents", **{"search.query_chars": len(query)}) as current:
+        missed = []
+        # the search function only runs on a cache miss
+        output = get_search_cache().get_or_search(query, lambda q: missed.append(q) or search_documents(q))
+        current.set("cache.hit", not missed)
+        current.set("search.results", len(output))
     return output
 
+async def asearch_course_documents(query:str):
+    # the blocking search client runs in a worker thread, so the searches of one step overlap
+    return await asyncio.to_thread(search_course_documents, query)
+
+search_course_documents_tool = StructuredTool.from_function(
+    func=search_course_documents,
+    coroutine=asearch_course_documents,
+    name="search_course_documents_tool",
+)
+
+@tool
+def read_course_chunk_tool(chunk_id: str, neighbours: int = 0):
+    """
+    Reads the full text of a course chunk found by search_course_documents_tool (pass the hit's "id"),
+    with `neighbours` chunks before and after it when more context is needed.
+    """
+    return read_chunk(chunk_id, neighbours)
+
 class quiz_preparation_tool(BaseModel):
     """
     Gives the topics and points that quiz should cover.
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import atexit
+import random
+import asyncio
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langgraph.errors import GraphBubbleUp
+
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# Spans
+# --------------------------
+class Span:
+    """
+    A timed operation with attributes, exported in the shape of an OpenTelemetry (OTLP JSON) span:
+    trace/span/parent ids, start and end times in Unix nanoseconds, attributes and a status.
+    """
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent.span_id if parent is not None else ""
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = "OK"
+        self.status_message = ""
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        # interrupts and commands bubbling out of a node are graph control flow, not failures
+        if isinstance(error, GraphBubbleUp):
+            self.set("graph.interrupted", True)
+            return
+        self.status = "ERROR"
+        self.status_message = repr(error)
+        self.set("exception.type", type(error).__name__)
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        exporter = get_exporter()
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is disabled, so instrumented code needs no checks."""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def enabled() -> bool:
+    """Spans are recorded only when TRACE_PATH names the JSON lines file receiving them."""
+    return bool(get_settings().trace_path)
+
+def current_span() -> Any:
+    """The span of the enclosing block, to add attributes to it; a no-op span when there is none."""
+    return _current_span.get() or _NOOP_SPAN
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Start a span under the current one without making it current; the caller ends it."""
+    if not enabled():
+        return None
+    return Span(name, _current_span.get(), attributes)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """
+    Time the enclosed block as a span, the parent of the spans started inside it.
+    The current span follows the context, so it carries across awaits and `asyncio.to_thread`.
+    """
+    if not enabled():
+        yield _NOOP_SPAN
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+# --------------------------
+# Exporter
+# --------------------------
+class JsonlSpanExporter:
+    """Appends finished spans to a JSON lines file, one span per line."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                # a finished root span (a turn) is flushed, so the file is complete between turns
+                if not span.parent_span_id:
+                    self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+_exporter: Optional[JsonlSpanExporter] = None
+_exporter_lock = threading.Lock()
+
+def get_exporter() -> Optional[JsonlSpanExporter]:
+    """Return the process-wide exporter writing to TRACE_PATH, or None when tracing is disabled."""
+    global _exporter
+    if _exporter is None and enabled():
+        with _exporter_lock:
+            if _exporter is None:
+                path = get_settings().trace_path
+                _exporter = JsonlSpanExporter(path)
+                logger.info(f"Tracing spans to '{path}'")
+    return _exporter
+
+# --------------------------
+# Graph Instrumentation
+# --------------------------
+def traced_node(name: str, node: Callable) -> Callable:
+    """
+    Wrap a graph node (sync or async) in a span recording the size of its input state and of its
+    update: message counts, content characters and the token usage reported by the model.
+    """
+    if asyncio.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_wrapper(state, *args, **kwargs):
+            with span(f"node {name}", **_state_attributes(state)) as current:
+                update = await node(state, *args, **kwargs)
+                _update_attributes(current, update)
+                return update
+        return async_wrapper
+
+    @wraps(node)
+    def wrapper(state, *args, **kwargs):
+        with span(f"node {name}", **_state_attributes(state)) as current:
+            update = node(state, *args, **kwargs)
+            _update_attributes(current, update)
+            return update
+    return wrapper
+
+def _state_attributes(state) -> Dict[str, Any]:
+    if not enabled():
+        return {}
+    messages = state.get("messages", []) if isinstance(state, dict) else []
+    return {
+        "state.messages": len(messages),
+        "state.content_chars": sum(len(str(message.content)) for message in messages),
+    }
+
+def _update_attributes(current, update) -> None:
+    if not enabled() or not isinstance(update, dict):
+        return
+    messages = update.get("messages", [])
+    messages = messages if isinstance(messages, list) else [messages]
+    current.set("update.messages", len(messages))
+    current.set("update.content_chars", sum(len(str(getattr(message, "content", ""))) for message in messages))
+    usage = [m.usage_metadata for m in messages if isinstance(m, AIMessage) and m.usage_metadata]
+    if usage:
+        current.set("llm.input_tokens", sum(u.get("input_tokens", 0) for u in usage))
+        current.set("llm.output_tokens", sum(u.get("output_tokens", 0) for u in usage))
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records every chat model call of a turn as a span under the node that made it,
+    with the prompt size, the token usage and the number of tool calls in the reply.
+    """
+    # run on the caller's context, so the node span is the current span
+    run_inline = True
+
+    def __init__(self):
+        self._spans: Dict[Any, Span] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        current = start_span(
+            "llm",
+            **{
+                "llm.node": (metadata or {}).get("langgraph_node"),
+                "llm.prompt_messages": sum(len(batch) for batch in messages),
+                "llm.prompt_chars": sum(len(str(message.content)) for batch in messages for message in batch),
+            },
+        )
+        if current is not None:
+            self._spans[run_id] = current
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        current = self._spans.pop(run_id, None)
+        if current is None:
+            return
+        message = getattr(response.generations[0][0], "message", None) if response.generations and response.generations[0] else None
+        usage = getattr(message, "usage_metadata", None) or {}
+        current.set("llm.input_tokens", usage.get("input_tokens", 0))
+        current.set("llm.output_tokens", usage.get("output_tokens", 0))
+        current.set("llm.tool_calls", len(getattr(message, "tool_calls", None) or []))
+        current.set("llm.cache_hit", bool(message is not None and message.response_metadata.get("cache_hit")))
+        current.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        current = self._spans.pop(run_id, None)
+        if current is not None:
+            current.record_error(error)
+            current.end()
+
+def tracing_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks to add to a turn's config: the model call tracer when tracing is enabled."""
+    return [TracingCallbackHandler()] if enabled() else []
+
+# --------------------------
+# Turns and Profiling
+# --------------------------
+# cProfile can only profile one turn of a thread at a time
+_profile_lock = threading.Lock()
+
+@contextmanager
+def trace_turn(thread_id: Any) -> Iterator[Any]:
+    """
+    Root span of one graph turn. With TRACE_PROFILE_DIR set, the turn is also profiled with cProfile
+    and dumped to `turn-<thread_id>-<time>.prof`. Turns overlapping a profiled one on the same event
+    loop show up in its profile, and are not profiled themselves.
+    """
+    profile_dir = get_settings().trace_profile_dir
+    with span("turn", **{"session.thread_id": str(thread_id)}) as current:
+        if not profile_dir or not _profile_lock.acquire(blocking=False):
+            yield current
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield current
+            finally:
+                profile.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(profile_dir, f"turn-{thread_id}-{time.time_ns()}.prof"))
+        finally:
+            _profile_lock.release()
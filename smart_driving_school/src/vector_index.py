@@ -0,0 +1,139 @@
+import os
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from settings import get_settings, load_environment
+
+logger = logging.getLogger(__name__)
+
+# --------------------------
+# In-process Vector Index
+# --------------------------
+class LocalVectorIndex:
+    """
+    Exact cosine-similarity index over chunk embeddings held in a NumPy matrix, built by this module's
+    entrypoint and loaded from VECTOR_INDEX_PATH. It stands in for the Azure vector field so retrieval
+    can be tuned and benchmarked offline.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self._matrix = np.zeros((0, dimensions), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: Sequence[str], vectors: Sequence[Sequence[float]], contents: Optional[Sequence[str]] = None) -> None:
+        """
+        Add chunk embeddings to the index.
+        :param ids: Chunk ids, aligned with vectors
+        :param vectors: Embeddings, one row per chunk
+        :param contents: Optional chunk texts returned with the hits
+        """
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        if len(ids) != matrix.shape[0]:
+            raise ValueError("ids and vectors must have the same length.")
+        self.ids.extend(ids)
+        self.contents.extend(contents if contents is not None else [""] * len(ids))
+        self._matrix = np.vstack([self._matrix, _normalize(matrix)])
+
+    def search(self, query_vector: Sequence[float], top: int = 5) -> List[Dict]:
+        """
+        Return the top chunks by cosine similarity.
+        :param query_vector: The query embedding
+        :param top: Number of hits to return
+        """
+        if not self.ids:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        scores = self._matrix @ query
+        top = min(top, len(scores))
+        # argpartition keeps this O(n) instead of a full sort over the corpus
+        candidates = np.argpartition(-scores, top - 1)[:top]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [
+            {"id": self.ids[i], "score": float(scores[i]), "content": self.contents[i]}
+            for i in ranked
+        ]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path,
+            matrix=self._matrix,
+            ids=np.asarray(self.ids, dtype=object),
+            contents=np.asarray(self.contents, dtype=object),
+        )
+        logger.info(f"Saved vector index with {len(self)} chunks to '{path}'")
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        data = np.load(path, allow_pickle=True)
+        matrix = data["matrix"]
+        index = cls(matrix.shape[1])
+        index.ids = data["ids"].tolist()
+        index.contents = data["contents"].tolist()
+        index._matrix = matrix.astype(np.float32, copy=False)
+        return index
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict], embed: Callable[[List[str]], List[List[float]]]) -> "LocalVectorIndex":
+        """
+        Build an index from index-ready documents (dicts with "id" and "content").
+        :param embed: Batch embedding function, normally `get_embeddings_client().embed_documents`
+        """
+        documents = list(documents)
+        texts = [doc.get("content", "") for doc in documents]
+        vectors = np.asarray(embed(texts), dtype=np.float32)
+        index = cls(vectors.shape[1])
+        index.add([doc["id"] for doc in documents], vectors, texts)
+        return index
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# --------------------------
+# Result Fusion
+# --------------------------
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Dict]], k: int = 60, top: int = 5) -> List[Dict]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion: score = sum(1 / (k + rank)).
+    :param result_lists: Ranked hit lists, each hit a dict with at least an "id"
+    :param k: Damping constant, 60 is the value from the original RRF paper
+    :param top: Number of fused hits to return
+    """
+    fused: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+            if not entry.get("content") and hit.get("content"):
+                entry["content"] = hit["content"]
+    ranked = sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)
+    return ranked[:top]
+
+# --------------------------
+# Entrypoint
+# --------------------------
+
+if __name__ == "__main__":
+    import json
+
+    load_environment()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    from azure_ai_search import get_embeddings_client
+
+    settings = get_settings()
+    output_path = settings.vector_index_path or os.path.join(settings.local_index_dir, "vectors.npz")
+    with open(settings.local_documents_path, encoding="utf-8") as f:
+        documents = [json.loads(line) for line in f if line.strip()]
+    LocalVectorIndex.from_documents(documents, get_embeddings_client().embed_documents).save(output_path)
+    if not settings.vector_index_path:
+        logger.info(f"Set VECTOR_INDEX_PATH=\"{output_path}\" to use it for vector and hybrid search")
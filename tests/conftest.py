@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# the src modules import each other flat, as when run from smart_driving_school/src
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("smart_driving_school/src", "smart_driving_school/src/context"):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings(monkeypatch):
+    """Each test reads the settings from its own environment, never from a developer's .env."""
+    import settings
+
+    monkeypatch.setattr(settings, "_settings", None)
+    monkeypatch.setattr(settings, "_environment_loaded", True)
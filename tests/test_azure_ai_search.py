@@ -0,0 +1,58 @@
+import pytest
+
+import azure_ai_search
+from settings import configure
+from vector_index import LocalVectorIndex
+
+
+class FakeSearchClient:
+    def __init__(self, hits):
+        self.hits = hits
+        self.requests = []
+
+    def search(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.hits
+
+
+@pytest.fixture
+def local_vectors(monkeypatch):
+    index = LocalVectorIndex(dimensions=2)
+    index.add(["local-0000"], [[1.0, 0.0]])
+    monkeypatch.setattr(azure_ai_search, "_vector_index", index)
+    monkeypatch.setattr(azure_ai_search, "_missing_vectors_warned", False)
+    return index
+
+
+def test_local_backend_searches_the_local_vector_index(local_vectors):
+    configure(search_backend="local", vector_index_path="vectors.npz")
+    assert [hit["id"] for hit in azure_ai_search._vector_search([1.0, 0.0], top=5)] == ["local-0000"]
+
+
+def test_azure_backend_never_uses_the_local_vector_index(local_vectors, monkeypatch):
+    configure(search_backend="azure", vector_index_path="vectors.npz", search_vector_field="contentVector")
+    client = FakeSearchClient([{"id": "azure-0000", "@search.score": 0.9, "content": "chunk"}])
+    monkeypatch.setattr(azure_ai_search, "get_search_client", lambda index_name=None: client)
+    hits = azure_ai_search._vector_search([1.0, 0.0], top=5)
+    assert [hit["id"] for hit in hits] == ["azure-0000"]
+    [query] = client.requests[0]["vector_queries"]
+    assert (query.fields, query.k_nearest_neighbors) == ("contentVector", 5)
+
+
+def test_chunks_read_from_the_service_are_capped(monkeypatch):
+    configure(search_backend="azure", chunk_store_dir="", chunk_size=100)
+    document = {"content": "word " * 1000}
+
+    class Client:
+        def get_document(self, key, selected_fields):
+            return document
+
+    monkeypatch.setattr(azure_ai_search, "_chunk_store", None)
+    monkeypatch.setattr(azure_ai_search, "get_search_client", lambda index_name=None: Client())
+    [chunk] = azure_ai_search.read_chunk("doc-1")
+    assert chunk["id"] == "doc-1"
+    assert len(chunk["content"]) == 100
+    assert "Truncated to the first 100 of 5000 characters" in chunk["note"]
+
+    document["content"] = "a short chunk"
+    assert azure_ai_search.read_chunk("doc-1") == [{"id": "doc-1", "content": "a short chunk"}]
@@ -0,0 +1,84 @@
+import math
+import os
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+DOCUMENTS = [
+    {
+        "id": "rules-0000",
+        "content": "Drivers must keep to the speed limit in built-up areas.",
+        "keyPhrases": ["speed limit"],
+        "topic": "speed",
+        "metadata_storage_name": "rules.pdf",
+    },
+    {
+        "id": "rules-0001",
+        "content": "Alcohol slows reactions; never drink and drive. Alcohol limits differ by country.",
+        "keyPhrases": ["alcohol"],
+        "topic": "alcohol",
+        "metadata_storage_name": "rules.pdf",
+    },
+    {
+        "id": "signs-0000",
+        "content": "Circular signs give orders, triangular signs give warnings about the road ahead.",
+        "keyPhrases": ["road signs"],
+        "topic": "signs",
+        "metadata_storage_name": "signs.pdf",
+    },
+]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("The drivers and their Penalties") == ["driver", "penalty"]
+
+
+def test_ranks_matching_chunks_with_their_source():
+    hits = BM25Index.from_documents(DOCUMENTS).search("alcohol limits", top=2)
+    assert hits[0]["id"] == "rules-0001"
+    assert hits[0]["metadata_storage_name"] == "rules.pdf"
+    assert hits[0]["content"] == DOCUMENTS[1]["content"]
+    assert all(hit["score"] > 0 for hit in hits)
+
+
+def test_scores_follow_bm25():
+    index = BM25Index.from_documents(DOCUMENTS, k1=1.2, b=0.0, keyphrase_boost=0.0)
+    # with b=0 the length normalisation is k1, so a single occurrence scores exactly the idf
+    idf = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    assert index.search("circular")[0]["score"] == pytest.approx(idf, rel=1e-5)
+
+
+def test_keyphrase_boost_breaks_ties():
+    documents = [
+        {"id": "a", "content": "parking rules", "keyPhrases": []},
+        {"id": "b", "content": "parking rules", "keyPhrases": ["parking"]},
+    ]
+    assert [hit["id"] for hit in BM25Index.from_documents(documents).search("parking")] == ["b", "a"]
+    first, second = BM25Index.from_documents(documents, keyphrase_boost=0.0).search("parking")
+    assert first["score"] == pytest.approx(second["score"])
+
+
+def test_filters():
+    index = BM25Index.from_documents(DOCUMENTS)
+    assert [hit["id"] for hit in index.search("signs road speed", filters={"metadata_storage_name": "signs.pdf"})] == ["signs-0000"]
+    assert index.search("alcohol", filters={"topic": ["speed", "signs"]}) == []
+    assert index.matches("rules-0001", {"topic": "alcohol"})
+    with pytest.raises(ValueError):
+        index.search("alcohol", filters={"content": "x"})
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.from_documents(DOCUMENTS, k1=1.5, b=0.5)
+    path = os.path.join(tmp_path, "bm25.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert (loaded.k1, loaded.b) == (1.5, 0.5)
+    assert loaded.search("drink driving") == index.search("drink driving")
+    assert loaded.get("signs-0000") == DOCUMENTS[2]["content"]
+    assert "missing" not in loaded
+
+
+def test_no_match_and_empty_index():
+    assert BM25Index.from_documents(DOCUMENTS).search("helicopter") == []
+    assert BM25Index().search("alcohol") == []
@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+import operator
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from checkpointer import CompressedSerializer, PrunedSqliteSaver, open_async_checkpointer, open_checkpointer
+
+
+class State(TypedDict):
+    notes: Annotated[List[str], operator.add]
+
+
+def _graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("write", lambda state: {"notes": [f"note {len(state['notes'])}"]})
+    builder.add_edge(START, "write")
+    builder.add_edge("write", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _counts(path, thread_id):
+    with sqlite3.connect(path) as conn:
+        checkpoints = conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+        orphan_writes = conn.execute(
+            "SELECT COUNT(*) FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN "
+            "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)", (thread_id, thread_id),
+        ).fetchone()[0]
+    return checkpoints, orphan_writes
+
+
+def test_large_payloads_are_compressed():
+    serde = CompressedSerializer(min_bytes=100)
+    small, large = {"notes": ["hi"]}, {"notes": ["speed limits " * 50]}
+    small_type, _ = serde.dumps_typed(small)
+    large_type, large_payload = serde.dumps_typed(large)
+    assert not small_type.endswith("+zlib")
+    assert large_type.endswith("+zlib")
+    assert len(large_payload) < len("speed limits " * 50)
+    assert serde.loads_typed(serde.dumps_typed(small)) == small
+    assert serde.loads_typed((large_type, large_payload)) == large
+
+
+def test_uncompressed_checkpoints_still_load():
+    # payloads written before compression was enabled carry the plain type
+    assert CompressedSerializer(min_bytes=0).loads_typed(CompressedSerializer(min_bytes=10 ** 9).dumps_typed([1, 2])) == [1, 2]
+
+
+def test_only_the_last_checkpoints_are_kept(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    graph = _graph(open_checkpointer(path, keep_last=2))
+    for turn in range(4):
+        graph.invoke({"notes": []}, {"configurable": {"thread_id": "student"}})
+        graph.invoke({"notes": []}, {"configurable": {"thread_id": "other student"}})
+    assert _counts(path, "student") == (2, 0)
+    assert _counts(path, "other student") == (2, 0)
+    # the newest state survives the pruning
+    state = graph.get_state({"configurable": {"thread_id": "student"}})
+    assert state.values["notes"] == [f"note {n}" for n in range(4)]
+
+
+def test_keep_last_zero_keeps_everything(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    graph = _graph(PrunedSqliteSaver(sqlite3.connect(path, check_same_thread=False), keep_last=0))
+    for turn in range(3):
+        graph.invoke({"notes": []}, {"configurable": {"thread_id": "student"}})
+    assert _counts(path, "student")[0] > 2
+
+
+def test_async_saver_keeps_only_the_last_checkpoints(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+
+    async def run():
+        async with open_async_checkpointer(path, keep_last=2) as checkpointer:
+            graph = _graph(checkpointer)
+            for turn in range(4):
+                await graph.ainvoke({"notes": []}, {"configurable": {"thread_id": "student"}})
+            return (await graph.aget_state({"configurable": {"thread_id": "student"}})).values
+
+    assert asyncio.run(run())["notes"] == [f"note {n}" for n in range(4)]
+    assert _counts(path, "student") == (2, 0)
@@ -0,0 +1,70 @@
+import os
+import multiprocessing
+
+import pytest
+
+from chunk_store import ChunkStore
+
+
+def _append_many(directory, worker, count):
+    store = ChunkStore(directory)
+    for n in range(count):
+        store.append([{"id": f"w{worker}-{n:04d}", "content": f"worker {worker} chunk {n} " * (n % 5 + 1)}])
+
+
+def test_append_and_read(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    assert store.append([{"id": "doc-0000", "content": "first"}, {"id": "doc-0001", "content": "sécond"}]) == 2
+    assert store.append([{"id": "doc-0000", "content": "first"}]) == 0
+    assert store.get("doc-0001") == "sécond"
+    assert [chunk["id"] for chunk in store.neighbours("doc-0000", 1)] == ["doc-0000", "doc-0001"]
+    assert ChunkStore(str(tmp_path)).get("doc-0000") == "first"
+
+
+def test_orphan_data_bytes_are_skipped(tmp_path):
+    ChunkStore(str(tmp_path)).append([{"id": "a", "content": "alpha"}])
+    # a crash after the data write, before the offsets and ids
+    with open(tmp_path / "chunks.bin", "ab") as f:
+        f.write(b"orphan bytes")
+    store = ChunkStore(str(tmp_path))
+    store.append([{"id": "b", "content": "beta"}])
+    assert ChunkStore(str(tmp_path)).get("b") == "beta"
+    assert store.get("a") == "alpha"
+
+
+def test_offsets_without_ids_are_dropped(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append([{"id": "a", "content": "alpha"}])
+    # a crash after the offsets write, before the ids
+    with open(tmp_path / "chunks.idx", "ab") as f:
+        f.write(b"\0" * 16)
+    with open(tmp_path / "ids.txt", "ab") as f:
+        f.write(b"partial-id")
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 1
+    store.append([{"id": "b", "content": "beta"}])
+    reopened = ChunkStore(str(tmp_path))
+    assert (reopened.get("a"), reopened.get("b")) == ("alpha", "beta")
+    assert os.path.getsize(tmp_path / "chunks.idx") == 2 * 16
+
+
+def test_read_only_store_sees_later_appends(tmp_path):
+    reader = ChunkStore(str(tmp_path), read_only=True)
+    with pytest.raises(ValueError):
+        reader.append([{"id": "a", "content": "alpha"}])
+    ChunkStore(str(tmp_path)).append([{"id": "a", "content": "alpha"}])
+    assert reader.get("a") == "alpha"
+
+
+def test_concurrent_writer_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_many, args=(str(tmp_path), worker, 40)) for worker in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    store = ChunkStore(str(tmp_path))
+    assert len(store) == 120
+    for worker in range(3):
+        for n in range(40):
+            assert store.get(f"w{worker}-{n:04d}") == f"worker {worker} chunk {n} " * (n % 5 + 1)
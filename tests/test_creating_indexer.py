@@ -0,0 +1,17 @@
+import os
+import sys
+import subprocess
+
+from conftest import ROOT
+
+CONTEXT_DIR = os.path.join(ROOT, "smart_driving_school", "src", "context")
+
+
+def test_imports_on_its_own_without_credentials(tmp_path):
+    # a fresh interpreter with only the script's directory on the path, as when run as a script,
+    # and no .env or Azure variables to read
+    environ = {key: value for key, value in os.environ.items() if not key.startswith(("SEARCH_", "AZURE_"))}
+    environ["PYTHONPATH"] = CONTEXT_DIR
+    code = "import creating_indexer, settings; assert settings._settings is None"
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=environ, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,125 @@
+import asyncio
+from typing import List
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from pydantic import Field
+
+import ds_agents
+from ds_agents import agenerate_quizzes, fill_quiz_queue, generate_quizzes, handle_teacher_response, quiz_agent
+from load_test import ScriptedChatModel
+from model import set_model_override
+from settings import configure
+from state import Quiz
+
+
+class CountingModel(ScriptedChatModel):
+    """The scripted model, recording the structured output (tool) each call asked for."""
+
+    calls: List[str] = Field(default_factory=list)
+
+    def _respond(self, messages, tools):
+        self.calls.append(",".join(tool["function"]["name"] for tool in tools))
+        return super()._respond(messages, tools)
+
+
+@pytest.fixture
+def scripted_model():
+    model = CountingModel(latency=0)
+    set_model_override(model)
+    yield model
+    set_model_override(None)
+
+
+def _call(name, args, call_id):
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+def _prepare(topics):
+    return AIMessage(content="", tool_calls=[{
+        "name": "quiz_preparation_tool",
+        "args": {"quiz_covered_topics": topics, "theory_study_material": "material"},
+        "id": "call-1",
+        "type": "tool_call",
+    }])
+
+
+def test_new_quiz_discards_an_abandoned_one(monkeypatch):
+    stale = Quiz(id="old-2", topic="parking", question="Old question?", mutliple_choices=["A. x", "B. y", "C. z", "D. w"], answer="A")
+    abandoned = {
+        "messages": [],
+        "quiz_topics": ["parking"],
+        "quiz_queue": [stale],
+        "current_quiz": stale.model_copy(update={"id": "old-1"}),
+        "quiz_completed": True,
+    }
+    update = handle_teacher_response(_prepare(["speed limits"]))
+    assert update["quiz_queue"] == [] and update["current_quiz"] is None
+    assert update["quiz_completed"] is False
+
+    fresh = Quiz(id="new-1", topic="speed limits", question="New question?", mutliple_choices=["A. x", "B. y", "C. z", "D. w"], answer="B")
+    monkeypatch.setattr(ds_agents, "draw_quizzes", lambda topics, served: [None] * len(topics))
+    monkeypatch.setattr(ds_agents, "generate_quizzes", lambda topics, material: [fresh for _ in topics])
+    served = quiz_agent({**abandoned, **update, "messages": update["messages"]})
+    assert served["current_quiz"].id == "new-1"
+    assert "New question?" in served["messages"].content
+
+
+@pytest.mark.parametrize("mode, calls", [("batch", ["Quiz"] * 3), ("list", ["QuizList"]), ("off", ["Quiz"])])
+def test_prefetch_modes(scripted_model, mode, calls):
+    configure(quiz_prefetch_mode=mode)
+    topics = ["parking", "speed limits", "roundabouts"]
+    quizzes = generate_quizzes(topics, "material")
+    assert scripted_model.calls == calls
+    # one quiz per topic in topic order, or only the next topic's quiz when prefetching is off
+    assert [quiz.topic for quiz in quizzes] == (topics[:1] if mode == "off" else topics)
+
+
+@pytest.mark.parametrize("mode", ["batch", "list", "off"])
+def test_async_prefetch_matches_the_sync_one(scripted_model, mode):
+    configure(quiz_prefetch_mode=mode)
+    topics = ["parking", "speed limits"]
+    quizzes = asyncio.run(agenerate_quizzes(topics, "material"))
+    assert [quiz.topic for quiz in quizzes] == (topics[:1] if mode == "off" else topics)
+
+
+def test_fill_quiz_queue_keeps_topic_order():
+    bank = Quiz(id="bank-1", topic="b")
+    generated = [Quiz(id="gen-a", topic="a"), Quiz(id="gen-c", topic="c")]
+    assert [quiz.id for quiz in fill_quiz_queue([None, bank, None], generated)] == ["gen-a", "bank-1", "gen-c"]
+    # with prefetching off only the first missing topic is generated: the queue stops at the next one
+    assert [quiz.id for quiz in fill_quiz_queue([None, bank, None], generated[:1])] == ["gen-a", "bank-1"]
+
+
+def test_state_tools_are_answered_and_searches_left_pending():
+    response = AIMessage(content="", tool_calls=[
+        _call("search_course_documents_tool", {"query": "parking"}, "search"),
+        _call("read_course_chunk_tool", {"chunk_id": "rules-0001"}, "read"),
+        _call("teacher_understanding_tool", {"clarifying_question": "Which vehicle?"}, "clarify"),
+    ])
+    update = handle_teacher_response(response)
+    assert update["messages"][0] is response
+    answered = [message for message in update["messages"] if isinstance(message, ToolMessage)]
+    # only the state tool is answered, the searches run in the tool node
+    assert [message.tool_call_id for message in answered] == ["clarify"]
+    assert "waiting for the course search" in answered[0].content
+    assert len(update["messages"]) == 2
+    assert "quiz_topics" not in update
+
+
+def test_quiz_preparation_wins_over_a_clarifying_question():
+    response = AIMessage(content="", tool_calls=[
+        _call("teacher_understanding_tool", {"clarifying_question": "Which vehicle?"}, "clarify"),
+        _prepare(["parking"]).tool_calls[0],
+    ])
+    update = handle_teacher_response(response)
+    assert update["quiz_topics"] == ["parking"] and update["is_asking_for_quiz"] is True
+    answered = {message.tool_call_id: message.content for message in update["messages"][1:]}
+    assert answered == {"clarify": "Not asked: the quiz was prepared instead.", "call-1": "Quiz prepared on: parking."}
+
+
+def test_clarifying_question_alone_is_asked():
+    response = AIMessage(content="", tool_calls=[_call("teacher_understanding_tool", {"clarifying_question": "Which vehicle?"}, "clarify")])
+    update = handle_teacher_response(response)
+    assert [type(message) for message in update["messages"]] == [AIMessage, ToolMessage, AIMessage]
+    assert update["messages"][-1].content == "Which vehicle?"
@@ -0,0 +1,76 @@
+import multiprocessing
+
+import numpy as np
+
+from embeddings import EmbeddingCache, EmbeddingService, HashingFakeEmbeddings
+
+
+def _put_many(directory, worker, count):
+    cache = EmbeddingCache(directory)
+    for n in range(count):
+        cache.put_many([f"w{worker}-{n}"], np.full((1, 4), worker * 1000 + n, dtype=np.float32))
+    # the writer's own row numbers must match what the other writers appended meanwhile
+    found = cache.get_many([f"w{worker}-{n}" for n in range(count)])
+    assert all(np.all(found[f"w{worker}-{n}"] == worker * 1000 + n) for n in range(count))
+
+
+def test_service_batches_and_caches(tmp_path):
+    calls = []
+    backend = HashingFakeEmbeddings(dimensions=16)
+
+    def embed(texts):
+        calls.append(list(texts))
+        return backend.embed_documents(texts)
+
+    service = EmbeddingService(embed, "fake", cache=EmbeddingCache(str(tmp_path)), batch_size=2)
+    first = service.embed_array(["a b", "c d", "a b", "e f"])
+    assert sorted(len(batch) for batch in calls) == [1, 2]
+    assert np.allclose(first[0], first[2])
+
+    calls.clear()
+    again = EmbeddingService(embed, "fake", cache=EmbeddingCache(str(tmp_path))).embed_array(["e f", "a b"])
+    assert calls == []
+    assert np.allclose(again, first[[3, 0]])
+
+
+def test_concurrent_writer_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_put_many, args=(str(tmp_path), worker, 30)) for worker in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert [process.exitcode for process in workers] == [0, 0, 0]
+    found = EmbeddingCache(str(tmp_path)).get_many([f"w{worker}-{n}" for worker in range(3) for n in range(30)])
+    assert len(found) == 90
+    for key, vector in found.items():
+        worker, n = key[1:].split("-")
+        assert np.all(vector == int(worker) * 1000 + int(n))
+
+
+def test_rows_of_an_interrupted_write_are_dropped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(["a"], np.ones((1, 4), dtype=np.float32))
+    # a crash after the vectors write, before the keys
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.zeros((1, 4), dtype=np.float32).tobytes())
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(["b"], np.full((1, 4), 2, dtype=np.float32))
+    found = EmbeddingCache(str(tmp_path)).get_many(["a", "b"])
+    assert np.all(found["a"] == 1) and np.all(found["b"] == 2)
+
+
+def test_reader_sees_rows_written_by_another_cache(tmp_path):
+    reader = EmbeddingCache(str(tmp_path))
+    EmbeddingCache(str(tmp_path)).put_many(["a"], np.ones((1, 4), dtype=np.float32))
+    assert np.all(reader.get_many(["a"])["a"] == 1)
+
+
+def test_partial_row_of_a_write_in_progress_is_not_read(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(["a"], np.ones((1, 4), dtype=np.float32))
+    # another process has appended part of a row and not yet its key
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.zeros(2, dtype=np.float32).tobytes())
+    found = EmbeddingCache(str(tmp_path)).get_many(["a"])
+    assert np.all(found["a"] == 1)
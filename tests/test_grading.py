@@ -0,0 +1,52 @@
+import pytest
+
+from grading import format_score_table, grade_answer, parse_choice, update_scores
+from state import Quiz
+
+CHOICES = [
+    "A. 0.08",
+    "B. A blood alcohol limit of 0.05",
+    "C) Zero for learner drivers",
+    "D. Stop the car",
+]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("B", "B"),
+    ("b)", "B"),
+    ("(c)", "C"),
+    ("d.", "D"),
+    ("A", "A"),
+    ("D. Stop the car", "D"),
+    ("the answer is C", "C"),
+    ("The answer is c", "C"),
+    ("answer: (b)", "B"),
+    ("option d)", "D"),
+    ("I think D", "D"),
+    ("it's (B).", "B"),
+    ("A blood alcohol limit of 0.05", "B"),
+    ("a blood alcohol limit of 0.05.", "B"),
+    ("B. A blood alcohol limit of 0.05", "B"),
+    ("zero for learner drivers", "C"),
+    ("the answer is a bit unclear to me", None),
+    ("my choice is a guess", None),
+    ("no idea", None),
+    ("", None),
+])
+def test_parse_choice(reply, expected):
+    assert parse_choice(reply, CHOICES) == expected
+
+
+def test_grade_answer_and_scores():
+    quiz = Quiz(id="q1", topic="alcohol", question="What is the limit?", mutliple_choices=CHOICES, answer="B")
+    correct = grade_answer(quiz, "A blood alcohol limit of 0.05")
+    wrong = grade_answer(quiz, "the answer is a bit unclear to me")
+    assert (correct.feedback, correct.user_answer) == ("correct", "B")
+    assert wrong.feedback == "incorrect"
+    assert grade_answer(quiz.model_copy(update={"answer": None}), "B").feedback == "ungraded"
+
+    scores = update_scores(update_scores(None, correct), wrong)
+    assert scores == {"alcohol": {"asked": 2, "correct": 1, "ungraded": 0}}
+    table = format_score_table(scores, [correct, wrong])
+    assert "alcohol | 1/2 | 50%" in table
+    assert "missed questions:" in table
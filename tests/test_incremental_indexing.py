@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+
+import incremental_indexing
+from incremental_indexing import load_manifest, plan_incremental_update, run_incremental_indexing
+
+PAGES = {
+    "rules.pdf": ["Speed limits apply on every road. " * 60],
+    "signs.pdf": ["Give way signs mean slow down and yield. " * 60],
+}
+
+
+class FakeSearchClient:
+    """Accepts every upload except the chunk ids in `reject`."""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.uploaded = []
+        self.deleted = []
+
+    def _results(self, documents):
+        return [
+            SimpleNamespace(key=document["id"], succeeded=document["id"] not in self.reject, status_code=400 if document["id"] in self.reject else 200)
+            for document in documents
+        ]
+
+    def merge_or_upload_documents(self, documents):
+        self.uploaded.extend(document["id"] for document in documents)
+        return self._results(documents)
+
+    def delete_documents(self, documents):
+        self.deleted.extend(document["id"] for document in documents)
+        return self._results(documents)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for name in PAGES:
+        (directory / name).write_bytes(name.encode("utf-8"))
+    monkeypatch.setattr(
+        incremental_indexing, "extract_documents",
+        lambda paths: {path: PAGES[path.rsplit("/", 1)[-1]] for path in paths},
+    )
+    return directory
+
+
+def test_unchanged_documents_are_skipped(data_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    client = FakeSearchClient()
+    report = run_incremental_indexing(client, str(data_dir), manifest_path=manifest_path)
+    assert sorted(report["added"]) == sorted(PAGES)
+    assert client.uploaded
+
+    plan = plan_incremental_update(str(data_dir), load_manifest(manifest_path))
+    assert plan["uploads"] == [] and plan["deletes"] == []
+    assert sorted(plan["report"]["unchanged"]) == sorted(PAGES)
+
+
+def test_failed_chunks_are_retried_on_the_next_run(data_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    failing = "rules-0001"
+    run_incremental_indexing(FakeSearchClient(reject=[failing]), str(data_dir), manifest_path=manifest_path)
+
+    manifest = load_manifest(manifest_path)
+    assert failing not in manifest["documents"]["rules.pdf"]["chunks"]
+    assert manifest["documents"]["rules.pdf"]["sha256"] is None
+    assert manifest["documents"]["signs.pdf"]["sha256"]
+
+    retry = FakeSearchClient()
+    report = run_incremental_indexing(retry, str(data_dir), manifest_path=manifest_path)
+    assert report["modified"] == ["rules.pdf"]
+    assert retry.uploaded == [failing]
+    assert load_manifest(manifest_path)["documents"]["rules.pdf"]["sha256"]
+
+
+def test_dry_run_leaves_the_manifest_alone(data_dir, tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    client = FakeSearchClient()
+    report = run_incremental_indexing(client, str(data_dir), dry_run=True, manifest_path=str(manifest_path))
+    assert report["chunks_to_upload"] > 0
+    assert client.uploaded == [] and not manifest_path.exists()
+
+
+def test_chunks_recorded_for_another_index_are_pushed_again(data_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    run_incremental_indexing(FakeSearchClient(), str(data_dir), manifest_path=manifest_path)
+
+    moved = FakeSearchClient()
+    report = run_incremental_indexing(moved, str(data_dir), manifest_path=manifest_path, index_name="lessons-chunks")
+    assert sorted(report["added"]) == sorted(PAGES)
+    assert load_manifest(manifest_path)["index"] == "lessons-chunks"
+
+    again = FakeSearchClient()
+    run_incremental_indexing(again, str(data_dir), manifest_path=manifest_path, index_name="lessons-chunks")
+    assert again.uploaded == []
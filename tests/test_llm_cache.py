@@ -0,0 +1,76 @@
+import time
+
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+import llm_cache
+from llm_cache import SqliteResponseCache, get_response_cache
+from settings import configure
+
+LLM_STRING = "gpt-4o-mini temperature=0"
+
+
+def _prompt(text, message_id):
+    # serialized as langchain does before looking the prompt up in the cache
+    return dumps([HumanMessage(content=text, id=message_id)])
+
+
+def _generations(text):
+    return [ChatGeneration(message=AIMessage(content=text, id="run-1"), generation_info={"finish_reason": "stop"})]
+
+
+def test_lookup_returns_the_stored_response(tmp_path):
+    cache = SqliteResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60, max_entries=10)
+    assert cache.lookup(_prompt("Quiz me on parking", "a"), LLM_STRING) is None
+    cache.update(_prompt("Quiz me on parking", "a"), LLM_STRING, _generations("Question 1"))
+    # another session sends the same prompt with other message ids
+    [generation] = cache.lookup(_prompt("Quiz me on parking", "b"), LLM_STRING)
+    assert generation.message.content == "Question 1"
+    assert generation.message.id is None
+    assert generation.message.response_metadata["cache_hit"] is True
+    assert generation.generation_info == {"finish_reason": "stop"}
+    assert cache.lookup(_prompt("Quiz me on parking", "a"), "gpt-4o temperature=0") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_plain_generations_are_not_cached(tmp_path):
+    cache = SqliteResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60, max_entries=10)
+    cache.update(_prompt("Hello", "a"), LLM_STRING, [Generation(text="Hi")])
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = SqliteResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=0.01, max_entries=10)
+    cache.update(_prompt("Speed limits", "a"), LLM_STRING, _generations("50 km/h"))
+    time.sleep(0.02)
+    assert cache.lookup(_prompt("Speed limits", "a"), LLM_STRING) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SqliteResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60, max_entries=2)
+    cache.update(_prompt("first", "a"), LLM_STRING, _generations("1"))
+    time.sleep(0.01)
+    cache.update(_prompt("second", "a"), LLM_STRING, _generations("2"))
+    time.sleep(0.01)
+    assert cache.lookup(_prompt("first", "a"), LLM_STRING) is not None
+    time.sleep(0.01)
+    cache.update(_prompt("third", "a"), LLM_STRING, _generations("3"))
+    assert cache.lookup(_prompt("second", "a"), LLM_STRING) is None
+    assert cache.lookup(_prompt("first", "a"), LLM_STRING) is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SqliteResponseCache(path, ttl_seconds=60, max_entries=10).update(_prompt("Hello", "a"), LLM_STRING, _generations("Hi"))
+    assert SqliteResponseCache(path, ttl_seconds=60, max_entries=10).lookup(_prompt("Hello", "a"), LLM_STRING) is not None
+
+
+def test_only_listed_chains_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_cache", None)
+    configure(llm_cache_chains="quiz, quiz_list", llm_cache_path=str(tmp_path / "cache.sqlite"))
+    assert get_response_cache("teacher") is None
+    assert get_response_cache("quiz") is get_response_cache("quiz_list")
+    assert get_response_cache("quiz").path == str(tmp_path / "cache.sqlite")
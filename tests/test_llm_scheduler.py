@@ -0,0 +1,129 @@
+import time
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from llm_scheduler import INTERACTIVE, LLMScheduler, TokenBucket
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def _scheduler(**kwargs):
+    kwargs = {"requests_per_minute": 0, "tokens_per_minute": 0, "max_retries": 3, "coalesce": True,
+              "retry_base_delay": 0.0, "retry_max_delay": 0.0, **kwargs}
+    return LLMScheduler(**kwargs)
+
+
+def _result(text="ok", total_tokens=None):
+    usage = {"input_tokens": 0, "output_tokens": total_tokens, "total_tokens": total_tokens} if total_tokens else None
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    bucket.take(50)
+    assert bucket.tokens == 10
+    assert bucket.time_until(10) == 0
+    assert bucket.time_until(20) == pytest.approx(10)
+    # a request larger than the bucket waits for a full bucket rather than forever
+    assert bucket.time_until(1000) == pytest.approx(50)
+    bucket.refill(bucket._updated + 5)
+    assert bucket.tokens == pytest.approx(15)
+    bucket.refill(bucket._updated + 3600)
+    assert bucket.tokens == 60
+    bucket.give_back(10)
+    assert bucket.tokens == 60
+
+
+def test_release_returns_unused_tokens():
+    scheduler = _scheduler(tokens_per_minute=1000)
+    scheduler.acquire(INTERACTIVE, 300)
+    scheduler.release(300, 100)
+    assert scheduler._tokens.tokens == pytest.approx(900, abs=1)
+    assert scheduler.metrics()["running"] == 0
+
+
+def test_backoff():
+    scheduler = _scheduler(max_retries=2)
+    assert scheduler.backoff(StatusError(503), 0) == 0
+    assert scheduler.backoff(APIConnectionError(), 1) == 0
+    assert scheduler.backoff(StatusError(503), 2) is None
+    assert scheduler.backoff(StatusError(400), 0) is None
+    assert scheduler.backoff(ValueError("bad prompt"), 0) is None
+    counters = scheduler.metrics()
+    assert (counters["retries"], counters["failures"]) == (2, 3)
+
+
+def test_rate_limit_pauses_every_call():
+    scheduler = _scheduler()
+    assert scheduler.backoff(StatusError(429, retry_after="2"), 0) == 2
+    assert scheduler.metrics()["rate_limited"] == 1
+    # another call queued behind the 429 waits for the Retry-After too
+    ticket = scheduler._enqueue(INTERACTIVE, 10)
+    assert scheduler._try_admit(ticket) == pytest.approx(2, abs=0.1)
+
+
+def test_run_retries_until_success():
+    scheduler = _scheduler()
+    errors = [StatusError(500), StatusError(502)]
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return _result()
+
+    assert scheduler.run(call, INTERACTIVE, 10).generations[0].message.content == "ok"
+    assert scheduler.metrics()["retries"] == 2
+    assert scheduler.metrics()["requests"] == 3
+
+
+def test_run_raises_when_not_retryable():
+    scheduler = _scheduler()
+
+    def call():
+        raise StatusError(401)
+
+    with pytest.raises(StatusError):
+        scheduler.run(call, INTERACTIVE, 10, key="same")
+    # the failed call does not stay in flight for later identical calls
+    assert scheduler.run(lambda: _result(), INTERACTIVE, 10, key="same").generations[0].message.content == "ok"
+
+
+def test_identical_calls_in_flight_are_coalesced():
+    scheduler = _scheduler()
+    started, finish, calls = threading.Event(), threading.Event(), []
+
+    def call():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return _result("shared")
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(scheduler.run(call, INTERACTIVE, 10, key="k")))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(scheduler.run(call, INTERACTIVE, 10, key="k")))
+    follower.start()
+    for _ in range(500):
+        if scheduler.metrics()["coalesced"]:
+            break
+        time.sleep(0.01)
+    finish.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(calls) == 1
+    assert [result.generations[0].message.content for result in results] == ["shared", "shared"]
+    # each caller gets its own copy of the shared result
+    assert results[0] is not results[1]
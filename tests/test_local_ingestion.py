@@ -0,0 +1,31 @@
+import pytest
+
+from local_ingestion import chunk_text, ingest, load_documents
+from settings import configure
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = chunk_text(text, chunk_size=100, overlap=20)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[0].startswith("word0 ") and chunks[-1].endswith("word199")
+
+
+@pytest.mark.parametrize("chunk_size, overlap", [(100, 100), (100, 150), (0, 0), (100, -1)])
+def test_invalid_overlap_is_rejected(chunk_size, overlap):
+    with pytest.raises(ValueError):
+        chunk_text("some text to split", chunk_size=chunk_size, overlap=overlap)
+
+
+def test_chunk_sizes_come_from_the_settings():
+    configure(chunk_size=50, chunk_overlap=10)
+    chunks = chunk_text(" ".join(f"word{i}" for i in range(100)))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 50 for chunk in chunks)
+
+
+def test_ingest_writes_where_the_readers_look(tmp_path):
+    configure(data_dir=str(tmp_path / "empty"), local_documents_path=str(tmp_path / "documents.jsonl"))
+    assert ingest(workers=1) == []
+    assert load_documents() == []
@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+import quiz_bank
+from quiz_bank import QuizBank, draw_quizzes, validate_quiz
+from settings import configure
+from state import Quiz
+
+
+def _quiz(question="What is the speed limit in a built-up area?", topic="Speed limits", difficulty="easy", **changes):
+    fields = {
+        "topic": topic,
+        "question": question,
+        "mutliple_choices": ["A) 30 mph", "B) 40 mph", "C) 50 mph", "D) 60 mph"],
+        "answer": "a",
+        "difficulty": difficulty,
+        **changes,
+    }
+    return Quiz(**fields)
+
+
+@pytest.mark.parametrize("changes, reason", [
+    ({"topic": ""}, "no topic"),
+    ({"question": "  "}, "no question"),
+    ({"mutliple_choices": ["A) 30 mph", "B) 40 mph", "C) 50 mph"]}, "choices are not lettered A to D"),
+    ({"mutliple_choices": ["30 mph", "40 mph", "50 mph", "60 mph"]}, "choices are not lettered A to D"),
+    ({"mutliple_choices": ["A) 30 mph", "B) 30 mph", "A) 30 mph", "D) 60 mph"]}, "choices are not lettered A to D"),
+    ({"answer": "E"}, "answer is not one of the choices"),
+    ({"answer": ""}, "answer is not one of the choices"),
+    ({"difficulty": "expert"}, "unknown difficulty"),
+])
+def test_malformed_quizzes_are_rejected(changes, reason):
+    assert validate_quiz(_quiz(**changes)) == reason
+    bank = QuizBank()
+    assert bank.add(_quiz(**changes)) == reason
+    assert len(bank) == 0
+
+
+def test_add_normalises_and_rejects_duplicate_questions():
+    bank = QuizBank()
+    assert bank.add(_quiz(user_answer="B", feedback="wrong")) is None
+    assert bank.add(_quiz(question="what is the SPEED limit in a built-up area")) == "duplicate question"
+    quiz = bank.draw("speed limit")
+    assert quiz.id.startswith(quiz_bank.BANK_ID_PREFIX)
+    assert (quiz.answer, quiz.user_answer, quiz.feedback) == ("A", None, None)
+
+
+def test_draws_never_repeat_a_served_quiz():
+    bank = QuizBank()
+    for n in range(3):
+        bank.add(_quiz(question=f"Speed limit question number {n}?"))
+    served = set()
+    rng = random.Random(0)
+    for _ in range(3):
+        quiz = bank.draw("Speed limits", exclude=served, rng=rng)
+        assert quiz.id not in served
+        served.add(quiz.id)
+    assert bank.draw("Speed limits", exclude=served) is None
+    assert bank.draw("Parking") is None
+
+
+def test_draw_by_difficulty():
+    bank = QuizBank()
+    bank.add(_quiz(question="An easy speed question?", difficulty="easy"))
+    bank.add(_quiz(question="A hard speed question?", difficulty="hard"))
+    assert bank.draw("Speed limits", difficulty="hard").question == "A hard speed question?"
+    assert bank.draw("Speed limits", difficulty="medium") is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    bank = QuizBank()
+    bank.add(_quiz())
+    bank.add(_quiz(question="Who has priority at a roundabout?", topic="Roundabouts", difficulty="medium"))
+    path = str(tmp_path / "nested" / "bank.json.gz")
+    bank.save(path)
+
+    loaded = QuizBank.load(path)
+    assert len(loaded) == 2
+    assert loaded.topics() == ["Roundabouts", "Speed limits"]
+    assert "roundabout" in loaded
+    assert loaded.draw("Roundabouts") == bank.draw("Roundabouts")
+    # the loaded bank still knows its questions
+    assert loaded.add(_quiz()) == "duplicate question"
+
+
+def test_draw_quizzes(tmp_path, monkeypatch):
+    bank = QuizBank()
+    for n in range(2):
+        bank.add(_quiz(question=f"Speed limit question number {n}?"))
+    path = str(tmp_path / "bank.json.gz")
+    bank.save(path)
+    monkeypatch.setattr(quiz_bank, "_bank", None)
+    monkeypatch.setattr(quiz_bank, "_bank_loaded", False)
+    configure(quiz_bank_path=path, quiz_bank_difficulty="")
+
+    served = {bank.draw("Speed limits").id}
+    first, second, missing = draw_quizzes(["Speed limits", "Speed limits", "Parking"], served)
+    # the one unserved speed quiz is drawn once, then the topic has to be generated live
+    assert first is not None and first.id not in served
+    assert second is None and missing is None
+
+
+def test_no_bank_generates_everything_live(monkeypatch):
+    monkeypatch.setattr(quiz_bank, "_bank", None)
+    monkeypatch.setattr(quiz_bank, "_bank_loaded", False)
+    configure(quiz_bank_path="")
+    assert draw_quizzes(["Speed limits", "Parking"], served=()) == [None, None]
@@ -0,0 +1,38 @@
+import pytest
+
+from retrieval_benchmark import document_key, recall_at_k, reciprocal_rank
+from vector_index import reciprocal_rank_fusion
+
+LOCAL_HITS = [{"id": "guide-to-driving-test-0003"}, {"id": "drinking-and-driving-the-facts-0002"}]
+# the blob indexer keys documents by their base64-encoded storage path
+AZURE_HITS = [
+    {"id": "aHR0cHM6Ly9leGFtcGxlL2d1aWRlLnBkZg2", "metadata_storage_name": "guide-to-driving-test.pdf"},
+    {"id": "aHR0cHM6Ly9leGFtcGxlL2RyaW5raW5nLnBkZg2", "metadata_storage_name": "Drinking and Driving The Facts.pdf"},
+]
+
+
+def test_document_key():
+    assert document_key("Drinking and Driving The Facts.pdf") == "drinking-and-driving-the-facts"
+
+
+@pytest.mark.parametrize("hits", [LOCAL_HITS, AZURE_HITS])
+def test_metrics_match_document_keys(hits):
+    relevant = ["drinking-and-driving-the-facts"]
+    assert recall_at_k(hits, relevant, 1) == 0.0
+    assert recall_at_k(hits, relevant, 2) == 1.0
+    assert reciprocal_rank(hits, relevant) == 0.5
+
+
+def test_chunk_labels_and_misses():
+    assert reciprocal_rank(LOCAL_HITS, ["guide-to-driving-test-0003"]) == 1.0
+    assert reciprocal_rank(LOCAL_HITS, ["guide-to-driving-test-0004"]) == 0.0
+    assert recall_at_k(LOCAL_HITS, [], 5) == 0.0
+
+
+def test_reciprocal_rank_fusion():
+    keyword = [{"id": "a", "content": "alpha"}, {"id": "b", "content": "beta"}]
+    vector = [{"id": "b", "content": ""}, {"id": "c", "content": "gamma"}]
+    fused = reciprocal_rank_fusion([keyword, vector], k=60, top=3)
+    assert [hit["id"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[0]["content"] == "beta"
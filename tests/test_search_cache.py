@@ -0,0 +1,57 @@
+import time
+
+from search_cache import SearchCache, normalize_query
+
+
+def _search(hits):
+    def search(query):
+        hits.append(query)
+        return [{"id": f"chunk-{len(hits)}", "score": 1.0, "content": query}]
+    return search
+
+
+def test_normalize_query():
+    assert normalize_query("  Speed   limits?! ") == "speed limits"
+
+
+def test_exact_hits_are_copies():
+    calls = []
+    cache = SearchCache()
+    first = cache.get_or_search("Speed limits?", _search(calls))
+    first[0]["content"] = "changed by the caller"
+    first.append({"id": "extra"})
+    again = cache.get_or_search("speed limits", _search(calls))
+    assert calls == ["Speed limits?"]
+    assert again == [{"id": "chunk-1", "score": 1.0, "content": "Speed limits?"}]
+    assert cache.stats()["hits"] == 1
+
+
+def test_expired_entries_are_searched_again():
+    calls = []
+    cache = SearchCache(ttl_seconds=0.01)
+    cache.get_or_search("alcohol", _search(calls))
+    time.sleep(0.02)
+    cache.get_or_search("alcohol", _search(calls))
+    assert len(calls) == 2
+
+
+def test_semantic_hit():
+    vectors = {"blood alcohol limit": [1.0, 0.0], "alcohol limit blood": [0.99, 0.1], "parking": [0.0, 1.0]}
+    calls = []
+    cache = SearchCache(semantic_threshold=0.9, embed=lambda text: vectors[text])
+    cache.get_or_search("blood alcohol limit", _search(calls))
+    cache.get_or_search("alcohol limit blood", _search(calls))
+    cache.get_or_search("parking", _search(calls))
+    assert calls == ["blood alcohol limit", "parking"]
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_failing_embedding_is_a_miss():
+    def embed(text):
+        raise ConnectionError("embedding service down")
+
+    calls = []
+    cache = SearchCache(semantic_threshold=0.9, embed=embed)
+    assert cache.get_or_search("alcohol", _search(calls))[0]["id"] == "chunk-1"
+    assert cache.get_or_search("alcohol", _search(calls))[0]["id"] == "chunk-1"
+    assert calls == ["alcohol"]
@@ -0,0 +1,63 @@
+import os
+from dataclasses import fields
+
+import pytest
+
+import settings
+from settings import Settings, configure, get_settings
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    for setting in fields(Settings):
+        monkeypatch.delenv(setting.metadata["env"], raising=False)
+    return monkeypatch
+
+
+def test_defaults(environ):
+    current = get_settings()
+    assert current.search_backend == "azure"
+    assert current.message_window == 0
+    assert current.search_cache_semantic_threshold is None
+    assert current.llm_coalesce is True
+    assert current.chunk_store_dir == os.path.join(".local_index", "chunks")
+
+
+def test_local_paths_follow_local_index_dir(environ):
+    environ.setenv("LOCAL_INDEX_DIR", "/data/index")
+    environ.setenv("LLM_CACHE_PATH", "/tmp/cache.sqlite")
+    current = Settings.from_env()
+    assert current.local_search_index_path == os.path.join("/data/index", "bm25.npz")
+    assert current.quiz_bank_path == os.path.join("/data/index", "quiz_bank.json.gz")
+    assert current.index_manifest_path == os.path.join("/data/index", "manifest.json")
+    assert current.llm_cache_path == "/tmp/cache.sqlite"
+
+
+def test_parsing(environ):
+    environ.setenv("CHUNK_STORE_DIR", "")
+    environ.setenv("SEARCH_CACHE_SEMANTIC_THRESHOLD", "0.92")
+    environ.setenv("VECTOR_INDEX_PATH", "")
+    environ.setenv("LLM_COALESCE", "no")
+    environ.setenv("TOOL_CONCURRENCY", "8")
+    environ.setenv("LLM_CACHE_CHAINS", "quiz, quiz_list,")
+    environ.setenv("INGESTION_WORKERS", "")
+    current = Settings.from_env()
+    # an empty store directory disables the store rather than falling back to the default
+    assert current.chunk_store_dir == ""
+    assert current.search_cache_semantic_threshold == 0.92
+    assert current.vector_index_path is None
+    assert current.llm_coalesce is False
+    assert current.tool_concurrency == 8
+    assert current.cached_chains() == {"quiz", "quiz_list"}
+    assert current.ingestion_workers is None
+
+
+def test_read_once_then_configured(environ):
+    environ.setenv("MESSAGE_WINDOW", "10")
+    assert get_settings().message_window == 10
+    environ.setenv("MESSAGE_WINDOW", "20")
+    assert get_settings().message_window == 10
+    assert configure(message_window=30).message_window == 30
+    assert settings.get_settings().message_window == 30
+    with pytest.raises(ValueError):
+        configure(message_windows=30)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from load_test import ScriptedChatModel
+from model import set_model_override
+from settings import configure
+from summarization import asummarize_history, split_turns, summarize_history
+
+
+def _conversation(turns):
+    """`turns` student turns, each a question, a search with its result and the teacher's answer."""
+    messages = []
+    for n in range(turns):
+        messages += [
+            HumanMessage(content=f"question {n} " + "about road rules " * 20, id=f"human-{n}"),
+            AIMessage(content="", id=f"search-{n}", tool_calls=[{"name": "search_course_documents_tool", "args": {"query": "rules"}, "id": f"call-{n}"}]),
+            ToolMessage(content="course text " * 20, tool_call_id=f"call-{n}", id=f"result-{n}"),
+            AIMessage(content=f"answer {n}", id=f"answer-{n}"),
+        ]
+    return messages
+
+
+@pytest.fixture
+def scripted_model():
+    set_model_override(ScriptedChatModel(latency=0))
+    yield
+    set_model_override(None)
+
+
+def test_split_turns_keeps_whole_turns():
+    messages = _conversation(3)
+    to_fold, to_keep = split_turns(messages, 2)
+    assert to_fold == messages[:4] and to_keep == messages[4:]
+    assert isinstance(to_keep[0], HumanMessage)
+    assert split_turns(messages, 3) == ([], messages)
+    assert split_turns(messages, 0) == (messages, [])
+
+
+def test_under_the_budget_nothing_is_folded(scripted_model):
+    configure(summary_token_budget=100000, summary_keep_turns=1)
+    assert summarize_history({"messages": _conversation(3), "quiz_history": []}) == {}
+
+
+def test_fold_removes_exactly_the_folded_messages(scripted_model):
+    configure(summary_token_budget=100, summary_keep_turns=2)
+    messages = _conversation(4)
+    update = summarize_history({"messages": messages, "quiz_history": [], "conversation_summary": ""})
+
+    assert update["conversation_summary"].startswith("Summary:")
+    assert update["quiz_history"] == []
+    kept = update["messages"]
+    assert isinstance(kept[0], HumanMessage) and kept[0].id == "human-2"
+    removed = [message.id for message in update["removed_messages"]]
+    assert removed == [message.id for message in messages[:8]]
+    # every message is either kept or removed, never both and never lost
+    assert sorted(removed + [message.id for message in kept]) == sorted(message.id for message in messages)
+
+
+def test_async_fold_matches_the_sync_one(scripted_model):
+    configure(summary_token_budget=100, summary_keep_turns=1)
+    state = {"messages": _conversation(3), "quiz_history": [], "conversation_summary": ""}
+    update = asyncio.run(asummarize_history(state))
+    assert [message.id for message in update["removed_messages"]] == [message.id for message in state["messages"][:8]]
+    assert update["messages"][0].id == "human-2"
@@ -0,0 +1,43 @@
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from tool_node import ParallelToolNode, _call_key
+
+calls = []
+
+
+@tool
+def search_tool(query: str):
+    """Search the course."""
+    calls.append(("search", query))
+    return f"results for {query}"
+
+
+@tool
+def read_tool(chunk_id: str):
+    """Read a chunk."""
+    calls.append(("read", chunk_id))
+    return f"text of {chunk_id}"
+
+
+def _call(name, call_id, **args):
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+def test_only_queries_are_normalised():
+    assert _call_key(_call("search_tool", "1", query="Speed limits?")) == _call_key(_call("search_tool", "2", query="speed  limits"))
+    assert _call_key(_call("read_tool", "1", chunk_id="aGVsbG8")) != _call_key(_call("read_tool", "2", chunk_id="AgvSBg8"))
+
+
+def test_identical_calls_run_once():
+    calls.clear()
+    message = AIMessage(content="", tool_calls=[
+        _call("search_tool", "1", query="Speed limits?"),
+        _call("search_tool", "2", query="speed limits"),
+        _call("read_tool", "3", chunk_id="aGVsbG8"),
+        _call("read_tool", "4", chunk_id="AGVSBG8"),
+    ])
+    update = ParallelToolNode([search_tool, read_tool]).invoke({"messages": [message]})
+    assert [m.tool_call_id for m in update["messages"]] == ["1", "2", "3", "4"]
+    assert sorted(calls) == [("read", "AGVSBG8"), ("read", "aGVsbG8"), ("search", "Speed limits?")]
+    assert update["messages"][3].content == "text of AGVSBG8"
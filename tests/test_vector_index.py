@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from embeddings import HashingFakeEmbeddings
+from vector_index import LocalVectorIndex, reciprocal_rank_fusion
+
+DOCUMENTS = [
+    {"id": "rules-0000", "content": "Speed limits on motorways and in built-up areas"},
+    {"id": "rules-0001", "content": "Alcohol limits and drink driving penalties"},
+    {"id": "signs-0000", "content": "Road signs giving orders are mostly circular"},
+]
+
+
+def test_build_save_and_load(tmp_path):
+    embed = HashingFakeEmbeddings(dimensions=64).embed_documents
+    index = LocalVectorIndex.from_documents(DOCUMENTS, embed)
+    path = os.path.join(tmp_path, "nested", "vectors.npz")
+    index.save(path)
+
+    loaded = LocalVectorIndex.load(path)
+    assert len(loaded) == 3
+    hits = loaded.search(embed(["drink driving alcohol"])[0], top=2)
+    assert [hit["id"] for hit in hits][0] == "rules-0001"
+    assert hits[0]["content"] == DOCUMENTS[1]["content"]
+    assert hits[0]["score"] >= hits[1]["score"]
+
+
+def test_reciprocal_rank_fusion_ordering_ties_and_cutoff():
+    keyword = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    vector = [{"id": "c"}, {"id": "d"}, {"id": "a"}]
+    fused = reciprocal_rank_fusion([keyword, vector], k=1, top=10)
+    # a: 1/2 + 1/4, c: 1/4 + 1/2, b and d: 1/3 each; equal scores keep the order they were first seen in
+    assert [hit["id"] for hit in fused] == ["a", "c", "b", "d"]
+    assert [hit["score"] for hit in fused] == pytest.approx([0.75, 0.75, 1 / 3, 1 / 3])
+    assert [hit["id"] for hit in reciprocal_rank_fusion([keyword, vector], k=1, top=2)] == ["a", "c"]
+    assert reciprocal_rank_fusion([[], []], top=5) == []